@@ -6,6 +6,7 @@ import io
 
 from app.db.session import get_db
 from app.services.data_processing_service import DataProcessingService
+from app.services.seasonality_service import SeasonalityService
 from app.api.deps import get_current_user
 
 router = APIRouter()
@@ -164,4 +165,44 @@ def analyze_sales_patterns(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"销售模式分析失败: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/seasonality/{product_id}", response_model=Dict[str, Any])
+def get_seasonality_profile(
+    product_id: int,
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    获取指定产品的季节性档案（过期时先增量更新）
+    """
+    try:
+        return SeasonalityService.get_profile(db, product_id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取季节性档案失败: {str(e)}"
+        )
+
+
+@router.post("/seasonality/refresh", response_model=Dict[str, Any])
+def refresh_seasonality_profiles(
+    product_ids: Optional[List[int]] = Query(None),
+    rebuild: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    更新季节性档案，默认只累加新日期，rebuild为真时从历史数据完整重建
+    """
+    try:
+        return SeasonalityService.refresh_profiles(db, product_ids, rebuild)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"更新季节性档案失败: {str(e)}"
+        )
@@ -1,25 +1,134 @@
 from typing import List, Dict, Any, Optional
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.db.session import get_db
+from app.schemas.forecast import ForecastBatchTrainRequest, ForecastTrainingJobRequest, ForecastBacktestRequest
 from app.services.forecast_service import ForecastService
-from app.api.deps import get_current_user
+from app.services.backtest_service import BacktestService
+from app.services.model_registry import model_registry
+from app.services.training_job_service import TrainingJobService
+from app.services.replenishment_plan_service import ReplenishmentPlanService
+from app.api.deps import get_current_user, get_current_active_superuser
+from app.core.config import settings
+from app.core.streaming import iter_stream, STREAM_MEDIA_TYPES
 
 router = APIRouter()
 
 
+@router.post("/train/batch", response_model=Dict[str, Any])
+def train_models_batch(
+    request: ForecastBatchTrainRequest,
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    批量训练多个产品的预测模型，返回每个产品的训练指标和失败原因
+    """
+    try:
+        result = ForecastService.train_models_batch(
+            db,
+            product_ids=request.product_ids,
+            model_type=request.model_type.value,
+            category=request.category,
+            days=request.days,
+            max_workers=request.max_workers,
+            incremental=request.incremental
+        )
+        return result
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量训练失败: {str(e)}"
+        )
+
+
+@router.post("/jobs", response_model=Dict[str, Any], status_code=status.HTTP_202_ACCEPTED)
+def submit_training_job(
+    request: ForecastTrainingJobRequest,
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    提交异步训练任务，立即返回任务ID，训练在后台进程池中执行
+    """
+    try:
+        result = TrainingJobService.submit_job(
+            db,
+            model_type=request.model_type.value,
+            product_ids=request.product_ids,
+            category=request.category,
+            days=request.days,
+            incremental=request.incremental,
+            created_by=current_user.id
+        )
+        return result
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"提交训练任务失败: {str(e)}"
+        )
+
+
+@router.get("/jobs", response_model=List[Dict[str, Any]])
+def read_training_jobs(
+    status_filter: Optional[str] = Query(
+        None, alias="status", enum=["pending", "running", "cancelling", "cancelled", "succeeded", "failed"]
+    ),
+    skip: int = 0,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    获取最近的训练任务列表
+    """
+    return TrainingJobService.list_jobs(db, status_filter, skip, limit)
+
+
+@router.get("/jobs/{job_id}", response_model=Dict[str, Any])
+def read_training_job(
+    job_id: int,
+    include_results: bool = True,
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    获取训练任务的状态、进度和结果
+    """
+    return TrainingJobService.get_job(db, job_id, include_results)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=Dict[str, Any])
+def cancel_training_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    取消尚未完成的训练任务
+    """
+    return TrainingJobService.cancel_job(db, job_id)
+
+
 @router.post("/train/{product_id}/sarima", response_model=Dict[str, Any])
 def train_sarima_model(
     product_id: int,
+    incremental: bool = Query(False),
     db: Session = Depends(get_db),
     current_user: Dict = Depends(get_current_user)
 ):
     """
-    训练指定产品的SARIMA预测模型
+    训练指定产品的SARIMA预测模型，incremental为true时在已保存的模型上追加新数据
     """
     try:
-        result = ForecastService.train_sarima_model(db, product_id)
+        result = ForecastService.train_sarima_model(db, product_id, incremental)
         return result
     except HTTPException as e:
         raise e
@@ -51,19 +160,74 @@ def train_random_forest_model(
         )
 
 
+@router.post("/train/global", response_model=Dict[str, Any])
+def train_global_model(
+    days: int = Query(365, ge=60, le=730),
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    训练覆盖所有活跃产品的全局预测模型
+    """
+    try:
+        result = ForecastService.train_global_model(db, days)
+        return result
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"模型训练失败: {str(e)}"
+        )
+
+
+@router.post("/backtest", response_model=Dict[str, Any])
+def run_backtest(
+    request: ForecastBacktestRequest,
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    以滚动预测起点回测预测模型，返回各模型的WAPE、MASE、偏差和耗时
+    """
+    try:
+        result = BacktestService.run_backtest(
+            db,
+            model_types=request.model_types,
+            product_ids=request.product_ids,
+            category=request.category,
+            history_days=request.history_days,
+            horizon=request.horizon,
+            folds=request.folds,
+            step=request.step,
+            max_workers=request.max_workers
+        )
+        return result
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"回测失败: {str(e)}"
+        )
+
+
 @router.get("/predict/{product_id}", response_model=Dict[str, Any])
 def predict_sales(
     product_id: int,
     days: int = Query(30, ge=1, le=90),
-    model_type: str = Query("RandomForest", enum=["SARIMA", "RandomForest"]),
+    model_type: str = Query("RandomForest", enum=["SARIMA", "RandomForest", "Global", "Croston", "Auto"]),
+    max_age_hours: int = Query(settings.FORECAST_MAX_AGE_HOURS, ge=0, le=168),
     db: Session = Depends(get_db),
     current_user: Dict = Depends(get_current_user)
 ):
     """
-    预测指定产品的未来销量
+    预测指定产品的未来销量，优先返回预测表中未过期的结果（max_age_hours为0时实时预测）
+    
+    model_type为Auto时根据零需求天数占比自动选择间歇需求模型(Croston)或随机森林
     """
     try:
-        result = ForecastService.predict_sales(db, product_id, days, model_type)
+        result = ForecastService.get_forecast(db, product_id, days, model_type, max_age_hours)
         return result
     except HTTPException as e:
         raise e
@@ -78,7 +242,8 @@ def predict_sales(
 def calculate_replenishment(
     product_id: int,
     forecast_days: int = Query(30, ge=1, le=90),
-    model_type: str = Query("RandomForest", enum=["SARIMA", "RandomForest"]),
+    model_type: str = Query("RandomForest", enum=["SARIMA", "RandomForest", "Global", "Croston", "Auto"]),
+    max_age_hours: int = Query(settings.FORECAST_MAX_AGE_HOURS, ge=0, le=168),
     db: Session = Depends(get_db),
     current_user: Dict = Depends(get_current_user)
 ):
@@ -87,7 +252,7 @@ def calculate_replenishment(
     """
     try:
         result = ForecastService.calculate_replenishment_quantity(
-            db, product_id, forecast_days, model_type
+            db, product_id, forecast_days, model_type, max_age_hours
         )
         return result
     except HTTPException as e:
@@ -96,4 +261,110 @@ def calculate_replenishment(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"计算补货建议失败: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/replenishment-plan")
+def stream_replenishment_plan(
+    model_type: str = Query("Global", enum=["Global", "Croston", "Auto"]),
+    forecast_days: int = Query(30, ge=1, le=90),
+    category: Optional[str] = None,
+    max_age_hours: int = Query(settings.FORECAST_MAX_AGE_HOURS, ge=0, le=168),
+    only_needed: bool = False,
+    output_format: str = Query("jsonl", alias="format", enum=["jsonl", "csv"]),
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    为所有活跃产品生成补货计划（补货点、经济订货批量、扣除在途数量后的建议补货量），
+    以JSON Lines或CSV流式返回
+    """
+    try:
+        ReplenishmentPlanService.prepare_plan(db, model_type)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"生成补货计划失败: {str(e)}"
+        )
+    
+    rows = ReplenishmentPlanService.iter_replenishment_plan(
+        db, model_type, forecast_days, category, max_age_hours, only_needed
+    )
+    filename = f"replenishment_plan_{datetime.now().strftime('%Y%m%d')}.{output_format}"
+    return StreamingResponse(
+        iter_stream(rows, output_format, ReplenishmentPlanService.PLAN_COLUMNS),
+        media_type=STREAM_MEDIA_TYPES[output_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/refresh", response_model=Dict[str, Any])
+def refresh_forecasts(
+    model_type: str = Query("Global", enum=["SARIMA", "RandomForest", "Global", "Croston"]),
+    days: int = Query(30, ge=1, le=90),
+    category: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_active_superuser)
+):
+    """
+    为所有活跃产品重新生成预测并写入预测表，通常由每日定时任务调用
+    """
+    try:
+        result = ForecastService.refresh_forecast_table(db, model_type, days, category)
+        return result
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"刷新预测失败: {str(e)}"
+        )
+
+
+@router.get("/stored", response_model=Dict[str, Any])
+def read_stored_forecasts(
+    model_type: str = Query("Global", enum=["SARIMA", "RandomForest", "Global", "Croston"]),
+    days: int = Query(30, ge=1, le=90),
+    product_ids: Optional[List[int]] = Query(None),
+    category: Optional[str] = None,
+    max_age_hours: int = Query(settings.FORECAST_MAX_AGE_HOURS, ge=1, le=168),
+    db: Session = Depends(get_db),
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    批量读取多个产品最新的预计算预测
+    """
+    try:
+        return ForecastService.get_stored_forecasts_bulk(
+            db, model_type, days, product_ids, category, max_age_hours
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"读取预计算预测失败: {str(e)}"
+        )
+
+
+@router.get("/models/cache", response_model=Dict[str, Any])
+def get_model_cache_stats(
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    获取模型缓存的命中率和占用情况
+    """
+    return model_registry.stats()
+
+
+@router.delete("/models/cache", response_model=Dict[str, Any])
+def clear_model_cache(
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    清空模型缓存
+    """
+    removed = model_registry.invalidate()
+    return {"removed_entries": removed}
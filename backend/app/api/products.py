@@ -1,9 +1,10 @@
 from typing import Any, List, Optional, Dict
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.core.pagination import next_cursor
 from app.models.user import User
 from app.schemas.product import (
     Product, ProductCreate, ProductUpdate, 
@@ -16,6 +17,7 @@ router = APIRouter()
 
 @router.get("/", response_model=List[Product])
 def read_products(
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
@@ -24,10 +26,13 @@ def read_products(
     sku: Optional[str] = None,
     is_active: Optional[bool] = None,
     needs_replenishment: Optional[bool] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     获取产品列表，支持多种过滤条件
+    
+    下一页的游标通过 X-Next-Cursor 响应头返回，传入cursor时忽略skip
     """
     products = ProductService.get_products(
         db, 
@@ -37,8 +42,12 @@ def read_products(
         name=name,
         sku=sku,
         is_active=is_active,
-        needs_replenishment=needs_replenishment
+        needs_replenishment=needs_replenishment,
+        cursor=cursor
     )
+    cursor = next_cursor(products, limit, lambda product: [product.id])
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
     return products
 
 
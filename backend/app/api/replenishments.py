@@ -1,17 +1,21 @@
 from typing import Any, List, Optional, Dict
 from datetime import datetime, date
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.core.pagination import next_cursor
 from app.models.user import User
 from app.schemas.replenishment import (
     Replenishment, ReplenishmentCreate, ReplenishmentUpdate,
     ReplenishmentWithDetails, ReplenishmentSummary, 
-    ReplenishmentRecommendation
+    ReplenishmentRecommendation, JointReplenishmentRequest,
+    ReplenishmentBulkReceiptRequest
 )
 from app.services.replenishment_service import ReplenishmentService
+from app.services.joint_replenishment_service import JointReplenishmentService
+from app.services.reorder_trigger_service import ReorderTriggerService
 from app.services.product_service import ProductService
 
 router = APIRouter()
@@ -19,6 +23,7 @@ router = APIRouter()
 
 @router.get("/", response_model=List[Replenishment])
 def read_replenishments(
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
@@ -26,10 +31,13 @@ def read_replenishments(
     end_date: Optional[date] = None,
     product_id: Optional[int] = None,
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     获取补货记录列表，支持日期、产品和状态过滤
+    
+    下一页的游标通过 X-Next-Cursor 响应头返回，传入cursor时忽略skip
     """
     replenishments = ReplenishmentService.get_replenishments(
         db,
@@ -38,8 +46,12 @@ def read_replenishments(
         start_date=start_date,
         end_date=end_date,
         product_id=product_id,
-        status=status
+        status=status,
+        cursor=cursor
     )
+    cursor = next_cursor(replenishments, limit, ReplenishmentService.replenishment_cursor_key)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
     return replenishments
 
 
@@ -81,6 +93,63 @@ def get_replenishment_recommendations(
     return recommendations
 
 
+@router.get("/needing", response_model=Dict[str, Any])
+def get_products_needing_replenishment(
+    db: Session = Depends(deps.get_db),
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    current_user: User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    获取需要补货的产品及其在途数量，按库存/安全库存比例排序，使用next_cursor获取下一页
+    """
+    return ReplenishmentService.get_products_needing_replenishment(
+        db,
+        limit=limit,
+        cursor=cursor,
+        category=category
+    )
+
+
+@router.get("/suggestions", response_model=List[Dict[str, Any]])
+def get_reorder_suggestions(
+    category: Optional[str] = None,
+    current_user: User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    获取库存跌破安全库存时由事件触发生成的补货建议
+    
+    建议保存在进程内，多worker部署时只包含处理本请求的进程所触发的建议
+    """
+    return ReorderTriggerService.get_suggestions(category)
+
+
+@router.post("/joint", response_model=Dict[str, Any])
+def create_joint_replenishments(
+    *,
+    db: Session = Depends(deps.get_db),
+    request: JointReplenishmentRequest,
+    current_user: User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    按供应商联合补货：求解共同订货周期和各SKU的倍数，一次批量创建补货记录
+    """
+    return JointReplenishmentService.create_joint_orders(
+        db,
+        category=request.category,
+        model_type=request.model_type,
+        forecast_days=request.forecast_days,
+        max_age_hours=request.max_age_hours,
+        supplier_order_costs=request.supplier_order_costs,
+        order_cost=request.order_cost,
+        line_cost=request.line_cost,
+        holding_cost_rate=request.holding_cost_rate,
+        dry_run=request.dry_run,
+        created_by=current_user.id
+    )
+
+
 @router.post("/", response_model=Replenishment)
 def create_replenishment(
     *,
@@ -214,6 +283,22 @@ def delete_replenishment(
     return replenishment
 
 
+@router.post("/receipts", response_model=Dict[str, Any])
+def confirm_replenishments_bulk(
+    *,
+    db: Session = Depends(deps.get_db),
+    request: ReplenishmentBulkReceiptRequest,
+    current_user: User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    批量确认补货到货，在一个事务中更新补货状态和产品库存，返回每行的处理结果
+    """
+    return ReplenishmentService.bulk_confirm_replenishments(
+        db,
+        [line.dict() for line in request.lines]
+    )
+
+
 @router.patch("/{replenishment_id}/complete", response_model=Replenishment)
 def complete_replenishment(
     *,
@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
@@ -47,6 +47,31 @@ def batch_calculate_safety_stock(
         category
     )
 
+@router.post("/simulate")
+def simulate_safety_stock(
+    product_ids: Optional[List[int]] = Query(None),
+    category: str = None,
+    fill_rate: float = Query(0.95, ge=0.5, le=0.999),
+    history_months: int = Query(6, ge=1, le=24),
+    lead_time_days: int = Query(7, ge=1, le=90),
+    trials: int = Query(10000, ge=100, le=100000),
+    seed: Optional[int] = None,
+    db: Session = Depends(deps.get_db)
+) -> Dict[str, Any]:
+    """
+    以蒙特卡洛模拟计算安全库存：从历史需求和实际到货提前期中重抽样，求达到目标满足率的库存水平
+    """
+    return SafetyStockService.simulate_safety_stock(
+        db,
+        product_ids,
+        category,
+        fill_rate,
+        history_months,
+        lead_time_days,
+        trials,
+        seed=seed
+    )
+
 @router.put("/{product_id}")
 def update_safety_stock(
     product_id: int,
@@ -75,10 +100,11 @@ def auto_update_safety_stocks(
     lead_time_days: int = Query(7, ge=1, le=90),
     consider_seasonality: bool = True,
     confidence_threshold: float = Query(0.7, ge=0.5, le=0.9),
+    dry_run: bool = False,
     db: Session = Depends(deps.get_db)
 ) -> Dict[str, Any]:
     """
-    自动更新所有产品的安全库存
+    自动更新所有产品的安全库存，dry_run为true时只返回将要变化的产品
     """
     return SafetyStockService.auto_update_all_safety_stocks(
         db,
@@ -86,5 +112,6 @@ def auto_update_safety_stocks(
         history_months,
         lead_time_days,
         consider_seasonality,
-        confidence_threshold
+        confidence_threshold,
+        dry_run
     )
\ No newline at end of file
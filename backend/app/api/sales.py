@@ -1,33 +1,43 @@
 from typing import Any, List, Optional, Dict
 from datetime import datetime, date
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.core.pagination import next_cursor
+from app.core.streaming import iter_stream, parquet_available, STREAM_MEDIA_TYPES
 from app.models.user import User
 from app.schemas.sale import (
     Sale, SaleCreate, SaleUpdate, 
-    SaleSummary, SaleWithDetails
+    SaleSummary, SaleWithDetails, SaleBulkCreate
 )
 from app.services.sale_service import SaleService
 from app.services.product_service import ProductService
+from app.services.demand_statistics_service import DemandStatisticsService
+from app.services.sales_daily_service import SalesDailyService
+from app.services.sales_partition_service import SalesPartitionService
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[Sale])
 def read_sales(
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     product_id: Optional[int] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     获取销售记录列表，支持日期和产品过滤
+    
+    下一页的游标通过 X-Next-Cursor 响应头返回，传入cursor时忽略skip
     """
     sales = SaleService.get_sales(
         db,
@@ -35,8 +45,12 @@ def read_sales(
         limit=limit,
         start_date=start_date,
         end_date=end_date,
-        product_id=product_id
+        product_id=product_id,
+        cursor=cursor
     )
+    cursor = next_cursor(sales, limit, SaleService.sale_cursor_key)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
     return sales
 
 
@@ -94,6 +108,94 @@ def get_top_selling_products(
     return top_products
 
 
+@router.get("/demand-stats/{product_id}", response_model=Dict)
+def get_demand_statistics(
+    product_id: int,
+    db: Session = Depends(deps.get_db),
+    days: Optional[int] = Query(None, ge=1, le=DemandStatisticsService.WINDOW_DAYS),
+    current_user: User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    获取产品每日需求的均值和标准差（增量维护，不扫描销售历史）
+    """
+    return DemandStatisticsService.get_product_statistics(db, product_id, days)
+
+
+@router.get("/export")
+def export_sales(
+    output_format: str = Query("csv", alias="format", enum=["csv", "parquet"]),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    product_id: Optional[int] = None,
+    category: Optional[str] = None,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    以CSV或Parquet流式导出销售记录，边读取边发送，适合大范围的数据提取
+    """
+    if output_format == "parquet" and not parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="服务器未安装pyarrow，无法导出Parquet"
+        )
+    
+    rows = SaleService.iter_sales_export(
+        db,
+        start_date=start_date,
+        end_date=end_date,
+        product_id=product_id,
+        category=category
+    )
+    filename = f"sales_{datetime.now().strftime('%Y%m%d')}.{output_format}"
+    return StreamingResponse(
+        iter_stream(rows, output_format, SaleService.EXPORT_COLUMNS, SaleService.EXPORT_COLUMN_TYPES),
+        media_type=STREAM_MEDIA_TYPES[output_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/daily-rollup/rebuild", response_model=Dict[str, Any])
+def rebuild_sales_daily(
+    product_ids: Optional[List[int]] = Query(None),
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    从销售记录完整重建每日销售汇总，仅超级管理员可访问
+    """
+    return SalesDailyService.rebuild(db, product_ids)
+
+
+@router.get("/partitions", response_model=Dict[str, Any])
+def read_sales_partitions(
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    列出销售表的月份分区，仅超级管理员可访问
+    """
+    return SalesPartitionService.list_partitions(db)
+
+
+@router.post("/partitions/maintain", response_model=Dict[str, Any])
+def maintain_sales_partitions(
+    months_ahead: Optional[int] = Query(None, ge=0, le=24),
+    archive: bool = False,
+    retention_months: Optional[int] = Query(None, ge=1),
+    drop: bool = False,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_superuser),
+) -> Any:
+    """
+    创建未来月份的分区，archive为真时同时分离超过保留期的分区，仅超级管理员可访问
+    """
+    result = SalesPartitionService.ensure_partitions(db, months_ahead)
+    if archive:
+        result.update(SalesPartitionService.archive_partitions(db, retention_months, drop))
+    return result
+
+
 @router.post("/", response_model=Sale)
 def create_sale(
     *,
@@ -130,6 +232,22 @@ def create_sale(
     return sale
 
 
+@router.post("/bulk", response_model=Dict[str, Any])
+def create_sales_bulk(
+    *,
+    db: Session = Depends(deps.get_db),
+    sales_in: SaleBulkCreate,
+    current_user: User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    批量导入销售记录（如POS批次），在一个事务中写入销售记录并更新库存，返回被拒绝的明细
+    """
+    return SaleService.create_sales_bulk(
+        db,
+        [line.dict() for line in sales_in.lines]
+    )
+
+
 @router.get("/{sale_id}", response_model=SaleWithDetails)
 def read_sale(
     *,
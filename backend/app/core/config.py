@@ -31,6 +31,28 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS: set = {".xlsx", ".xls"}
 
+    # 预测模型配置
+    FORECAST_MAX_WORKERS: int = int(os.getenv("FORECAST_MAX_WORKERS", os.cpu_count() or 1))  # 批量训练进程数
+    MODEL_CACHE_MAX_ENTRIES: int = int(os.getenv("MODEL_CACHE_MAX_ENTRIES", 256))  # 内存中缓存的模型文件数上限
+    MODEL_CACHE_MAX_BYTES: int = int(os.getenv("MODEL_CACHE_MAX_BYTES", 512 * 1024 * 1024))  # 512MB
+    FORECAST_MAX_AGE_HOURS: int = int(os.getenv("FORECAST_MAX_AGE_HOURS", 24))  # 预计算预测的有效期
+    FORECAST_RETENTION_DAYS: int = int(os.getenv("FORECAST_RETENTION_DAYS", 7))  # 预计算预测的保留天数
+    TRAINING_JOB_STALE_SECONDS: int = int(os.getenv("TRAINING_JOB_STALE_SECONDS", 600))  # 训练任务心跳超过该时间未更新视为中断
+    
+    # 联合补货配置
+    SUPPLIER_ORDER_COST: float = float(os.getenv("SUPPLIER_ORDER_COST", 100))  # 每次向供应商下单的固定成本
+    ORDER_LINE_COST: float = float(os.getenv("ORDER_LINE_COST", 10))  # 订单中每增加一个SKU的成本
+    
+    # 进程内事件总线配置
+    EVENT_BATCH_MAX_SIZE: int = int(os.getenv("EVENT_BATCH_MAX_SIZE", 500))  # 每批投递的最大事件数
+    EVENT_BATCH_WINDOW_MS: int = int(os.getenv("EVENT_BATCH_WINDOW_MS", 200))  # 收到首个事件后等待凑批的时间
+    EVENT_QUEUE_MAX_SIZE: int = int(os.getenv("EVENT_QUEUE_MAX_SIZE", 100000))  # 待投递事件上限，超出时丢弃
+    
+    # 销售表分区配置
+    SALES_PARTITION_MONTHS_AHEAD: int = int(os.getenv("SALES_PARTITION_MONTHS_AHEAD", 3))  # 预先创建的未来月份分区数
+    SALES_PARTITION_RETENTION_MONTHS: int = int(os.getenv("SALES_PARTITION_RETENTION_MONTHS", 36))  # 在线保留的月份数（含当前月）
+    SALES_ARCHIVE_SCHEMA: str = os.getenv("SALES_ARCHIVE_SCHEMA", "archive")  # 分离的历史分区移入的schema
+
     def __init__(self):
         super().__init__()
         self.SQLALCHEMY_DATABASE_URI = (
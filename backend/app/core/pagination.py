@@ -0,0 +1,61 @@
+"""
+键集（keyset）分页游标
+
+游标把上一页最后一行的排序键编码为URL安全的字符串，下一页从该键之后继续读取，
+避免OFFSET在深分页时扫描并丢弃前面所有行。
+"""
+import base64
+import json
+from typing import Any, Callable, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """将排序键编码为游标"""
+    payload = json.dumps(values, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(
+    cursor: str,
+    size: int,
+    parsers: Optional[Sequence[Callable[[Any], Any]]] = None
+) -> List[Any]:
+    """
+    解码游标
+    
+    Args:
+        cursor: encode_cursor生成的游标
+        size: 排序键的个数
+        parsers: 每个排序键的转换函数（如 date.fromisoformat），为空时返回JSON原值
+    
+    Raises:
+        HTTPException: 游标格式无效
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        if isinstance(values, list) and len(values) == size and parsers:
+            values = [parse(value) for parse, value in zip(parsers, values)]
+    except (ValueError, TypeError, UnicodeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+    return values
+
+
+def next_cursor(items: List[Any], limit: Optional[int], key: Callable[[Any], List[Any]]) -> Optional[str]:
+    """
+    根据本页最后一行生成下一页的游标，本页不满时说明没有更多数据，返回None
+    
+    Args:
+        items: 本页数据
+        limit: 每页最大行数
+        key: 从一行数据取出排序键的函数
+    """
+    if not items or limit is None or len(items) < limit:
+        return None
+    return encode_cursor(key(items[-1]))
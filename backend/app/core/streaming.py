@@ -0,0 +1,141 @@
+"""
+流式响应的逐行编码
+
+把字典行的迭代器编码为CSV、JSON Lines文本块或Parquet行组，供StreamingResponse边生成边发送，
+避免在内存中拼出完整的响应体。
+"""
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet导出是可选功能
+    pa = None
+    pq = None
+
+STREAM_MEDIA_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], columns: List[str], batch_size: int = 1000) -> Iterator[str]:
+    """按列顺序输出CSV表头和数据行，每batch_size行合并为一个文本块"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_jsonl(rows: Iterable[Dict[str, Any]], batch_size: int = 1000) -> Iterator[str]:
+    """每行输出一个JSON对象，每batch_size行合并为一个文本块"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, ensure_ascii=False, default=str))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def parquet_available() -> bool:
+    """是否安装了Parquet导出所需的pyarrow"""
+    return pq is not None
+
+
+class _DrainableSink:
+    """
+    供ParquetWriter写入的输出流，已写入的字节可以随时取走
+    
+    tell() 返回累计写入的字节数，保证文件尾部记录的行组偏移正确。
+    """
+    
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+    
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_parquet(
+    rows: Iterable[Dict[str, Any]],
+    columns: List[str],
+    column_types: Dict[str, str],
+    row_group_size: int = 100000
+) -> Iterator[bytes]:
+    """
+    每row_group_size行写出一个Parquet行组，写完即输出对应的字节块
+    
+    Args:
+        rows: 字典行
+        columns: 列顺序
+        column_types: 列名到pyarrow类型别名（如 int64、float64、string、date32）的映射
+        row_group_size: 每个行组的行数
+    """
+    schema = pa.schema([(column, pa.type_for_alias(column_types[column])) for column in columns])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        batch: Dict[str, List[Any]] = {column: [] for column in columns}
+        count = 0
+        for row in rows:
+            for column in columns:
+                batch[column].append(row.get(column))
+            count += 1
+            if count == row_group_size:
+                writer.write_table(pa.table(batch, schema=schema))
+                batch = {column: [] for column in columns}
+                count = 0
+                yield sink.drain()
+        if count:
+            writer.write_table(pa.table(batch, schema=schema))
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_stream(
+    rows: Iterable[Dict[str, Any]],
+    output_format: str,
+    columns: List[str],
+    column_types: Optional[Dict[str, str]] = None
+) -> Iterator[Any]:
+    """按输出格式（csv、jsonl或parquet）编码行，parquet需要提供列类型"""
+    if output_format == 'csv':
+        return iter_csv(rows, columns)
+    if output_format == 'parquet':
+        return iter_parquet(rows, columns, column_types)
+    return iter_jsonl(rows)
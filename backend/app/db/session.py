@@ -8,6 +8,7 @@ from app.core.config import settings
 engine = create_engine(
     settings.SQLALCHEMY_DATABASE_URI,
     pool_pre_ping=True,  # 连接池"ping"功能，防止断开连接
+    executemany_mode="values_plus_batch",  # 批量INSERT/UPDATE使用psycopg2的分页批量执行
 )
 
 # 创建SessionLocal类，每个实例将是一个数据库会话
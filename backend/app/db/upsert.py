@@ -0,0 +1,14 @@
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def insert_on_conflict(db: Session, table: Table):
+    """
+    按会话连接的数据库创建支持ON CONFLICT子句的INSERT语句
+    
+    生产环境使用PostgreSQL；SQLite同样支持ON CONFLICT，便于在测试中执行相同的语句。
+    """
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
@@ -0,0 +1,35 @@
+"""
+索引补建任务
+
+应用不自动建表，模型中新增的索引需要在已部署的数据库上补建。索引以 CONCURRENTLY 方式在线创建，
+不阻塞销售和补货的读写，可以在服务运行期间执行；已存在的索引会跳过，可重复运行，例如：
+    
+    python -m app.jobs.create_indexes
+"""
+import json
+
+# 导入所有模型以确保关系映射完整
+from app.models.user import User
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.replenishment import Replenishment
+from app.models.forecast import Forecast
+from app.models.training_job import TrainingJob
+from app.models.seasonality_profile import SeasonalityProfile
+from app.models.demand_statistics import DemandStatistics
+from app.models.sales_daily import SalesDaily
+from app.db.session import SessionLocal
+from app.services.schema_index_service import SchemaIndexService
+
+
+def main():
+    db = SessionLocal()
+    try:
+        result = SchemaIndexService.ensure_indexes(db)
+        print(json.dumps(result, ensure_ascii=False, default=str))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+销售表分区维护任务
+
+首次使用时以 --migrate 把现有sales表迁移为按月分区的表（迁移期间锁定sales表）；
+之后定期运行以创建未来月份的分区，并按需归档超过保留期的分区，例如：
+    
+    python -m app.jobs.maintain_sales_partitions --migrate
+    0 2 1 * * cd /path/to/backend && python -m app.jobs.maintain_sales_partitions --archive
+"""
+import argparse
+import json
+
+# 导入所有模型以确保关系映射完整
+from app.models.user import User
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.replenishment import Replenishment
+from app.models.forecast import Forecast
+from app.models.training_job import TrainingJob
+from app.models.seasonality_profile import SeasonalityProfile
+from app.models.demand_statistics import DemandStatistics
+from app.models.sales_daily import SalesDaily
+from app.db.session import SessionLocal
+from app.services.sales_partition_service import SalesPartitionService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="维护销售表的月份分区")
+    parser.add_argument("--migrate", action="store_true", help="把现有sales表迁移为分区表")
+    parser.add_argument("--months-ahead", type=int, default=None, help="预先创建的未来月份数")
+    parser.add_argument("--archive", action="store_true", help="分离超过保留期的分区")
+    parser.add_argument("--retention-months", type=int, default=None, help="在线保留的月份数（含当前月）")
+    parser.add_argument("--drop", action="store_true", help="删除而不是归档分离的分区")
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        result = {}
+        if args.migrate:
+            result.update(SalesPartitionService.migrate_to_partitioned(db, args.months_ahead))
+        result.update(SalesPartitionService.ensure_partitions(db, args.months_ahead))
+        if args.archive:
+            result.update(SalesPartitionService.archive_partitions(db, args.retention_months, args.drop))
+        print(json.dumps(result, ensure_ascii=False, default=str))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
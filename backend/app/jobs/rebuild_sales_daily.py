@@ -0,0 +1,41 @@
+"""
+每日销售汇总重建任务
+
+日常销售写入会在同一事务中更新汇总，该任务用于首次部署时初始化汇总表，
+或在直接修改销售表之后校正汇总，例如：
+    
+    python -m app.jobs.rebuild_sales_daily
+    python -m app.jobs.rebuild_sales_daily --product-ids 1 2 3
+"""
+import argparse
+import json
+
+# 导入所有模型以确保关系映射完整
+from app.models.user import User
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.replenishment import Replenishment
+from app.models.forecast import Forecast
+from app.models.training_job import TrainingJob
+from app.models.seasonality_profile import SeasonalityProfile
+from app.models.demand_statistics import DemandStatistics
+from app.models.sales_daily import SalesDaily
+from app.db.session import SessionLocal
+from app.services.sales_daily_service import SalesDailyService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从销售记录重建每日销售汇总")
+    parser.add_argument("--product-ids", type=int, nargs="+", help="只重建指定产品，默认重建全部")
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        result = SalesDailyService.rebuild(db, args.product_ids)
+        print(json.dumps(result, ensure_ascii=False, default=str))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+每日预测刷新任务
+
+为所有活跃产品生成预测并写入forecasts表，建议由cron在夜间调度，例如：
+
+    0 2 * * * cd /path/to/backend && python -m app.jobs.refresh_forecasts --model-type Global
+"""
+import argparse
+import json
+
+# 导入所有模型以确保关系映射完整
+from app.models.user import User
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.replenishment import Replenishment
+from app.models.forecast import Forecast
+from app.models.training_job import TrainingJob
+from app.models.seasonality_profile import SeasonalityProfile
+from app.models.demand_statistics import DemandStatistics
+from app.models.sales_daily import SalesDaily
+from app.db.session import SessionLocal
+from app.services.forecast_service import ForecastService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="刷新预计算的销量预测")
+    parser.add_argument("--model-type", default="Global", choices=["SARIMA", "RandomForest", "Global", "Croston"])
+    parser.add_argument("--days", type=int, default=30, help="预测天数")
+    parser.add_argument("--category", default=None, help="只刷新指定类别的产品")
+    parser.add_argument("--retrain", action="store_true", help="刷新前重新训练全局模型")
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        if args.retrain and args.model_type == "Global":
+            training_result = ForecastService.train_global_model(db)
+            print(json.dumps(training_result, ensure_ascii=False, default=str))
+        result = ForecastService.refresh_forecast_table(
+            db, args.model_type, args.days, args.category
+        )
+        print(json.dumps(result, ensure_ascii=False, default=str))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
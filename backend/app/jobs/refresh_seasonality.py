@@ -0,0 +1,39 @@
+"""
+每日季节性档案更新任务
+
+把前一天的销售累加进所有活跃产品的季节性档案，建议在预测刷新之前调度，例如：
+    
+    30 1 * * * cd /path/to/backend && python -m app.jobs.refresh_seasonality
+"""
+import argparse
+import json
+
+# 导入所有模型以确保关系映射完整
+from app.models.user import User
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.replenishment import Replenishment
+from app.models.forecast import Forecast
+from app.models.training_job import TrainingJob
+from app.models.seasonality_profile import SeasonalityProfile
+from app.models.demand_statistics import DemandStatistics
+from app.models.sales_daily import SalesDaily
+from app.db.session import SessionLocal
+from app.services.seasonality_service import SeasonalityService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="更新产品的季节性档案")
+    parser.add_argument("--rebuild", action="store_true", help="从历史数据完整重建所有档案")
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        result = SeasonalityService.refresh_profiles(db, rebuild=args.rebuild)
+        print(json.dumps(result, ensure_ascii=False, default=str))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,11 @@ from app.models.user import User
 from app.models.product import Product
 from app.models.sale import Sale
 from app.models.replenishment import Replenishment
+from app.models.forecast import Forecast
+from app.models.training_job import TrainingJob
+from app.models.seasonality_profile import SeasonalityProfile
+from app.models.demand_statistics import DemandStatistics
+from app.models.sales_daily import SalesDaily
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -22,12 +27,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # 列表接口的键集分页游标
 )
 
 # 导入路由
 from app.api import api_router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+from app.db.session import SessionLocal
+from app.services.training_job_service import TrainingJobService
+from app.services.event_bus import event_bus
+from app.services.reorder_trigger_service import ReorderTriggerService
+from app.services.sales_partition_service import SalesPartitionService
+
+
+@app.on_event("startup")
+def recover_training_jobs():
+    """将上次进程退出时未完成的训练任务标记为失败"""
+    db = SessionLocal()
+    try:
+        TrainingJobService.recover_interrupted_jobs(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def register_event_subscribers():
+    """注册进程内事件总线的订阅者"""
+    ReorderTriggerService.register(event_bus)
+
+
+@app.on_event("startup")
+def ensure_sales_partitions():
+    """销售表已分区时，确保未来几个月的分区已经创建"""
+    db = SessionLocal()
+    try:
+        if SalesPartitionService.is_partitioned(db):
+            SalesPartitionService.ensure_partitions(db)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+def shutdown_training_pool():
+    """关闭训练任务进程池"""
+    TrainingJobService.shutdown()
+
+
+@app.on_event("shutdown")
+def shutdown_event_bus():
+    """投递完剩余事件后停止事件总线"""
+    event_bus.stop()
+
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Retail Inventory System"}
\ No newline at end of file
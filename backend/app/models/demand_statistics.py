@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, Float, Date, ForeignKey, JSON
+from app.models.base import BaseModel
+
+
+class DemandStatistics(BaseModel):
+    """产品每日需求的累计统计模型，随销售记录的增删改增量维护"""
+    __tablename__ = "demand_statistics"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, unique=True, index=True)
+    first_sale_date = Column(Date, nullable=True)
+    sales_days = Column(Integer, default=0)  # 有销售的天数
+    sales_mean = Column(Float, default=0)  # 有销售日期的日销量均值（Welford）
+    sales_m2 = Column(Float, default=0)  # 有销售日期的日销量离差平方和（Welford）
+    window_end_date = Column(Date, nullable=True)
+    recent_quantities = Column(JSON)  # 截至window_end_date的最近若干天每日销量（从旧到新）
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index
+from app.models.base import BaseModel
+
+
+class Forecast(BaseModel):
+    """预计算的销量预测记录模型"""
+    __tablename__ = "forecasts"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    model_type = Column(String, nullable=False)  # SARIMA, RandomForest, Global
+    generated_at = Column(DateTime, nullable=False)  # 本批预测的生成时间
+    forecast_date = Column(Date, nullable=False)  # 预测的日期
+    predicted_quantity = Column(Float, nullable=False)
+    lower_bound = Column(Float)
+    upper_bound = Column(Float)
+    
+    __table_args__ = (
+        # 单个产品读取最新一批预测
+        Index(
+            "ix_forecasts_product_model_generated_date",
+            "product_id", "model_type", "generated_at", "forecast_date",
+            unique=True
+        ),
+        # 按批次读取多个产品的预测
+        Index("ix_forecasts_model_generated", "model_type", "generated_at"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.models.base import BaseModel
 
@@ -6,6 +6,10 @@ from app.models.base import BaseModel
 class Replenishment(BaseModel):
     """补货记录模型"""
     __tablename__ = "replenishments"
+    __table_args__ = (
+        # 列表按 (created_at, id) 倒序做键集分页
+        Index("ix_replenishments_created_at_id", "created_at", "id"),
+    )
     
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, nullable=False)
@@ -1,11 +1,21 @@
-from sqlalchemy import Column, Integer, ForeignKey, Date, Float, JSON
+from sqlalchemy import Column, Integer, ForeignKey, Date, Float, JSON, Index
 from sqlalchemy.orm import relationship
 from app.models.base import BaseModel
 
 
 class Sale(BaseModel):
-    """销售记录模型"""
+    """
+    销售记录模型
+    
+    PostgreSQL中sales表可以按sale_date按月分区（主键为 (id, sale_date)），
+    迁移和分区维护见 SalesPartitionService。
+    """
     __tablename__ = "sales"
+    __table_args__ = (
+        # 列表按 (sale_date, id) 倒序做键集分页
+        Index("ix_sales_sale_date_id", "sale_date", "id"),
+        Index("ix_sales_product_id_sale_date_id", "product_id", "sale_date", "id"),
+    )
     
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, nullable=False)
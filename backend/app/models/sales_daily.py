@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, Float, Date, ForeignKey, UniqueConstraint
+from app.models.base import BaseModel
+
+
+class SalesDaily(BaseModel):
+    """按产品和日期汇总的销售数据，随销售记录的增删改在同一事务中维护"""
+    __tablename__ = "sales_daily"
+    __table_args__ = (
+        UniqueConstraint("product_id", "sale_date", name="uq_sales_daily_product_date"),
+    )
+    
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    sale_date = Column(Date, nullable=False, index=True)
+    quantity = Column(Integer, nullable=False, default=0)  # 当日销量
+    amount = Column(Float, nullable=False, default=0)  # 当日销售额
+    transaction_count = Column(Integer, nullable=False, default=0)  # 当日销售记录数
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, Float, Boolean, Date, ForeignKey, JSON
+from app.models.base import BaseModel
+
+
+class SeasonalityProfile(BaseModel):
+    """产品季节性档案模型"""
+    __tablename__ = "seasonality_profiles"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, unique=True, index=True)
+    last_date = Column(Date, nullable=True)  # 已纳入档案的最后一天（含）
+    weekday_indices = Column(JSON)  # 周一至周日的季节指数（相对日均销量），无数据时为null
+    monthly_indices = Column(JSON)  # 1-12月的季节指数，无数据的月份为null
+    weekly_autocorrelation = Column(Float, nullable=True)  # 滞后7天的自相关系数
+    seasonality_strength = Column(Float, default=0)
+    has_seasonality = Column(Boolean, default=False)
+    peak_months = Column(JSON)  # 季节指数达到高峰阈值的月份
+    stats = Column(JSON)  # 增量更新所需的累计统计量
+    needs_rebuild = Column(Boolean, default=False)  # 有早于last_date的销售变动时需要完整重建
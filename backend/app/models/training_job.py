@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from app.models.base import BaseModel
+
+
+class TrainingJob(BaseModel):
+    """异步模型训练任务模型"""
+    __tablename__ = "training_jobs"
+    
+    status = Column(String, nullable=False, default="pending")  # pending, running, cancelling, cancelled, succeeded, failed
+    model_type = Column(String, nullable=False)  # SARIMA, RandomForest
+    params = Column(JSON, nullable=False)  # 提交时的训练参数
+    total_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    results = Column(JSON, nullable=True)  # 完成后的训练结果和失败原因
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    created_by = Column(Integer, nullable=True)
+    worker_id = Column(String, nullable=True)  # 执行任务的进程，格式为 主机名:进程号
+    heartbeat_at = Column(DateTime, nullable=True)  # 执行进程最近一次写回的时间
+    
+    __table_args__ = (
+        Index("ix_training_jobs_status", "status"),
+    )
@@ -0,0 +1,46 @@
+from enum import Enum
+from typing import Optional, List
+from pydantic import BaseModel, Field, validator
+
+
+class ForecastModelType(str, Enum):
+    """预测模型类型枚举"""
+    SARIMA = "SARIMA"
+    RANDOM_FOREST = "RandomForest"
+    GLOBAL = "Global"  # 跨产品全局模型
+    CROSTON = "Croston"  # 间歇需求模型（Croston/SBA/TSB）
+    AUTO = "Auto"  # 根据零需求占比自动选择
+
+
+class ForecastTrainingJobRequest(BaseModel):
+    """异步训练任务请求模型"""
+    product_ids: Optional[List[int]] = None  # 为空时训练所有活跃产品
+    category: Optional[str] = None
+    model_type: ForecastModelType = ForecastModelType.RANDOM_FOREST
+    days: int = Field(default=90, ge=30, le=730)
+    incremental: bool = False  # SARIMA增量更新，仅在到期或漂移时完整重新拟合
+
+    @validator('model_type')
+    def model_type_per_product(cls, v):
+        if v == ForecastModelType.GLOBAL:
+            raise ValueError('全局模型请通过 /forecasts/train/global 训练')
+        if v in (ForecastModelType.CROSTON, ForecastModelType.AUTO):
+            raise ValueError('间歇需求模型在预测时直接拟合，无需训练')
+        return v
+
+
+class ForecastBatchTrainRequest(ForecastTrainingJobRequest):
+    """批量训练预测模型请求模型"""
+    max_workers: Optional[int] = Field(default=None, ge=1)
+
+
+class ForecastBacktestRequest(BaseModel):
+    """预测模型回测请求模型"""
+    model_types: List[str] = Field(default_factory=lambda: ["SeasonalNaive", "Croston", "RandomForest", "Global"], min_items=1)
+    product_ids: Optional[List[int]] = None  # 为空时回测所有活跃产品
+    category: Optional[str] = None
+    history_days: int = Field(default=180, ge=60, le=730)
+    horizon: int = Field(default=14, ge=1, le=90)
+    folds: int = Field(default=3, ge=1, le=12)
+    step: int = Field(default=7, ge=1, le=90)
+    max_workers: Optional[int] = Field(default=None, ge=1)
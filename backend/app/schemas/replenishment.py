@@ -1,6 +1,6 @@
 from typing import Optional, Dict, Any, List
 from datetime import date, datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 
 from app.schemas.base import BaseSchema
 
@@ -34,6 +34,17 @@ class Replenishment(ReplenishmentBase, BaseSchema):
         orm_mode = True
 
 
+class ReplenishmentReceiptLine(BaseModel):
+    """到货确认明细"""
+    replenishment_id: int
+    actual_quantity: Optional[int] = Field(default=None, ge=0)  # 为空时使用计划数量
+
+
+class ReplenishmentBulkReceiptRequest(BaseModel):
+    """批量到货确认请求模型"""
+    lines: List[ReplenishmentReceiptLine] = Field(..., min_items=1, max_items=10000)
+
+
 class ReplenishmentWithDetails(Replenishment):
     """带有产品详情的补货记录响应模型"""
     product_name: str
@@ -65,4 +76,23 @@ class ReplenishmentRecommendation(BaseModel):
     recommended_quantity: int
     priority: float  # 优先级分数
     category: str
-    lead_time_days: int
\ No newline at end of file
+    lead_time_days: int
+
+
+class JointReplenishmentRequest(BaseModel):
+    """按供应商联合补货请求模型"""
+    category: Optional[str] = None
+    model_type: str = Field(default="Global", regex="^(Global|Croston|Auto)$")
+    forecast_days: int = Field(default=30, ge=1, le=90)
+    max_age_hours: Optional[int] = Field(default=None, ge=0, le=168)
+    supplier_order_costs: Dict[str, float] = Field(default_factory=dict)  # 各供应商的每单固定成本，未列出的使用默认值
+    order_cost: Optional[float] = Field(default=None, ge=0)  # 默认每单固定成本
+    line_cost: Optional[float] = Field(default=None, ge=0)  # 每个SKU的附加成本
+    holding_cost_rate: Optional[float] = Field(default=None, gt=0, le=1)
+    dry_run: bool = False  # 只返回方案，不创建补货记录
+
+    @validator('supplier_order_costs')
+    def supplier_order_costs_positive(cls, v):
+        if any(cost <= 0 for cost in v.values()):
+            raise ValueError('供应商的每单固定成本必须大于0')
+        return v
@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import Optional, List
 from datetime import date
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class SaleBase(BaseModel):
@@ -17,6 +17,20 @@ class SaleCreate(SaleBase):
     pass
 
 
+class SaleBulkLine(BaseModel):
+    """批量导入的销售明细，按SKU关联产品"""
+    sku: str
+    quantity: int = Field(..., gt=0)
+    sale_date: Optional[date] = None
+    sale_amount: Optional[float] = Field(default=None, ge=0)  # 为空时按产品价格计算
+    customer_info: Optional[dict] = None
+
+
+class SaleBulkCreate(BaseModel):
+    """批量导入销售记录模型"""
+    lines: List[SaleBulkLine] = Field(..., min_items=1, max_items=10000)
+
+
 class SaleUpdate(BaseModel):
     """更新销售记录模型"""
     product_id: Optional[int] = None
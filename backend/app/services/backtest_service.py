@@ -0,0 +1,491 @@
+from typing import Dict, List, Any, Optional, Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+from app.core.config import settings
+from app.models.product import Product
+from app.services.forecast_service import ForecastService
+
+
+class BacktestService:
+    """
+    回测服务：以滚动预测起点(rolling origin)评估预测模型的准确率和计算成本
+    """
+    
+    SEASONAL_PERIOD = 7  # MASE基准使用的季节周期（周）
+    
+    @staticmethod
+    def supported_models() -> List[str]:
+        """支持回测的模型类型"""
+        return list(_BACKTEST_MODELS) + ['Global']
+    
+    @staticmethod
+    def run_backtest(
+        db: Session,
+        model_types: List[str],
+        product_ids: Optional[List[int]] = None,
+        category: Optional[str] = None,
+        history_days: int = 180,
+        horizon: int = 14,
+        folds: int = 3,
+        step: int = 7,
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        对多个产品和模型执行滚动起点回测
+        
+        每个折叠只使用预测起点之前的数据训练，避免未来数据泄漏到训练集。
+        单产品模型的各个(产品, 折叠)在进程池中并行拟合，指标统一用数组运算计算。
+        
+        Args:
+            db: 数据库会话
+            model_types: 需要评估的模型类型列表
+            product_ids: 产品ID列表，为空时使用所有活跃产品
+            category: 产品类别筛选
+            history_days: 使用最近多少天的数据
+            horizon: 每个折叠的预测天数
+            folds: 折叠数量
+            step: 相邻折叠预测起点的间隔天数
+            max_workers: 最大进程数，默认使用配置的FORECAST_MAX_WORKERS
+        
+        Returns:
+            按模型给出的整体、按类别、按产品的WAPE/MASE/偏差以及拟合和预测耗时
+        """
+        unsupported = [model_type for model_type in model_types if model_type not in BacktestService.supported_models()]
+        if unsupported:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"不支持回测的模型类型: {unsupported}"
+            )
+        
+        started_at = time.perf_counter()
+        
+        # 确定参与回测的产品
+        query = db.query(Product.id, Product.sku, Product.category)
+        if product_ids:
+            query = query.filter(Product.id.in_(product_ids))
+        else:
+            query = query.filter(Product.is_active == True)
+        if category:
+            query = query.filter(Product.category == category)
+        products = query.order_by(Product.id).all()
+        if not products:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="没有找到需要回测的产品"
+            )
+        
+        # 一次查询构建销量矩阵
+        end_date = datetime.now()
+        sales_frame = ForecastService._query_daily_sales(db, [product.id for product in products], history_days)
+        row_ids, dates, matrix = ForecastService.build_sales_matrix(
+            sales_frame,
+            product_ids=[product.id for product in products],
+            start_date=end_date - timedelta(days=history_days),
+            end_date=end_date
+        )
+        matrix = matrix.astype(np.float64)
+        n_days = matrix.shape[1]
+        
+        origins = np.array([n_days - horizon - (folds - 1 - fold) * step for fold in range(folds)])
+        if origins[0] < ForecastService.MIN_TRAINING_DAYS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="历史天数不足以覆盖所有折叠，请增加history_days或减少folds/horizon"
+            )
+        
+        # 只评估第一个预测起点前已有足够历史的产品
+        has_sales = matrix > 0
+        first_sale = np.where(has_sales.any(axis=1), has_sales.argmax(axis=1), n_days)
+        eligible = origins[0] - first_sale >= ForecastService.MIN_TRAINING_DAYS
+        skipped = [
+            {'product_id': product.id, 'reason': "预测起点前的销售历史不足"}
+            for product, is_eligible in zip(products, eligible) if not is_eligible
+        ]
+        
+        eligible_index = np.flatnonzero(eligible)
+        eval_products = [products[index] for index in eligible_index]
+        eval_matrix = matrix[eligible_index]
+        eval_first_sale = first_sale[eligible_index]
+        
+        # 实际值: (产品, 折叠, 预测天数)
+        offsets = origins[:, None] + np.arange(horizon)[None, :]
+        actuals = eval_matrix[:, offsets]
+        scales = BacktestService._seasonal_naive_scale(eval_matrix, eval_first_sale, origins)
+        
+        models = {}
+        for model_type in model_types:
+            model_started_at = time.perf_counter()
+            if model_type == 'Global':
+                predictions, fit_seconds, predict_seconds, failures = BacktestService._backtest_global(
+                    matrix, dates, [product.category for product in products], row_ids, origins, horizon, eligible_index
+                )
+            else:
+                predictions, fit_seconds, predict_seconds, failures = BacktestService._backtest_per_product(
+                    model_type, eval_products, eval_matrix, dates, eval_first_sale, origins, horizon, max_workers
+                )
+            wall_clock = time.perf_counter() - model_started_at
+            
+            models[model_type] = BacktestService._evaluate(
+                eval_products, actuals, predictions, scales, fit_seconds, predict_seconds
+            )
+            models[model_type]['summary']['wall_clock_seconds'] = round(wall_clock, 3)
+            models[model_type]['failures'] = failures
+        
+        return {
+            'config': {
+                'history_days': history_days,
+                'horizon': horizon,
+                'folds': folds,
+                'step': step,
+                'origins': [dates[origin].strftime('%Y-%m-%d') for origin in origins]
+            },
+            'evaluated_count': len(eval_products),
+            'skipped': skipped,
+            'models': models,
+            'elapsed_seconds': round(time.perf_counter() - started_at, 2)
+        }
+    
+    @staticmethod
+    def _backtest_per_product(
+        model_type: str,
+        products: List[Any],
+        matrix: np.ndarray,
+        dates: pd.DatetimeIndex,
+        first_sale: np.ndarray,
+        origins: np.ndarray,
+        horizon: int,
+        max_workers: Optional[int]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """
+        在进程池中并行拟合每个(产品, 折叠)
+        
+        Returns:
+            (预测数组, 每个产品的拟合耗时, 每个产品的预测耗时, 失败列表)
+        """
+        n_products, n_folds = len(products), len(origins)
+        predictions = np.full((n_products, n_folds, horizon), np.nan)
+        fit_seconds = np.zeros(n_products)
+        predict_seconds = np.zeros(n_products)
+        failures = []
+        
+        tasks = [
+            (
+                model_type,
+                product_index,
+                fold,
+                matrix[product_index, first_sale[product_index]:origin],
+                dates[first_sale[product_index]],
+                horizon
+            )
+            for product_index in range(n_products)
+            for fold, origin in enumerate(origins)
+        ]
+        
+        workers = max(1, min(max_workers or settings.FORECAST_MAX_WORKERS, len(tasks)))
+        if workers == 1:
+            results = [_backtest_fold(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(tasks) // (workers * 4))
+                results = list(executor.map(_backtest_fold, tasks, chunksize=chunksize))
+        
+        for product_index, fold, fold_predictions, error, fit_time, predict_time in results:
+            fit_seconds[product_index] += fit_time
+            predict_seconds[product_index] += predict_time
+            if error is not None:
+                failures.append({
+                    'product_id': products[product_index].id,
+                    'fold': fold,
+                    'error': error
+                })
+            else:
+                predictions[product_index, fold] = fold_predictions
+        
+        return predictions, fit_seconds, predict_seconds, failures
+    
+    @staticmethod
+    def _backtest_global(
+        matrix: np.ndarray,
+        dates: pd.DatetimeIndex,
+        categories: List[Optional[str]],
+        row_ids: np.ndarray,
+        origins: np.ndarray,
+        horizon: int,
+        eligible_index: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """
+        全局模型每个折叠只拟合一次，对所有产品批量预测；耗时按产品平均分摊
+        
+        Returns:
+            (预测数组, 每个产品的拟合耗时, 每个产品的预测耗时, 失败列表)
+        """
+        n_products = len(eligible_index)
+        predictions = np.full((n_products, len(origins), horizon), np.nan)
+        fit_total = 0.0
+        predict_total = 0.0
+        failures = []
+        
+        for fold, origin in enumerate(origins):
+            try:
+                fit_started_at = time.perf_counter()
+                train_matrix = matrix[:, :origin]
+                bundle = ForecastService._global_encodings(row_ids, categories, train_matrix)
+                features, target, valid = ForecastService._global_training_data(
+                    bundle, row_ids, categories, train_matrix, dates[:origin]
+                )
+                model = ForecastService._build_global_model()
+                model.fit(features[valid], target[valid])
+                fit_total += time.perf_counter() - fit_started_at
+                
+                predict_started_at = time.perf_counter()
+                static = ForecastService._global_static_features(bundle, row_ids, categories, train_matrix)
+                fold_predictions = ForecastService._global_recursive_forecast(
+                    model, static[eligible_index], train_matrix[eligible_index], dates[origin:origin + horizon]
+                )
+                predict_total += time.perf_counter() - predict_started_at
+                predictions[:, fold] = fold_predictions
+            except Exception as e:
+                failures.append({'fold': fold, 'error': str(e)})
+        
+        per_product = max(n_products, 1)
+        return (
+            predictions,
+            np.full(n_products, fit_total / per_product),
+            np.full(n_products, predict_total / per_product),
+            failures
+        )
+    
+    @staticmethod
+    def _seasonal_naive_scale(
+        matrix: np.ndarray,
+        first_sale: np.ndarray,
+        origins: np.ndarray
+    ) -> np.ndarray:
+        """
+        计算MASE的分母：各折叠训练期内季节性朴素预测的平均绝对误差
+        
+        Returns:
+            形状为 (产品数, 折叠数) 的数组，无法计算时为NaN
+        """
+        period = BacktestService.SEASONAL_PERIOD
+        n_products, n_days = matrix.shape
+        differences = np.abs(matrix[:, period:] - matrix[:, :-period])
+        # differences[:, t] 对应第 t + period 天，只统计首次销售之后的部分
+        valid = np.arange(n_days - period)[None, :] >= first_sale[:, None]
+        
+        cumulative_error = np.zeros((n_products, n_days - period + 1))
+        cumulative_count = np.zeros((n_products, n_days - period + 1))
+        np.cumsum(np.where(valid, differences, 0), axis=1, out=cumulative_error[:, 1:])
+        np.cumsum(valid, axis=1, out=cumulative_count[:, 1:])
+        
+        end = origins - period
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scales = cumulative_error[:, end] / cumulative_count[:, end]
+        scales[~(scales > 0)] = np.nan
+        return scales
+    
+    @staticmethod
+    def _evaluate(
+        products: List[Any],
+        actuals: np.ndarray,
+        predictions: np.ndarray,
+        scales: np.ndarray,
+        fit_seconds: np.ndarray,
+        predict_seconds: np.ndarray
+    ) -> Dict[str, Any]:
+        """
+        以数组运算计算每个产品、每个类别和整体的WAPE、MASE和偏差
+        
+        Returns:
+            包含summary、by_category和by_product的字典
+        """
+        predicted = ~np.isnan(predictions)
+        errors = np.where(predicted, predictions - actuals, 0)
+        covered_actuals = np.where(predicted, actuals, 0)
+        
+        abs_error_sum = np.abs(errors).sum(axis=(1, 2))
+        error_sum = errors.sum(axis=(1, 2))
+        actual_sum = covered_actuals.sum(axis=(1, 2))
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fold_mae = np.abs(errors).sum(axis=2) / predicted.sum(axis=2)
+            mase = np.nanmean(np.where(predicted.any(axis=2), fold_mae / scales, np.nan), axis=1)
+            wape = abs_error_sum / actual_sum
+            bias = error_sum / actual_sum
+        
+        by_product_frame = pd.DataFrame({
+            'product_id': [product.id for product in products],
+            'sku': [product.sku for product in products],
+            'category': [product.category for product in products],
+            'abs_error': abs_error_sum,
+            'error': error_sum,
+            'actual': actual_sum,
+            'wape': wape,
+            'mase': mase,
+            'bias': bias,
+            'fit_seconds': fit_seconds,
+            'predict_seconds': predict_seconds
+        })
+        
+        by_category_frame = by_product_frame.groupby('category').agg(
+            abs_error=('abs_error', 'sum'),
+            error=('error', 'sum'),
+            actual=('actual', 'sum'),
+            mase=('mase', 'mean'),
+            products=('product_id', 'count'),
+            fit_seconds=('fit_seconds', 'sum'),
+            predict_seconds=('predict_seconds', 'sum')
+        ).reset_index()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            by_category_frame['wape'] = by_category_frame['abs_error'] / by_category_frame['actual']
+            by_category_frame['bias'] = by_category_frame['error'] / by_category_frame['actual']
+        
+        total_actual = actual_sum.sum()
+        summary = {
+            'products': len(products),
+            'wape': _metric(abs_error_sum.sum() / total_actual) if total_actual else None,
+            'mase': _metric(np.nanmean(mase)) if np.isfinite(mase).any() else None,
+            'bias': _metric(error_sum.sum() / total_actual) if total_actual else None,
+            'fit_seconds': round(float(fit_seconds.sum()), 3),
+            'predict_seconds': round(float(predict_seconds.sum()), 3)
+        }
+        
+        return {
+            'summary': summary,
+            'by_category': [
+                {
+                    'category': row.category,
+                    'products': int(row.products),
+                    'wape': _metric(row.wape),
+                    'mase': _metric(row.mase),
+                    'bias': _metric(row.bias),
+                    'fit_seconds': round(float(row.fit_seconds), 3),
+                    'predict_seconds': round(float(row.predict_seconds), 3)
+                }
+                for row in by_category_frame.itertuples()
+            ],
+            'by_product': [
+                {
+                    'product_id': int(row.product_id),
+                    'sku': row.sku,
+                    'category': row.category,
+                    'wape': _metric(row.wape),
+                    'mase': _metric(row.mase),
+                    'bias': _metric(row.bias),
+                    'fit_seconds': round(float(row.fit_seconds), 4),
+                    'predict_seconds': round(float(row.predict_seconds), 4)
+                }
+                for row in by_product_frame.itertuples()
+            ]
+        }
+
+
+def _metric(value: float) -> Optional[float]:
+    """将指标四舍五入，NaN/inf转换为None以便JSON序列化"""
+    value = float(value)
+    return round(value, 4) if np.isfinite(value) else None
+
+
+# 以下回测模型定义在模块级别，以便ProcessPoolExecutor在子进程中序列化调用
+# 每个模型由 (拟合函数, 预测函数) 组成：
+#   拟合函数(history, dates) -> 模型状态
+#   预测函数(state, history, future_dates) -> 预测值
+
+def _fit_seasonal_naive(history: np.ndarray, dates: pd.DatetimeIndex) -> np.ndarray:
+    return history[-BacktestService.SEASONAL_PERIOD:]
+
+
+def _predict_seasonal_naive(state: np.ndarray, history: np.ndarray, future_dates: pd.DatetimeIndex) -> np.ndarray:
+    return np.resize(state, len(future_dates))
+
+
+def _fit_sarima(history: np.ndarray, dates: pd.DatetimeIndex) -> Any:
+    model = SARIMAX(
+        pd.Series(history, index=dates),
+        order=ForecastService.SARIMA_ORDER,
+        seasonal_order=ForecastService.SARIMA_SEASONAL_ORDER,
+        enforce_stationarity=False,
+        enforce_invertibility=False
+    )
+    return model.fit(disp=False)
+
+
+def _predict_sarima(state: Any, history: np.ndarray, future_dates: pd.DatetimeIndex) -> np.ndarray:
+    return np.asarray(state.forecast(steps=len(future_dates)))
+
+
+def _fit_random_forest(history: np.ndarray, dates: pd.DatetimeIndex) -> Tuple[RandomForestRegressor, StandardScaler]:
+    features_df = ForecastService._extract_features(pd.DataFrame({'quantity': history}, index=dates))
+    X = features_df.drop('quantity', axis=1)
+    y = features_df['quantity']
+    scaler = StandardScaler()
+    model = RandomForestRegressor(**ForecastService.RANDOM_FOREST_PARAMS)
+    model.fit(scaler.fit_transform(X), y)
+    return model, scaler
+
+
+def _predict_random_forest(state: Any, history: np.ndarray, future_dates: pd.DatetimeIndex) -> np.ndarray:
+    model, scaler = state
+    return ForecastService._recursive_forecast(model, scaler, history, future_dates)
+
+
+def _fit_croston(history: np.ndarray, dates: pd.DatetimeIndex) -> float:
+    rate = ForecastService._intermittent_demand_rate(
+        history[None, :],
+        ForecastService.INTERMITTENT_METHOD,
+        ForecastService.INTERMITTENT_ALPHA,
+        ForecastService.INTERMITTENT_BETA
+    )
+    return float(rate[0])
+
+
+def _predict_croston(state: float, history: np.ndarray, future_dates: pd.DatetimeIndex) -> np.ndarray:
+    return np.full(len(future_dates), state)
+
+
+_BACKTEST_MODELS = {
+    'SeasonalNaive': (_fit_seasonal_naive, _predict_seasonal_naive),
+    'Croston': (_fit_croston, _predict_croston),
+    'SARIMA': (_fit_sarima, _predict_sarima),
+    'RandomForest': (_fit_random_forest, _predict_random_forest),
+}
+
+
+def _backtest_fold(task: Tuple) -> Tuple[int, int, Optional[np.ndarray], Optional[str], float, float]:
+    """
+    拟合并预测单个(产品, 折叠)，记录拟合和预测耗时
+    
+    Args:
+        task: (模型类型, 产品序号, 折叠序号, 训练期销量, 训练期起始日期, 预测天数)
+    
+    Returns:
+        (产品序号, 折叠序号, 预测值, 错误信息, 拟合耗时, 预测耗时)
+    """
+    model_type, product_index, fold, history, start_date, horizon = task
+    fit, predict = _BACKTEST_MODELS[model_type]
+    dates = pd.date_range(start=start_date, periods=len(history), freq='D')
+    future_dates = pd.date_range(start=dates[-1] + timedelta(days=1), periods=horizon, freq='D')
+    
+    fit_started_at = time.perf_counter()
+    try:
+        state = fit(history, dates)
+    except Exception as e:
+        return product_index, fold, None, str(e), time.perf_counter() - fit_started_at, 0.0
+    fit_time = time.perf_counter() - fit_started_at
+    
+    predict_started_at = time.perf_counter()
+    try:
+        predictions = predict(state, history, future_dates)
+    except Exception as e:
+        return product_index, fold, None, str(e), fit_time, time.perf_counter() - predict_started_at
+    return product_index, fold, predictions, None, fit_time, time.perf_counter() - predict_started_at
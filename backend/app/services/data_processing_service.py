@@ -6,7 +6,9 @@ from fastapi import HTTPException, status
 from datetime import datetime, timedelta
 
 from app.models.product import Product
-from app.models.sale import Sale
+from app.models.sales_daily import SalesDaily
+from app.services.forecast_service import ForecastService
+from app.services.seasonality_service import SeasonalityService
 
 
 class DataProcessingService:
@@ -165,10 +167,10 @@ class DataProcessingService:
         """
         # 获取销售数据
         start_date = datetime.now() - timedelta(days=days)
-        sales = db.query(Sale).filter(
-            Sale.product_id == product_id,
-            Sale.sale_date >= start_date
-        ).order_by(Sale.sale_date).all()
+        sales = db.query(SalesDaily).filter(
+            SalesDaily.product_id == product_id,
+            SalesDaily.sale_date >= start_date
+        ).order_by(SalesDaily.sale_date).all()
         
         if not sales:
             raise HTTPException(
@@ -202,26 +204,24 @@ class DataProcessingService:
             'avg_daily_sales': round(daily_sales['quantity'].mean(), 2),
             'max_daily_sales': int(daily_sales['quantity'].max()),
             'days_with_sales': int((daily_sales['quantity'] > 0).sum()),
-            'days_without_sales': int((daily_sales['quantity'] == 0).sum())
+            'days_without_sales': int((daily_sales['quantity'] == 0).sum()),
+            'zero_demand_ratio': round(float((daily_sales['quantity'] == 0).mean()), 4)
         }
         
-        # 分析每周销售模式
-        weekly_pattern = daily_sales.groupby('day_of_week')['quantity'].agg([
-            ('mean', 'mean'),
-            ('count', 'count'),
-            ('sum', 'sum')
-        ]).round(2)
+        # 根据零需求占比推荐预测模型（间歇需求使用Croston类模型）
+        recommended_model_type = ForecastService.recommend_model_type(
+            stats['zero_demand_ratio'], len(daily_sales)
+        )
+        
+        # 周/月销售模式和季节性取自产品的季节性档案（覆盖完整历史并增量维护）
+        profile = SeasonalityService.get_profiles(db, [product_id])[product_id]
+        weekly_averages = profile['weekday_averages']
         
         # 找出销售最好的日子
-        best_day = weekly_pattern['mean'].idxmax()
         day_names = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
-        
-        # 分析月度销售模式
-        monthly_pattern = daily_sales.groupby('month')['quantity'].agg([
-            ('mean', 'mean'),
-            ('count', 'count'),
-            ('sum', 'sum')
-        ]).round(2)
+        best_day = max(weekly_averages, key=weekly_averages.get) if weekly_averages else int(
+            daily_sales.groupby('day_of_week')['quantity'].mean().idxmax()
+        )
         
         # 检测销售趋势
         # 使用7天移动平均线
@@ -233,12 +233,7 @@ class DataProcessingService:
         z = np.polyfit(x, y, 1)
         trend = 'increasing' if z[0] > 0 else 'decreasing' if z[0] < 0 else 'stable'
         
-        # 检测季节性（如果有足够的数据）
-        has_seasonality = False
-        if len(daily_sales) >= 14:
-            # 计算自相关系数
-            autocorr = daily_sales['quantity'].autocorr(lag=7)
-            has_seasonality = abs(autocorr) > 0.3
+        has_seasonality = profile['has_seasonality']
         
         return {
             'product_id': product_id,
@@ -246,16 +241,22 @@ class DataProcessingService:
             'basic_stats': stats,
             'weekly_pattern': {
                 'best_selling_day': day_names[best_day],
-                'daily_averages': weekly_pattern['mean'].to_dict()
+                'daily_averages': weekly_averages,
+                'weekday_indices': profile['weekday_indices']
             },
             'monthly_pattern': {
-                'monthly_averages': monthly_pattern['mean'].to_dict()
+                'monthly_averages': {month + 1: value for month, value in profile['monthly_averages'].items()},
+                'monthly_indices': profile['monthly_indices'],
+                'peak_months': profile['peak_months']
             },
             'trends': {
                 'overall_trend': trend,
                 'has_weekly_seasonality': has_seasonality,
+                'weekly_autocorrelation': profile['weekly_autocorrelation'],
+                'is_peak_season': profile['is_peak_season'],
                 'trend_strength': abs(z[0])  # 趋势强度
             },
+            'recommended_model_type': recommended_model_type,
             'recommendations': [
                 f"最佳销售日是{day_names[best_day]}，建议该日增加库存",
                 "检测到明显的周季节性" if has_seasonality else "未检测到明显的周季节性",
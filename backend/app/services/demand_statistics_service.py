@@ -0,0 +1,416 @@
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import func, bindparam
+from sqlalchemy.orm import Session
+
+from app.db.upsert import insert_on_conflict
+from app.models.product import Product
+from app.models.sales_daily import SalesDaily
+from app.models.demand_statistics import DemandStatistics
+from app.services.forecast_service import ForecastService
+
+
+class DemandStatisticsService:
+    """
+    需求统计服务：维护每个产品每日销量的累计统计
+    
+    全部历史的统计以Welford方式（天数、均值、M2）累计有销售的日期，零销量日期在读取时
+    按首次销售以来的天数合并；最近WINDOW_DAYS天的每日销量单独保存，用于任意天数窗口的统计。
+    销售记录增删改时只更新受影响的那一天，读取时不再扫描销售历史。
+    """
+    
+    WINDOW_DAYS = 366  # 保存的最近每日销量天数，覆盖12个月（按每月30天）的统计窗口
+    STATE_COLUMNS = (
+        'product_id', 'first_sale_date', 'sales_days', 'sales_mean', 'sales_m2',
+        'window_end_date', 'recent_quantities'
+    )  # 增量维护时读取和写回的列
+    
+    @staticmethod
+    def apply_sale_changes(db: Session, changes: List[Tuple[int, Any, float]]):
+        """
+        将销售记录的变动累加到需求统计（不提交事务）
+        
+        必须在销售记录的变动写入会话之前调用，同一产品同一天的多个变动会先合并。
+        受影响产品的统计行以一次IN查询按产品ID顺序加锁读取，早于最近窗口的日期的原销量
+        从每日销售汇总一次查出，变化在内存中依次计算后以一条UPDATE语句配合executemany写回。
+        没有统计记录的产品跳过，首次读取时会从销售历史完整构建。
+        与rebuild_statistics一样先按产品ID顺序锁定产品行：构建中的产品，销售变动等待构建提交后
+        再累加；已开始累加的产品，构建等待销售提交后再读取每日销售汇总，两者不会互相遗漏或覆盖。
+        
+        Args:
+            db: 数据库会话
+            changes: (产品ID, 销售日期, 销量变化) 列表
+        """
+        deltas: Dict[Tuple[int, date], float] = {}
+        for product_id, sale_date, quantity in changes:
+            key = (product_id, _as_date(sale_date))
+            deltas[key] = deltas.get(key, 0) + quantity
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        
+        product_ids = {product_id for product_id, _ in deltas}
+        DemandStatisticsService._lock_products(db, product_ids)
+        # 锁定统计行，避免并发写入互相覆盖；按产品ID顺序加锁，并发批次不会死锁
+        records = {
+            row.product_id: dict(row._mapping)
+            for row in db.query(
+                *[getattr(DemandStatistics, column) for column in DemandStatisticsService.STATE_COLUMNS]
+            ).filter(
+                DemandStatistics.product_id.in_(product_ids)
+            ).order_by(DemandStatistics.product_id).with_for_update().all()
+        }
+        if not records:
+            return
+        
+        # 不在最近窗口内的日期，原销量一次从每日销售汇总查出
+        outside = {
+            (product_id, sale_date) for product_id, sale_date in deltas
+            if product_id in records and _window_offset(records[product_id], sale_date) is None
+            and not (records[product_id]['window_end_date'] and sale_date > records[product_id]['window_end_date'])
+        }
+        stored_totals: Dict[Tuple[int, date], float] = {}
+        if outside:
+            rows = db.query(SalesDaily.product_id, SalesDaily.sale_date, SalesDaily.quantity).filter(
+                SalesDaily.product_id.in_({product_id for product_id, _ in outside}),
+                SalesDaily.sale_date.in_({sale_date for _, sale_date in outside})
+            ).all()
+            stored_totals = {
+                (row.product_id, row.sale_date): float(row.quantity)
+                for row in rows if (row.product_id, row.sale_date) in outside
+            }
+        
+        # 每个产品按日期顺序依次累加
+        for (product_id, sale_date), delta in sorted(deltas.items()):
+            record = records.get(product_id)
+            if record is None:
+                continue
+            DemandStatisticsService._apply_change(
+                db, record, sale_date, delta, stored_totals.get((product_id, sale_date), 0.0)
+            )
+        
+        table = DemandStatistics.__table__
+        columns = [column for column in DemandStatisticsService.STATE_COLUMNS if column != 'product_id']
+        # 绑定参数名不能与SET中的列名相同
+        db.execute(
+            table.update().where(
+                table.c.product_id == bindparam('b_product_id')
+            ).values(
+                dict({column: bindparam(f'b_{column}') for column in columns}, updated_at=func.now())
+            ),
+            [{f'b_{key}': value for key, value in record.items()} for record in records.values()]
+        )
+    
+    @staticmethod
+    def _apply_change(db: Session, record: Dict[str, Any], sale_date: date, delta: float, stored_total: float):
+        """
+        在内存中更新单个产品某一天的销量变化
+        
+        Args:
+            db: 数据库会话
+            record: 统计行各列的字典，原地更新
+            sale_date: 销售日期
+            delta: 销量变化
+            stored_total: 日期不在最近窗口内时，每日销售汇总中该日期的原销量
+        """
+        recent = list(record['recent_quantities'] or [])
+        window_end = record['window_end_date']
+        
+        # 当天原销量优先从最近窗口读取，晚于窗口末尾的日期原销量为0
+        offset = _window_offset(record, sale_date)
+        if offset is not None:
+            old_total = recent[len(recent) - 1 - offset]
+        elif window_end and sale_date > window_end:
+            old_total = 0.0
+        else:
+            old_total = stored_total
+        new_total = max(old_total + delta, 0.0)
+        
+        count, mean, m2 = record['sales_days'] or 0, record['sales_mean'] or 0.0, record['sales_m2'] or 0.0
+        if old_total > 0:
+            count, mean, m2 = _welford_remove(count, mean, m2, old_total)
+        if new_total > 0:
+            count, mean, m2 = _welford_add(count, mean, m2, new_total)
+        record['sales_days'], record['sales_mean'], record['sales_m2'] = count, mean, m2
+        
+        # 新日期晚于窗口末尾时窗口向前滚动
+        window_size = DemandStatisticsService.WINDOW_DAYS
+        if window_end is None or sale_date > window_end:
+            shift = (sale_date - window_end).days if window_end else window_size
+            recent = (recent + [0.0] * shift)[-window_size:]
+            recent = [0.0] * (window_size - len(recent)) + recent
+            window_end = sale_date
+        offset = (window_end - sale_date).days
+        if offset < len(recent):
+            recent[len(recent) - 1 - offset] = new_total
+        record['recent_quantities'] = recent
+        record['window_end_date'] = window_end
+        
+        first_sale_date = record['first_sale_date']
+        if new_total > 0 and (first_sale_date is None or sale_date < first_sale_date):
+            record['first_sale_date'] = sale_date
+        elif new_total == 0 and sale_date == first_sale_date:
+            # 首次销售被清零，改为之后最早有销售的日期；更晚的日期尚未累加，仍读取汇总中的原值
+            record['first_sale_date'] = db.query(func.min(SalesDaily.sale_date)).filter(
+                SalesDaily.product_id == record['product_id'],
+                SalesDaily.sale_date > sale_date,
+                SalesDaily.quantity > 0
+            ).scalar()
+    
+    @staticmethod
+    def rebuild_statistics(db: Session, product_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        从销售历史完整构建需求统计
+        
+        全部历史的天数、均值和离差平方和在数据库中从每日销售汇总按产品聚合得到，最近窗口通过
+        一次查询构建。结果以INSERT ... ON CONFLICT DO UPDATE写入，并发的首次读取同时构建
+        同一产品时不会违反product_id的唯一约束。
+        读取销售汇总前按产品ID顺序锁定产品行（与apply_sale_changes相同），构建期间这些产品的
+        销售写入会等待，构建整个产品表时应在业务低峰运行。
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表，为空时处理所有产品
+        
+        Returns:
+            构建的产品数
+        """
+        if product_ids is None:
+            product_ids = [row.id for row in db.query(Product.id).all()]
+        if not product_ids:
+            return {'rebuilt_count': 0}
+        
+        DemandStatisticsService._lock_products(db, product_ids)
+        # 按产品ID顺序写入，并发构建重叠的产品集合时加锁顺序一致
+        rows = sorted(DemandStatisticsService._build_rows(db, product_ids), key=lambda row: row['product_id'])
+        statement = insert_on_conflict(db, DemandStatistics.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=['product_id'],
+            set_=dict(
+                {column: statement.excluded[column] for column in rows[0] if column != 'product_id'},
+                updated_at=func.now()
+            )
+        )
+        db.execute(statement, rows)
+        db.commit()
+        
+        return {'rebuilt_count': len(rows)}
+    
+    @staticmethod
+    def _lock_products(db: Session, product_ids):
+        """按产品ID顺序锁定产品行，串行化同一产品的统计增量更新和完整构建（不提交事务）"""
+        db.query(Product.id).filter(
+            Product.id.in_(product_ids)
+        ).order_by(Product.id).with_for_update().all()
+    
+    @staticmethod
+    def _build_rows(db: Session, product_ids: List[int]) -> List[Dict[str, Any]]:
+        """从每日销售汇总计算产品的需求统计行（不写入数据库）"""
+        totals = {
+            row.product_id: row
+            for row in db.query(
+                SalesDaily.product_id,
+                func.min(SalesDaily.sale_date).label('first_sale_date'),
+                func.count().label('sales_days'),
+                func.sum(SalesDaily.quantity).label('total'),
+                func.sum(SalesDaily.quantity * SalesDaily.quantity).label('total_sq')
+            ).filter(
+                SalesDaily.product_id.in_(product_ids),
+                SalesDaily.quantity > 0
+            ).group_by(SalesDaily.product_id).all()
+        }
+        
+        window_end = date.today()
+        window_size = DemandStatisticsService.WINDOW_DAYS
+        sales_frame = ForecastService._query_daily_sales(db, product_ids, window_size)
+        _, _, matrix = ForecastService.build_sales_matrix(
+            sales_frame,
+            product_ids=product_ids,
+            start_date=window_end - timedelta(days=window_size - 1),
+            end_date=window_end
+        )
+        
+        rows = []
+        for index, product_id in enumerate(product_ids):
+            row = totals.get(product_id)
+            count = int(row.sales_days) if row else 0
+            mean = float(row.total) / count if count else 0.0
+            m2 = max(float(row.total_sq) - float(row.total) * mean, 0.0) if count else 0.0
+            rows.append({
+                'product_id': product_id,
+                'first_sale_date': row.first_sale_date if row else None,
+                'sales_days': count,
+                'sales_mean': mean,
+                'sales_m2': m2,
+                'window_end_date': window_end,
+                'recent_quantities': matrix[index].astype(float).tolist()
+            })
+        return rows
+    
+    @staticmethod
+    def get_statistics(
+        db: Session,
+        product_ids: List[int],
+        days: Optional[int] = None,
+        persist: bool = True
+    ) -> Dict[str, np.ndarray]:
+        """
+        批量读取产品的每日需求统计，缺少统计记录的产品先完整构建
+        
+        统计从产品（窗口内的）首次销售开始，之后没有销售的日期按0计入，与安全库存计算的口径一致。
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表，决定结果数组的顺序
+            days: 统计最近多少天（不超过WINDOW_DAYS），为空时统计全部历史
+            persist: 是否保存新构建的统计记录（会提交事务），为False时只在内存中构建
+        
+        Returns:
+            与product_ids顺序一致的数组：observed_days（首次销售以来的天数）、sales_days、mean、std
+        """
+        if days is not None and days > DemandStatisticsService.WINDOW_DAYS:
+            raise ValueError(f"统计窗口不能超过{DemandStatisticsService.WINDOW_DAYS}天")
+        
+        records = DemandStatisticsService._load_records(db, product_ids)
+        missing = [product_id for product_id in product_ids if product_id not in records]
+        if missing and persist:
+            DemandStatisticsService.rebuild_statistics(db, missing)
+            records.update(DemandStatisticsService._load_records(db, missing))
+        elif missing:
+            records.update(
+                (row['product_id'], DemandStatistics(**row))
+                for row in DemandStatisticsService._build_rows(db, missing)
+            )
+        
+        today = date.today()
+        result = {
+            'observed_days': np.zeros(len(product_ids)),
+            'sales_days': np.zeros(len(product_ids)),
+            'mean': np.zeros(len(product_ids)),
+            'std': np.zeros(len(product_ids))
+        }
+        if days is not None:
+            window = DemandStatisticsService._window_matrix(
+                [records[product_id] for product_id in product_ids], today, days
+            )
+        
+        for index, product_id in enumerate(product_ids):
+            record = records[product_id]
+            if record.first_sale_date is None:
+                continue
+            if days is None:
+                # 有销售日期的统计与零销量日期（均值0、M2为0）合并
+                count = record.sales_days
+                observed_days = max((today - record.first_sale_date).days + 1, count)
+                mean = record.sales_mean * count / observed_days
+                m2 = record.sales_m2 + record.sales_mean ** 2 * count * (observed_days - count) / observed_days
+                result['observed_days'][index] = observed_days
+                result['sales_days'][index] = count
+                result['mean'][index] = mean
+                result['std'][index] = np.sqrt(max(m2, 0.0) / observed_days)
+            else:
+                # 从窗口内的首次销售开始统计
+                has_sales = window[index] > 0
+                if not has_sales.any():
+                    continue
+                values = window[index, has_sales.argmax():]
+                result['observed_days'][index] = len(values)
+                result['sales_days'][index] = (values > 0).sum()
+                result['mean'][index] = values.mean()
+                result['std'][index] = values.std()
+        return result
+    
+    @staticmethod
+    def get_product_statistics(db: Session, product_id: int, days: Optional[int] = None) -> Dict[str, Any]:
+        """
+        读取单个产品的需求统计
+        
+        Args:
+            db: 数据库会话
+            product_id: 产品ID
+            days: 统计最近多少天，为空时统计全部历史
+        
+        Returns:
+            需求统计字典
+        """
+        product = db.query(Product.id).filter(Product.id == product_id).first()
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"未找到ID为 {product_id} 的产品"
+            )
+        try:
+            statistics = DemandStatisticsService.get_statistics(db, [product_id], days)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        return {
+            'product_id': product_id,
+            'days': days,
+            'observed_days': int(statistics['observed_days'][0]),
+            'sales_days': int(statistics['sales_days'][0]),
+            'mean_daily_demand': round(float(statistics['mean'][0]), 4),
+            'std_daily_demand': round(float(statistics['std'][0]), 4)
+        }
+    
+    @staticmethod
+    def _load_records(db: Session, product_ids: List[int]) -> Dict[int, DemandStatistics]:
+        return {
+            record.product_id: record
+            for record in db.query(DemandStatistics).filter(
+                DemandStatistics.product_id.in_(product_ids)
+            ).all()
+        }
+    
+    @staticmethod
+    def _window_matrix(records: List[DemandStatistics], end_date: date, size: int) -> np.ndarray:
+        """把各产品保存的最近每日销量对齐到以end_date结尾的 产品 × 日期 矩阵"""
+        matrix = np.zeros((len(records), size))
+        for index, record in enumerate(records):
+            if record.window_end_date is None or not record.recent_quantities:
+                continue
+            recent = np.asarray(record.recent_quantities, dtype=float)
+            # 窗口末尾之后没有销售的日期为0；晚于end_date的日期不计入
+            shift = (end_date - record.window_end_date).days
+            if shift >= 0:
+                aligned = np.concatenate([recent, np.zeros(shift)])[-size:]
+            else:
+                aligned = recent[:shift][-size:]
+            matrix[index, size - len(aligned):] = aligned
+        return matrix
+
+
+def _as_date(value: Any) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _window_offset(record: Dict[str, Any], sale_date: date) -> Optional[int]:
+    """日期在最近窗口中距窗口末尾的天数，不在窗口内时返回None"""
+    window_end = record['window_end_date']
+    if window_end is None:
+        return None
+    offset = (window_end - sale_date).days
+    return offset if 0 <= offset < len(record['recent_quantities'] or []) else None
+
+
+def _welford_add(count: int, mean: float, m2: float, value: float) -> Tuple[int, float, float]:
+    """Welford算法加入一个观测值"""
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return count, mean, m2
+
+
+def _welford_remove(count: int, mean: float, m2: float, value: float) -> Tuple[int, float, float]:
+    """Welford算法移除一个观测值"""
+    if count <= 1:
+        return 0, 0.0, 0.0
+    new_mean = (count * mean - value) / (count - 1)
+    m2 -= (value - mean) * (value - new_mean)
+    return count - 1, new_mean, max(m2, 0.0)
@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from app.core.config import settings
+
+# 事件主题
+STOCK_CHANGED = "stock.changed"  # 产品库存变化（update_stock提交之后）
+REPLENISHMENT_RECEIVED = "replenishment.received"  # 补货到货确认（confirm_replenishment提交之后）
+
+EventHandler = Callable[[List[Dict[str, Any]]], None]
+
+
+class EventBus:
+    """
+    进程内事件总线：发布方把事件放入队列后立即返回，后台线程按批投递给订阅者
+    
+    收到第一个事件后最多等待一个批次窗口以凑满一批，同一主题的事件一次性交给每个订阅者，
+    订阅者在后台线程中执行，抛出的异常只计入统计，不影响发布方和其他订阅者。
+    没有订阅者的主题不会入队。
+    """
+    
+    def __init__(self, batch_max_size: int, batch_window_ms: int, queue_max_size: int):
+        """
+        Args:
+            batch_max_size: 每批投递的最大事件数
+            batch_window_ms: 凑批等待时间（毫秒）
+            queue_max_size: 队列中待投递事件的上限
+        """
+        self.batch_max_size = batch_max_size
+        self.batch_window = batch_window_ms / 1000
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=queue_max_size)
+        self._subscribers: Dict[str, List[EventHandler]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stopping = threading.Event()
+        self._published = 0
+        self._dropped = 0
+        self._batches = 0
+        self._handler_errors = 0
+        self._last_error = None
+    
+    def subscribe(self, topic: str, handler: EventHandler) -> None:
+        """
+        订阅主题，处理函数接收同一主题的一批事件
+        
+        Args:
+            topic: 事件主题
+            handler: 处理函数，参数为事件字典列表
+        """
+        with self._lock:
+            if handler not in self._subscribers[topic]:
+                self._subscribers[topic].append(handler)
+    
+    def unsubscribe(self, topic: str, handler: EventHandler) -> None:
+        """取消订阅"""
+        with self._lock:
+            if handler in self._subscribers[topic]:
+                self._subscribers[topic].remove(handler)
+    
+    def publish(self, topic: str, **payload: Any) -> bool:
+        """
+        发布事件，不等待订阅者处理
+        
+        Args:
+            topic: 事件主题
+            payload: 事件内容
+        
+        Returns:
+            事件是否入队（没有订阅者或队列已满时为False）
+        """
+        with self._lock:
+            if not self._subscribers.get(topic):
+                return False
+        
+        event = dict(payload, topic=topic, occurred_at=datetime.now())
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+        
+        with self._lock:
+            self._published += 1
+        self._ensure_worker()
+        return True
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        等待已发布的事件全部投递完成
+        
+        Returns:
+            是否在超时前完成
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """投递完剩余事件后停止后台线程"""
+        self.flush(timeout)
+        self._stopping.set()
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+        with self._lock:
+            self._worker = None
+        self._stopping.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取事件总线统计信息
+        
+        Returns:
+            包含发布、丢弃、批次数、订阅者和处理失败次数的字典
+        """
+        with self._lock:
+            return {
+                "published": self._published,
+                "dropped": self._dropped,
+                "pending": self._queue.qsize(),
+                "batches": self._batches,
+                "handler_errors": self._handler_errors,
+                "last_error": self._last_error,
+                "subscribers": {
+                    topic: len(handlers) for topic, handlers in self._subscribers.items() if handlers
+                }
+            }
+    
+    def _ensure_worker(self) -> None:
+        """首次发布时启动后台投递线程"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="event-bus", daemon=True)
+                self._worker.start()
+    
+    def _run(self) -> None:
+        """后台线程：取出一批事件并投递"""
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                self._dispatch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _dispatch(self, batch: List[Dict[str, Any]]) -> None:
+        """按主题分组后交给每个订阅者"""
+        by_topic: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for event in batch:
+            by_topic[event["topic"]].append(event)
+        
+        for topic, events in by_topic.items():
+            with self._lock:
+                handlers = list(self._subscribers.get(topic, []))
+            for handler in handlers:
+                try:
+                    handler(events)
+                except Exception as e:
+                    with self._lock:
+                        self._handler_errors += 1
+                        self._last_error = f"{topic}: {type(e).__name__}: {e}"
+        
+        with self._lock:
+            self._batches += 1
+
+
+event_bus = EventBus(
+    batch_max_size=settings.EVENT_BATCH_MAX_SIZE,
+    batch_window_ms=settings.EVENT_BATCH_WINDOW_MS,
+    queue_max_size=settings.EVENT_QUEUE_MAX_SIZE
+)
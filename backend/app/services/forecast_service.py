@@ -1,19 +1,31 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Union
 import pandas as pd
 import numpy as np
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
+from sqlalchemy import func
 import joblib
 import os
-from datetime import datetime, timedelta
+import time
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 from sklearn.ensemble import RandomForestRegressor
+try:
+    from sklearn.ensemble import HistGradientBoostingRegressor
+except ImportError:  # scikit-learn < 1.0 需要显式启用
+    from sklearn.experimental import enable_hist_gradient_boosting  # noqa: F401
+    from sklearn.ensemble import HistGradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+from app.core.config import settings
+from app.models.forecast import Forecast
 from app.models.product import Product
-from app.models.sale import Sale
+from app.models.sales_daily import SalesDaily
+from app.services.model_registry import model_registry
 
 class ForecastService:
     """
@@ -21,6 +33,28 @@ class ForecastService:
     """
     
     MODELS_DIR = "app/models/ml"
+    MIN_TRAINING_DAYS = 30  # 训练模型所需的最少天数
+    LAG_FEATURES = [1, 7, 14, 30]  # 滞后特征的天数
+    ROLLING_WINDOWS = [7, 14, 30]  # 滚动均值特征的窗口
+    GLOBAL_MODEL_FILE = "global.pkl"  # 跨产品全局模型文件名
+    GLOBAL_VALIDATION_DAYS = 14  # 全局模型评估使用的最近天数
+    REFRESH_CHUNK_SIZE = 1000  # 刷新预测表时每批处理的产品数
+    SARIMA_ORDER = (1, 1, 1)
+    SARIMA_SEASONAL_ORDER = (1, 1, 1, 7)  # 以周为季节周期
+    SARIMA_REFIT_INTERVAL_DAYS = 30  # 增量更新模式下完整重新拟合的间隔天数
+    SARIMA_DRIFT_FACTOR = 2.0  # 最近的一步预测误差超过样本内误差的该倍数时视为漂移
+    SARIMA_DRIFT_WINDOW_DAYS = 14  # 漂移检测使用的最近一步预测误差天数
+    SARIMA_DRIFT_MIN_OBSERVATIONS = 7  # 累计的一步预测误差少于该天数时不做漂移检测
+    RANDOM_FOREST_PARAMS = {'n_estimators': 100, 'max_depth': 10, 'random_state': 42}
+    GLOBAL_MODEL_PARAMS = {'max_iter': 200, 'learning_rate': 0.1, 'random_state': 42}
+    INTERMITTENT_METHODS = ('Croston', 'SBA', 'TSB')
+    INTERMITTENT_METHOD = 'SBA'  # 间歇需求模型的默认方法（Syntetos-Boylan修正的Croston）
+    INTERMITTENT_ALPHA = 0.1  # 需求量（及Croston间隔）的平滑系数
+    INTERMITTENT_BETA = 0.1  # TSB需求发生概率的平滑系数
+    INTERMITTENT_HISTORY_DAYS = 180  # 间歇需求模型使用的历史天数
+    INTERMITTENT_ZERO_RATIO = 0.5  # 零需求天数占比达到该值时自动选择间歇需求模型
+    ORDERING_COST = 100  # 简化EOQ假设的每次订货成本
+    HOLDING_COST_RATE = 0.2  # 简化EOQ假设的年库存持有成本率
     
     @staticmethod
     def _ensure_model_dir():
@@ -43,11 +77,11 @@ class ForecastService:
         # 计算开始日期
         start_date = datetime.now() - timedelta(days=days)
         
-        # 查询销售数据
-        sales = db.query(Sale).filter(
-            Sale.product_id == product_id,
-            Sale.sale_date >= start_date
-        ).order_by(Sale.sale_date).all()
+        # 从每日销售汇总查询销售数据
+        sales = db.query(SalesDaily).filter(
+            SalesDaily.product_id == product_id,
+            SalesDaily.sale_date >= start_date
+        ).order_by(SalesDaily.sale_date).all()
         
         if not sales:
             raise HTTPException(
@@ -76,6 +110,131 @@ class ForecastService:
         
         return daily_sales
     
+    @staticmethod
+    def _query_daily_sales(
+        db: Session,
+        product_ids: List[int],
+        days: int = 90
+    ) -> pd.DataFrame:
+        """
+        一次查询获取多个产品按日聚合的销售数据（长表格式）
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表
+            days: 获取最近多少天的数据
+            
+        Returns:
+            包含 product_id, date, quantity 列的DataFrame，只包含有销售的日期
+        """
+        if not product_ids:
+            return pd.DataFrame(columns=['product_id', 'date', 'quantity'])
+        
+        # 计算开始日期
+        start_date = datetime.now() - timedelta(days=days)
+        
+        # 每日销售汇总已按产品和日期聚合
+        rows = db.query(
+            SalesDaily.product_id,
+            SalesDaily.sale_date,
+            SalesDaily.quantity
+        ).filter(
+            SalesDaily.product_id.in_(product_ids),
+            SalesDaily.sale_date >= start_date
+        ).order_by(
+            SalesDaily.product_id,
+            SalesDaily.sale_date
+        ).all()
+        
+        sales_frame = pd.DataFrame(rows, columns=['product_id', 'date', 'quantity'])
+        sales_frame['date'] = pd.to_datetime(sales_frame['date'])
+        
+        return sales_frame
+    
+    @staticmethod
+    def _get_sales_data_batch(
+        db: Session,
+        product_ids: List[int],
+        days: int = 90
+    ) -> Dict[int, pd.DataFrame]:
+        """
+        一次查询获取多个产品的按日销售数据
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表
+            days: 获取最近多少天的数据
+            
+        Returns:
+            产品ID到按日销售DataFrame的映射，没有销售数据的产品不包含在内
+        """
+        sales_frame = ForecastService._query_daily_sales(db, product_ids, days)
+        
+        # 与_get_sales_data保持一致：按日重采样并将缺失日期填充为0
+        sales_by_product = {}
+        for product_id, group in sales_frame.groupby('product_id', sort=False):
+            daily_sales = group.set_index('date')[['quantity']].resample('D').sum().fillna(0)
+            sales_by_product[int(product_id)] = daily_sales
+        
+        return sales_by_product
+    
+    @staticmethod
+    def build_sales_matrix(
+        sales_frame: pd.DataFrame,
+        product_ids: Optional[List[int]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Tuple[np.ndarray, pd.DatetimeIndex, np.ndarray]:
+        """
+        将长表格式的销售数据转换为 产品 × 日期 的销量矩阵，缺失日期填充为0
+        
+        Args:
+            sales_frame: 包含 product_id, date, quantity 列的DataFrame
+            product_ids: 矩阵的行顺序，为空时使用数据中出现的产品（升序）
+            start_date: 矩阵的起始日期，默认取数据中的最早日期
+            end_date: 矩阵的结束日期，默认取数据中的最晚日期
+            
+        Returns:
+            (产品ID数组, 日期索引, 形状为 (产品数, 天数) 的float32销量矩阵)
+        """
+        dates_column = pd.to_datetime(sales_frame['date']).dt.normalize()
+        
+        if product_ids is None:
+            row_ids = np.unique(sales_frame['product_id'].to_numpy()).astype(np.int64)
+        else:
+            row_ids = np.asarray(product_ids, dtype=np.int64)
+        
+        if start_date is None:
+            start_date = dates_column.min() if len(dates_column) else pd.Timestamp.now().normalize()
+        if end_date is None:
+            end_date = dates_column.max() if len(dates_column) else pd.Timestamp(start_date)
+        dates = pd.date_range(
+            start=pd.Timestamp(start_date).normalize(),
+            end=pd.Timestamp(end_date).normalize(),
+            freq='D'
+        )
+        
+        matrix = np.zeros((len(row_ids), len(dates)), dtype=np.float32)
+        if len(sales_frame) == 0 or len(row_ids) == 0 or len(dates) == 0:
+            return row_ids, dates, matrix
+        
+        # 通过整数位置一次性散列到矩阵中，避免逐产品的pivot/resample
+        sorter = np.argsort(row_ids)
+        product_values = sales_frame['product_id'].to_numpy().astype(np.int64)
+        row_positions = np.searchsorted(row_ids, product_values, sorter=sorter)
+        row_positions = np.minimum(row_positions, len(row_ids) - 1)
+        known = row_ids[sorter[row_positions]] == product_values
+        col_positions = ((dates_column - dates[0]).dt.days).to_numpy()
+        in_range = known & (col_positions >= 0) & (col_positions < len(dates))
+        
+        np.add.at(
+            matrix,
+            (sorter[row_positions[in_range]], col_positions[in_range]),
+            sales_frame['quantity'].to_numpy(dtype=np.float32)[in_range]
+        )
+        
+        return row_ids, dates, matrix
+    
     @staticmethod
     def _extract_features(df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -98,12 +257,13 @@ class ForecastService:
         df_features['is_weekend'] = df_features['day_of_week'].isin([5, 6]).astype(int)
         
         # 添加滞后特征
-        for lag in [1, 7, 14, 30]:
+        for lag in ForecastService.LAG_FEATURES:
             df_features[f'lag_{lag}'] = df_features['quantity'].shift(lag)
         
-        # 添加滚动均值特征
-        for window in [7, 14, 30]:
-            df_features[f'rolling_mean_{window}'] = df_features['quantity'].rolling(window=window).mean()
+        # 添加滚动均值特征（只使用前一天及之前的数据，避免包含当天的目标值）
+        previous_quantity = df_features['quantity'].shift(1)
+        for window in ForecastService.ROLLING_WINDOWS:
+            df_features[f'rolling_mean_{window}'] = previous_quantity.rolling(window=window).mean()
         
         # 填充缺失值
         df_features = df_features.fillna(0)
@@ -111,13 +271,166 @@ class ForecastService:
         return df_features
     
     @staticmethod
-    def train_sarima_model(db: Session, product_id: int) -> Dict[str, Any]:
+    def _extract_panel_features(
+        sales: Union[pd.DataFrame, np.ndarray],
+        dates: Optional[pd.DatetimeIndex] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        对多个产品同时提取与_extract_features相同的特征
+        
+        滞后特征通过整块数组平移得到，滚动均值通过累计和相减得到，
+        所有产品在几次向量化运算内完成，不再逐产品、逐窗口调用shift/rolling。
+        
+        Args:
+            sales: 长表格式的销售DataFrame（product_id, date, quantity），
+                   或形状为 (产品数, 天数) 的销量矩阵
+            dates: 销量矩阵各列对应的日期，传入矩阵时必填
+            
+        Returns:
+            (特征矩阵, 目标值)：特征矩阵形状为 (产品数 * 天数, 特征数)，dtype为float32，
+            行按产品优先排列，列顺序与_extract_features去掉quantity后一致
+        """
+        if isinstance(sales, pd.DataFrame):
+            _, dates, matrix = ForecastService.build_sales_matrix(sales)
+        else:
+            if dates is None:
+                raise ValueError("传入销量矩阵时必须提供对应的日期")
+            matrix = np.asarray(sales, dtype=np.float32)
+        
+        n_products, n_days = matrix.shape
+        lags = ForecastService.LAG_FEATURES
+        windows = ForecastService.ROLLING_WINDOWS
+        calendar = ForecastService._calendar_features(dates)
+        n_calendar = calendar.shape[1]
+        
+        features = np.zeros(
+            (n_products, n_days, n_calendar + len(lags) + len(windows)),
+            dtype=np.float32
+        )
+        features[:, :, :n_calendar] = calendar
+        
+        # 滞后特征：整块平移，前面不足的部分保持为0
+        for index, lag in enumerate(lags):
+            if lag < n_days:
+                features[:, lag:, n_calendar + index] = matrix[:, :-lag]
+        
+        # 滚动均值：cumulative[:, t] 为前t天销量之和，窗口和 = cumulative[:, t] - cumulative[:, t - window]
+        cumulative = np.zeros((n_products, n_days + 1), dtype=np.float64)
+        np.cumsum(matrix, axis=1, out=cumulative[:, 1:])
+        for index, window in enumerate(windows):
+            if window < n_days:
+                window_sums = cumulative[:, window:n_days] - cumulative[:, :n_days - window]
+                features[:, window:, n_calendar + len(lags) + index] = window_sums / window
+        
+        return (
+            features.reshape(n_products * n_days, -1),
+            matrix.reshape(-1)
+        )
+    
+    @staticmethod
+    def _calendar_features(dates: pd.DatetimeIndex) -> np.ndarray:
+        """
+        生成与_extract_features顺序一致的日期特征矩阵
+        
+        Args:
+            dates: 日期索引
+            
+        Returns:
+            形状为 (天数, 6) 的日期特征数组
+        """
+        day_of_week = dates.dayofweek.to_numpy()
+        return np.column_stack([
+            day_of_week,
+            dates.day.to_numpy(),
+            dates.month.to_numpy(),
+            dates.quarter.to_numpy(),
+            dates.year.to_numpy(),
+            (day_of_week >= 5).astype(int)
+        ]).astype(float)
+    
+    @staticmethod
+    def _recursive_forecast(
+        model: RandomForestRegressor,
+        scaler: StandardScaler,
+        history: np.ndarray,
+        future_dates: pd.DatetimeIndex
+    ) -> np.ndarray:
+        """
+        递归多步预测：用真实历史的尾部初始化滞后和滚动均值特征，每一步的预测值回填作为下一步的输入
+        
+        历史窗口保存在预分配的环形缓冲区中，滚动均值通过增量更新窗口和得到，
+        每一步只需O(特征数)的计算，不再重复构建DataFrame。
+        
+        Args:
+            model: 已训练的RandomForest模型
+            scaler: 训练时使用的特征缩放器
+            history: 按日排列的历史销量
+            future_dates: 需要预测的日期
+            
+        Returns:
+            每个预测日期的销量预测值
+        """
+        lags = ForecastService.LAG_FEATURES
+        windows = ForecastService.ROLLING_WINDOWS
+        buffer_size = max(lags + windows)
+        
+        # 历史不足时前面补0，与训练时的缺失值填充方式一致
+        tail = np.asarray(history, dtype=float)[-buffer_size:]
+        buffer = np.zeros(buffer_size)
+        buffer[buffer_size - len(tail):] = tail
+        position = 0  # 下一次写入的位置，buffer[position - k] 即滞后k天的值
+        
+        window_sums = np.array([buffer[buffer_size - window:].sum() for window in windows])
+        window_sizes = np.array(windows, dtype=float)
+        history_length = len(tail)
+        
+        calendar = ForecastService._calendar_features(future_dates)
+        n_calendar = calendar.shape[1]
+        row = np.empty(n_calendar + len(lags) + len(windows))
+        lag_offsets = np.array(lags)
+        window_offsets = np.array(windows)
+        
+        # 与StandardScaler.transform等价的线性变换，避免每步调用sklearn的校验开销
+        scale_mean = scaler.mean_
+        scale = scaler.scale_
+        
+        predictions = np.empty(len(future_dates))
+        for step in range(len(future_dates)):
+            row[:n_calendar] = calendar[step]
+            row[n_calendar:n_calendar + len(lags)] = buffer[(position - lag_offsets) % buffer_size]
+            # 历史长度不足窗口时，训练阶段对应特征为缺失值(填充为0)
+            row[n_calendar + len(lags):] = np.where(
+                history_length >= window_sizes, window_sums / window_sizes, 0
+            )
+            
+            prediction = max(model.predict(((row - scale_mean) / scale).reshape(1, -1))[0], 0)
+            predictions[step] = prediction
+            
+            # 更新滚动窗口和并写入环形缓冲区
+            window_sums += prediction - buffer[(position - window_offsets) % buffer_size]
+            buffer[position] = prediction
+            position = (position + 1) % buffer_size
+            history_length += 1
+        
+        return predictions
+    
+    @staticmethod
+    def _sarima_paths(product_id: int) -> Tuple[str, str]:
+        """SARIMA模型文件及其元数据文件路径"""
+        return (
+            f"{ForecastService.MODELS_DIR}/sarima_{product_id}.pkl",
+            f"{ForecastService.MODELS_DIR}/sarima_meta_{product_id}.pkl"
+        )
+    
+    @staticmethod
+    def train_sarima_model(db: Session, product_id: int, incremental: bool = False) -> Dict[str, Any]:
         """
         训练SARIMA模型
         
         Args:
             db: 数据库会话
             product_id: 产品ID
+            incremental: 是否使用增量更新模式，在已保存的模型上追加新数据而不重新估计参数
             
         Returns:
             包含模型训练结果的字典
@@ -126,54 +439,15 @@ class ForecastService:
         sales_data = ForecastService._get_sales_data(db, product_id)
         
         # 检查数据量是否足够
-        if len(sales_data) < 30:
+        if len(sales_data) < ForecastService.MIN_TRAINING_DAYS:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="销售数据不足，需要至少30天的数据来训练SARIMA模型"
             )
         
-        try:
-            # 使用SARIMA模型 (1,1,1)x(1,1,1,7) - 适用于有周期性的时间序列
-            model = SARIMAX(
-                sales_data['quantity'],
-                order=(1, 1, 1),
-                seasonal_order=(1, 1, 1, 7),
-                enforce_stationarity=False,
-                enforce_invertibility=False
-            )
-            
-            # 训练模型
-            model_fit = model.fit(disp=False)
-            
-            # 保存模型
-            ForecastService._ensure_model_dir()
-            model_path = f"{ForecastService.MODELS_DIR}/sarima_{product_id}.pkl"
-            joblib.dump(model_fit, model_path)
-            
-            # 计算模型评估指标
-            predictions = model_fit.predict(dynamic=False)
-            mae = mean_absolute_error(sales_data['quantity'], predictions)
-            rmse = np.sqrt(mean_squared_error(sales_data['quantity'], predictions))
-            
-            return {
-                'product_id': product_id,
-                'model_type': 'SARIMA',
-                'model_path': model_path,
-                'data_points': len(sales_data),
-                'metrics': {
-                    'mae': round(mae, 2),
-                    'rmse': round(rmse, 2)
-                },
-                'training_success': True
-            }
-        
-        except Exception as e:
-            return {
-                'product_id': product_id,
-                'model_type': 'SARIMA',
-                'training_success': False,
-                'error': str(e)
-            }
+        if incremental:
+            return _refresh_sarima_model(product_id, sales_data)
+        return _fit_sarima_model(product_id, sales_data)
     
     @staticmethod
     def train_random_forest_model(db: Session, product_id: int) -> Dict[str, Any]:
@@ -191,82 +465,650 @@ class ForecastService:
         sales_data = ForecastService._get_sales_data(db, product_id)
         
         # 检查数据量是否足够
-        if len(sales_data) < 30:
+        if len(sales_data) < ForecastService.MIN_TRAINING_DAYS:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="销售数据不足，需要至少30天的数据来训练RandomForest模型"
             )
         
-        try:
-            # 提取特征
-            features_df = ForecastService._extract_features(sales_data)
+        return _fit_random_forest_model(product_id, sales_data)
+    
+    @staticmethod
+    def _prepare_training_tasks(
+        db: Session,
+        product_ids: Optional[List[int]],
+        model_type: str,
+        category: Optional[str],
+        days: int
+    ) -> Tuple[Dict[int, pd.DataFrame], List[Dict[str, Any]]]:
+        """
+        确定需要训练的产品并一次性取出它们的销售数据
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表，为空时训练所有活跃产品
+            model_type: 模型类型
+            category: 产品类别筛选
+            days: 使用最近多少天的数据训练
             
-            # 准备训练数据
-            X = features_df.drop('quantity', axis=1)
-            y = features_df['quantity']
+        Returns:
+            (产品ID到销售数据的映射, 无法训练的产品及原因)
+        """
+        query = db.query(Product.id)
+        if product_ids:
+            query = query.filter(Product.id.in_(product_ids))
+        else:
+            query = query.filter(Product.is_active == True)
+        if category:
+            query = query.filter(Product.category == category)
+        target_ids = [row.id for row in query.all()]
+        
+        failures = []
+        if product_ids:
+            for missing_id in sorted(set(product_ids) - set(target_ids)):
+                failures.append({
+                    'product_id': missing_id,
+                    'model_type': model_type,
+                    'training_success': False,
+                    'error': "产品不存在或不属于指定类别"
+                })
+        
+        # 一次性获取所有产品的销售数据
+        sales_by_product = ForecastService._get_sales_data_batch(db, target_ids, days)
+        
+        tasks = {}
+        for product_id in target_ids:
+            sales_data = sales_by_product.get(product_id)
+            if sales_data is None:
+                error = f"没有找到产品ID {product_id} 的销售数据"
+            elif len(sales_data) < ForecastService.MIN_TRAINING_DAYS:
+                error = f"销售数据不足，需要至少{ForecastService.MIN_TRAINING_DAYS}天的数据"
+            else:
+                tasks[product_id] = sales_data
+                continue
+            failures.append({
+                'product_id': product_id,
+                'model_type': model_type,
+                'training_success': False,
+                'error': error
+            })
+        
+        return tasks, failures
+    
+    @staticmethod
+    def _training_function(model_type: str, incremental: bool = False):
+        """返回可在子进程中执行的模型拟合函数"""
+        if model_type == 'SARIMA':
+            return _refresh_sarima_model if incremental else _fit_sarima_model
+        return _fit_random_forest_model
+    
+    @staticmethod
+    def train_models_batch(
+        db: Session,
+        product_ids: Optional[List[int]] = None,
+        model_type: str = 'RandomForest',
+        category: Optional[str] = None,
+        days: int = 90,
+        max_workers: Optional[int] = None,
+        incremental: bool = False
+    ) -> Dict[str, Any]:
+        """
+        批量训练预测模型
+        
+        一次查询取出所有产品的销售数据，再将各产品的模型拟合分发到进程池并行执行
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表，为空时训练所有活跃产品
+            model_type: 模型类型 ('SARIMA' 或 'RandomForest')
+            category: 产品类别筛选
+            days: 使用最近多少天的数据训练
+            max_workers: 最大进程数，默认使用配置的FORECAST_MAX_WORKERS
+            incremental: SARIMA是否使用增量更新模式（仅在到期或漂移时完整重新拟合）
             
-            # 划分训练集和测试集
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, shuffle=False
+        Returns:
+            包含每个产品训练指标和失败原因的字典
+        """
+        started_at = time.perf_counter()
+        
+        tasks, failures = ForecastService._prepare_training_tasks(db, product_ids, model_type, category, days)
+        fit_model = ForecastService._training_function(model_type, incremental)
+        
+        workers = max(1, min(max_workers or settings.FORECAST_MAX_WORKERS, len(tasks)))
+        
+        results = []
+        if workers == 1:
+            # 单进程时直接串行训练，避免进程池开销
+            for product_id, sales_data in tasks.items():
+                results.append(fit_model(product_id, sales_data))
+        else:
+            ForecastService._ensure_model_dir()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(fit_model, product_id, sales_data): product_id
+                    for product_id, sales_data in tasks.items()
+                }
+                for future in as_completed(futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        # 子进程异常退出等情况
+                        results.append({
+                            'product_id': futures[future],
+                            'model_type': model_type,
+                            'training_success': False,
+                            'error': str(e)
+                        })
+        
+        trained = sorted(
+            (result for result in results if result['training_success']),
+            key=lambda result: result['product_id']
+        )
+        failures.extend(result for result in results if not result['training_success'])
+        failures.sort(key=lambda result: result['product_id'])
+        
+        return {
+            'model_type': model_type,
+            'incremental': incremental and model_type == 'SARIMA',
+            'requested_count': len(trained) + len(failures),
+            'trained_count': len(trained),
+            'failed_count': len(failures),
+            'workers': workers,
+            'elapsed_seconds': round(time.perf_counter() - started_at, 2),
+            'results': trained,
+            'failures': failures
+        }
+    
+    @staticmethod
+    def _global_model_path() -> str:
+        """全局模型文件路径"""
+        return f"{ForecastService.MODELS_DIR}/{ForecastService.GLOBAL_MODEL_FILE}"
+    
+    @staticmethod
+    def _global_static_features(
+        bundle: Dict[str, Any],
+        product_ids: np.ndarray,
+        categories: List[Optional[str]],
+        history: np.ndarray
+    ) -> np.ndarray:
+        """
+        生成全局模型的产品/类别编码特征
+        
+        Args:
+            bundle: 全局模型文件内容
+            product_ids: 产品ID数组
+            categories: 与产品ID对应的类别
+            history: 产品 × 日期 的历史销量矩阵，训练时未见过的产品用其历史均值作为销量水平
+            
+        Returns:
+            形状为 (产品数, 3) 的数组：类别编码、产品销量水平、类别销量水平
+        """
+        category_codes = bundle['category_codes']
+        product_levels = bundle['product_levels']
+        category_levels = bundle['category_levels']
+        history_means = history.mean(axis=1) if history.shape[1] else np.zeros(len(product_ids))
+        
+        static = np.empty((len(product_ids), 3), dtype=np.float32)
+        for index, (product_id, category) in enumerate(zip(product_ids, categories)):
+            static[index, 0] = category_codes.get(category, -1)
+            static[index, 1] = product_levels.get(int(product_id), history_means[index])
+            static[index, 2] = category_levels.get(category, bundle['overall_level'])
+        return static
+    
+    @staticmethod
+    def _global_encodings(
+        row_ids: np.ndarray,
+        categories: List[Optional[str]],
+        matrix: np.ndarray
+    ) -> Dict[str, Any]:
+        """
+        根据训练期销量计算全局模型的产品与类别编码
+        
+        Args:
+            row_ids: 产品ID数组
+            categories: 与产品ID对应的类别
+            matrix: 产品 × 日期 的训练期销量矩阵
+            
+        Returns:
+            编码字典（不含模型），可直接作为全局模型文件的一部分保存
+        """
+        product_level_values = matrix.mean(axis=1) if matrix.shape[1] else np.zeros(len(row_ids))
+        category_frame = pd.DataFrame({'category': categories, 'level': product_level_values})
+        category_level_map = category_frame.groupby('category')['level'].mean().to_dict()
+        return {
+            'category_codes': {
+                category: code for code, category in enumerate(sorted(category_level_map))
+            },
+            'product_levels': {
+                int(product_id): float(level)
+                for product_id, level in zip(row_ids, product_level_values)
+            },
+            'category_levels': {
+                category: float(level) for category, level in category_level_map.items()
+            },
+            'overall_level': float(product_level_values.mean()) if len(product_level_values) else 0.0
+        }
+    
+    @staticmethod
+    def _global_training_data(
+        bundle: Dict[str, Any],
+        row_ids: np.ndarray,
+        categories: List[Optional[str]],
+        matrix: np.ndarray,
+        dates: pd.DatetimeIndex
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        构建全局模型的训练数据
+        
+        Args:
+            bundle: 产品与类别编码
+            row_ids: 产品ID数组
+            categories: 与产品ID对应的类别
+            matrix: 产品 × 日期 的销量矩阵
+            dates: 矩阵各列对应的日期
+            
+        Returns:
+            (特征矩阵, 目标值, 有效行掩码)，产品首次销售之前的日期和窗口开头滞后/滚动特征不完整的日期
+            不作为训练样本
+        """
+        n_products, n_days = matrix.shape
+        static = ForecastService._global_static_features(bundle, row_ids, categories, matrix)
+        
+        # 向量化提取所有产品的特征
+        panel_features, target = ForecastService._extract_panel_features(matrix, dates)
+        features = np.concatenate([
+            panel_features,
+            np.repeat(static, n_days, axis=0)
+        ], axis=1)
+        
+        # 排除产品首次销售之前的日期，避免把未上架期间当作零需求；
+        # 窗口开头的日期在窗口之前可能有真实销售，滞后和滚动特征却被补0，也不作为样本
+        has_sales = matrix > 0
+        first_sale = np.where(has_sales.any(axis=1), has_sales.argmax(axis=1), n_days)
+        warmup_days = max(ForecastService.LAG_FEATURES + ForecastService.ROLLING_WINDOWS)
+        start_index = np.maximum(first_sale, warmup_days)
+        valid = (np.arange(n_days)[None, :] >= start_index[:, None]).reshape(-1)
+        
+        return features, target, valid
+    
+    @staticmethod
+    def _build_global_model() -> HistGradientBoostingRegressor:
+        """创建全局模型使用的梯度提升回归器"""
+        return HistGradientBoostingRegressor(**ForecastService.GLOBAL_MODEL_PARAMS)
+    
+    @staticmethod
+    def _global_recursive_forecast(
+        model: HistGradientBoostingRegressor,
+        static: np.ndarray,
+        history: np.ndarray,
+        future_dates: pd.DatetimeIndex
+    ) -> np.ndarray:
+        """
+        对多个产品同时递归预测，每个预测日只调用一次模型
+        
+        Args:
+            model: 全局模型
+            static: 产品与类别编码特征
+            history: 产品 × 日期 的历史销量矩阵，最后一列为预测起点前一天
+            future_dates: 需要预测的日期
+            
+        Returns:
+            形状为 (产品数, 预测天数) 的预测矩阵
+        """
+        lags = ForecastService.LAG_FEATURES
+        windows = ForecastService.ROLLING_WINDOWS
+        buffer_size = max(lags + windows)
+        calendar = ForecastService._calendar_features(future_dates)
+        
+        n_products = history.shape[0]
+        tail = history[:, -buffer_size:]
+        buffer = np.zeros((n_products, buffer_size), dtype=np.float64)
+        buffer[:, buffer_size - tail.shape[1]:] = tail
+        position = 0
+        lag_offsets = np.array(lags)
+        window_offsets = np.array(windows)
+        window_sizes = np.array(windows, dtype=np.float64)
+        window_sums = np.column_stack([buffer[:, buffer_size - window:].sum(axis=1) for window in windows])
+        
+        n_calendar = calendar.shape[1]
+        n_dynamic = len(lags) + len(windows)
+        features = np.empty((n_products, n_calendar + n_dynamic + static.shape[1]), dtype=np.float32)
+        features[:, n_calendar + n_dynamic:] = static
+        
+        predictions = np.empty((n_products, len(future_dates)))
+        for step in range(len(future_dates)):
+            features[:, :n_calendar] = calendar[step]
+            features[:, n_calendar:n_calendar + len(lags)] = buffer[:, (position - lag_offsets) % buffer_size]
+            features[:, n_calendar + len(lags):n_calendar + n_dynamic] = window_sums / window_sizes
+            
+            step_predictions = np.maximum(model.predict(features), 0)
+            predictions[:, step] = step_predictions
+            
+            window_sums += step_predictions[:, None] - buffer[:, (position - window_offsets) % buffer_size]
+            buffer[:, position] = step_predictions
+            position = (position + 1) % buffer_size
+        
+        return predictions
+    
+    @staticmethod
+    def train_global_model(db: Session, days: int = 365) -> Dict[str, Any]:
+        """
+        训练跨产品的全局预测模型
+        
+        所有活跃产品共用一个梯度提升模型，在时间特征、滞后和滚动特征之外加入产品与类别编码，
+        因此历史不足30天的产品也可以得到预测。
+        
+        Args:
+            db: 数据库会话
+            days: 使用最近多少天的数据训练
+            
+        Returns:
+            包含模型训练结果的字典
+        """
+        products = db.query(Product.id, Product.category).filter(
+            Product.is_active == True
+        ).order_by(Product.id).all()
+        
+        if not products:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="没有找到活跃的产品"
             )
+        
+        try:
+            product_ids = [product.id for product in products]
+            categories = [product.category for product in products]
             
-            # 标准化特征
-            scaler = StandardScaler()
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
+            # 一次查询构建全部产品的销量矩阵
+            end_date = datetime.now()
+            sales_frame = ForecastService._query_daily_sales(db, product_ids, days)
+            row_ids, dates, matrix = ForecastService.build_sales_matrix(
+                sales_frame,
+                product_ids=product_ids,
+                start_date=end_date - timedelta(days=days),
+                end_date=end_date
+            )
+            n_products, n_days = matrix.shape
             
-            # 训练RandomForest模型
-            model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=10,
-                random_state=42
+            # 产品与类别编码及全部产品的特征
+            bundle = ForecastService._global_encodings(row_ids, categories, matrix)
+            features, target, valid = ForecastService._global_training_data(
+                bundle, row_ids, categories, matrix, dates
             )
-            model.fit(X_train_scaled, y_train)
             
-            # 保存模型和特征缩放器
+            day_index = np.arange(n_days)
+            is_validation = np.tile(day_index >= n_days - ForecastService.GLOBAL_VALIDATION_DAYS, n_products)
+            train_mask = valid & ~is_validation
+            validation_mask = valid & is_validation
+            if train_mask.sum() == 0:
+                raise ValueError("没有可用于训练的销售数据")
+            
+            # 先以最近的数据作为验证集评估，再使用全部数据重新训练；
+            # 评估时的产品与类别编码只用训练期销量计算，避免验证期的信息泄漏到特征中
+            metrics = {}
+            if validation_mask.sum() > 0:
+                n_train_days = n_days - ForecastService.GLOBAL_VALIDATION_DAYS
+                train_matrix = matrix[:, :n_train_days]
+                train_bundle = ForecastService._global_encodings(row_ids, categories, train_matrix)
+                train_static = ForecastService._global_static_features(
+                    train_bundle, row_ids, categories, train_matrix
+                )
+                evaluation_features = features.copy()
+                evaluation_features[:, -train_static.shape[1]:] = np.repeat(train_static, n_days, axis=0)
+                
+                model = ForecastService._build_global_model()
+                model.fit(evaluation_features[train_mask], target[train_mask])
+                y_pred = np.maximum(model.predict(evaluation_features[validation_mask]), 0)
+                y_true = target[validation_mask]
+                metrics = {
+                    'mae': round(float(mean_absolute_error(y_true, y_pred)), 2),
+                    'rmse': round(float(np.sqrt(mean_squared_error(y_true, y_pred))), 2)
+                }
+            
+            model = ForecastService._build_global_model()
+            model.fit(features[valid], target[valid])
+            bundle['model'] = model
+            bundle['trained_at'] = end_date.isoformat()
+            bundle['history_days'] = days
+            
             ForecastService._ensure_model_dir()
-            model_path = f"{ForecastService.MODELS_DIR}/rf_{product_id}.pkl"
-            scaler_path = f"{ForecastService.MODELS_DIR}/scaler_{product_id}.pkl"
+            model_path = ForecastService._global_model_path()
+            joblib.dump(bundle, model_path)
+            
+            return {
+                'model_type': 'Global',
+                'model_path': model_path,
+                'product_count': n_products,
+                'data_points': int(valid.sum()),
+                'metrics': metrics,
+                'training_success': True
+            }
+        
+        except Exception as e:
+            return {
+                'model_type': 'Global',
+                'training_success': False,
+                'error': str(e)
+            }
+    
+    @staticmethod
+    def predict_global_batch(
+        db: Session,
+        products: List[Product],
+        days: int = 30
+    ) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        """
+        使用全局模型同时预测多个产品的未来销量
+        
+        每个预测日只调用一次模型，对所有产品批量预测，预测值回填到环形缓冲区作为下一日的滞后特征。
+        
+        Args:
+            db: 数据库会话
+            products: 产品对象列表
+            days: 预测天数
+            
+        Returns:
+            (预测日期, 形状为 (产品数, 预测天数) 的预测矩阵)，行顺序与products一致
+        """
+        bundle = model_registry.load(ForecastService._global_model_path())
+        buffer_size = max(ForecastService.LAG_FEATURES + ForecastService.ROLLING_WINDOWS)
+        
+        # 一次查询取出所有产品最近的销量作为递归起点
+        end_date = datetime.now()
+        product_ids = [product.id for product in products]
+        categories = [product.category for product in products]
+        sales_frame = ForecastService._query_daily_sales(db, product_ids, buffer_size)
+        row_ids, _, history = ForecastService.build_sales_matrix(
+            sales_frame,
+            product_ids=product_ids,
+            start_date=end_date - timedelta(days=buffer_size - 1),
+            end_date=end_date
+        )
+        static = ForecastService._global_static_features(bundle, row_ids, categories, history)
+        
+        future_dates = pd.date_range(
+            start=pd.Timestamp(end_date).normalize() + timedelta(days=1),
+            periods=days,
+            freq='D'
+        )
+        predictions = ForecastService._global_recursive_forecast(
+            bundle['model'], static, history, future_dates
+        )
+        
+        return future_dates, predictions
+    
+    @staticmethod
+    def _intermittent_demand_rate(
+        matrix: np.ndarray,
+        method: str = 'SBA',
+        alpha: float = 0.1,
+        beta: float = 0.1
+    ) -> np.ndarray:
+        """
+        对多个产品同时拟合间歇需求模型，返回每日需求率
+        
+        沿时间方向逐日更新，每一步对所有产品做数组运算：
+        - Croston: 分别平滑非零需求量 z 和需求间隔 p，需求率为 z / p
+        - SBA: Croston的偏差修正，需求率为 (1 - alpha / 2) * z / p
+        - TSB: 每天平滑需求发生概率 d，需求率为 d * z，可随着长期无需求逐渐衰减
+        
+        Args:
+            matrix: 产品 × 日期 的销量矩阵
+            method: 'Croston'、'SBA' 或 'TSB'
+            alpha: 需求量（及Croston间隔）的平滑系数
+            beta: TSB需求发生概率的平滑系数
+            
+        Returns:
+            形状为 (产品数,) 的每日需求率，没有任何销售的产品为0
+        """
+        if method not in ForecastService.INTERMITTENT_METHODS:
+            raise ValueError(f"不支持的间歇需求方法: {method}")
+        
+        n_products, n_days = matrix.shape
+        size = np.zeros(n_products)
+        interval = np.ones(n_products)
+        probability = np.zeros(n_products)
+        since_last = np.ones(n_products)
+        started = np.zeros(n_products, dtype=bool)
+        
+        for day in range(n_days):
+            demand = matrix[:, day].astype(np.float64)
+            occurred = demand > 0
+            first = occurred & ~started
+            update = occurred & started
             
-            joblib.dump(model, model_path)
-            joblib.dump(scaler, scaler_path)
+            # 首次出现需求时用实际值初始化
+            size[first] = demand[first]
+            interval[first] = since_last[first]
+            probability[first] = 1.0 / since_last[first]
             
-            # 评估模型
-            y_pred = model.predict(X_test_scaled)
-            mae = mean_absolute_error(y_test, y_pred)
-            rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-            r2 = r2_score(y_test, y_pred)
+            size[update] += alpha * (demand[update] - size[update])
+            if method == 'TSB':
+                probability[started] += beta * (occurred[started] - probability[started])
+            else:
+                interval[update] += alpha * (since_last[update] - interval[update])
+            
+            started |= first
+            since_last = np.where(occurred, 1.0, since_last + 1.0)
+        
+        if method == 'TSB':
+            rate = probability * size
+        else:
+            rate = size / interval
+            if method == 'SBA':
+                rate *= 1.0 - alpha / 2.0
+        return np.where(started, rate, 0.0)
+    
+    @staticmethod
+    def predict_intermittent_batch(
+        db: Session,
+        products: List[Product],
+        days: int = 30,
+        method: Optional[str] = None
+    ) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        """
+        使用间歇需求模型同时预测多个产品的未来销量
+        
+        模型无需训练文件，每次根据最近的销售历史直接拟合，预测值为每日需求率。
+        
+        Args:
+            db: 数据库会话
+            products: 产品对象列表
+            days: 预测天数
+            method: 'Croston'、'SBA' 或 'TSB'，默认使用INTERMITTENT_METHOD
+            
+        Returns:
+            (预测日期, 形状为 (产品数, 预测天数) 的预测矩阵)，行顺序与products一致
+        """
+        history_days = ForecastService.INTERMITTENT_HISTORY_DAYS
+        end_date = datetime.now()
+        product_ids = [product.id for product in products]
+        sales_frame = ForecastService._query_daily_sales(db, product_ids, history_days)
+        _, _, history = ForecastService.build_sales_matrix(
+            sales_frame,
+            product_ids=product_ids,
+            start_date=end_date - timedelta(days=history_days - 1),
+            end_date=end_date
+        )
+        
+        rate = ForecastService._intermittent_demand_rate(
+            history,
+            method or ForecastService.INTERMITTENT_METHOD,
+            ForecastService.INTERMITTENT_ALPHA,
+            ForecastService.INTERMITTENT_BETA
+        )
+        
+        future_dates = pd.date_range(
+            start=pd.Timestamp(end_date).normalize() + timedelta(days=1),
+            periods=days,
+            freq='D'
+        )
+        return future_dates, np.repeat(rate[:, None], days, axis=1)
+    
+    @staticmethod
+    def _demand_profile(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算每个产品自首次销售以来的天数和零需求天数占比
+        
+        Args:
+            matrix: 产品 × 日期 的销量矩阵
             
-            # 特征重要性
-            feature_importance = dict(zip(X.columns, model.feature_importances_))
-            top_features = sorted(
-                feature_importance.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:5]
+        Returns:
+            (销售历史天数, 零需求天数占比)，没有销售的产品历史天数为0、占比为1
+        """
+        n_days = matrix.shape[1]
+        has_sales = matrix > 0
+        first_sale = np.where(has_sales.any(axis=1), has_sales.argmax(axis=1), n_days)
+        history_days = n_days - first_sale
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zero_ratio = np.where(
+                history_days > 0,
+                1.0 - has_sales.sum(axis=1) / history_days,
+                1.0
+            )
+        return history_days, zero_ratio
+    
+    @staticmethod
+    def recommend_model_type(zero_demand_ratio: float, history_days: int) -> str:
+        """
+        根据零需求占比和历史长度选择预测模型
+        
+        零需求天数较多或历史不足以训练随机森林时使用间歇需求模型，否则使用随机森林。
+        
+        Args:
+            zero_demand_ratio: 零需求天数占比
+            history_days: 销售历史天数
             
-            return {
-                'product_id': product_id,
-                'model_type': 'RandomForest',
-                'model_path': model_path,
-                'scaler_path': scaler_path,
-                'data_points': len(sales_data),
-                'metrics': {
-                    'mae': round(mae, 2),
-                    'rmse': round(rmse, 2),
-                    'r2': round(r2, 2)
-                },
-                'top_features': top_features,
-                'training_success': True
-            }
+        Returns:
+            推荐的模型类型
+        """
+        if history_days < ForecastService.MIN_TRAINING_DAYS or zero_demand_ratio >= ForecastService.INTERMITTENT_ZERO_RATIO:
+            return 'Croston'
+        return 'RandomForest'
+    
+    @staticmethod
+    def select_model_type(db: Session, product_id: int, days: int = 90) -> str:
+        """
+        根据产品最近的销售模式自动选择模型类型
         
-        except Exception as e:
-            return {
-                'product_id': product_id,
-                'model_type': 'RandomForest',
-                'training_success': False,
-                'error': str(e)
-            }
+        Args:
+            db: 数据库会话
+            product_id: 产品ID
+            days: 分析的天数
+            
+        Returns:
+            推荐的模型类型
+        """
+        end_date = datetime.now()
+        sales_frame = ForecastService._query_daily_sales(db, [product_id], days)
+        _, _, matrix = ForecastService.build_sales_matrix(
+            sales_frame,
+            product_ids=[product_id],
+            start_date=end_date - timedelta(days=days - 1),
+            end_date=end_date
+        )
+        history_days, zero_ratio = ForecastService._demand_profile(matrix)
+        return ForecastService.recommend_model_type(float(zero_ratio[0]), int(history_days[0]))
     
     @staticmethod
     def predict_sales(
@@ -282,7 +1124,7 @@ class ForecastService:
             db: 数据库会话
             product_id: 产品ID
             days: 预测天数
-            model_type: 模型类型 ('SARIMA' 或 'RandomForest')
+            model_type: 模型类型 ('SARIMA'、'RandomForest'、'Global'、'Croston' 或 'Auto')
             
         Returns:
             包含预测结果的字典
@@ -295,17 +1137,26 @@ class ForecastService:
                 detail=f"未找到ID为 {product_id} 的产品"
             )
         
-        # 检查模型文件是否存在
+        # 根据零需求占比自动选择模型
+        if model_type == 'Auto':
+            model_type = ForecastService.select_model_type(db, product_id)
+        
+        # 检查模型文件是否存在（间歇需求模型无需训练文件）
+        model_path = None
         if model_type == 'SARIMA':
-            model_path = f"{ForecastService.MODELS_DIR}/sarima_{product_id}.pkl"
-        else:
+            model_path, _ = ForecastService._sarima_paths(product_id)
+        elif model_type == 'Global':
+            model_path = ForecastService._global_model_path()
+        elif model_type != 'Croston':
             model_path = f"{ForecastService.MODELS_DIR}/rf_{product_id}.pkl"
             scaler_path = f"{ForecastService.MODELS_DIR}/scaler_{product_id}.pkl"
         
-        if not os.path.exists(model_path):
+        if model_path and not os.path.exists(model_path):
             # 如果模型不存在，尝试训练
             if model_type == 'SARIMA':
                 training_result = ForecastService.train_sarima_model(db, product_id)
+            elif model_type == 'Global':
+                training_result = ForecastService.train_global_model(db)
             else:
                 training_result = ForecastService.train_random_forest_model(db, product_id)
             
@@ -316,55 +1167,58 @@ class ForecastService:
                 )
         
         try:
-            # 获取最近的销售数据
-            sales_data = ForecastService._get_sales_data(db, product_id)
-            
-            # 生成预测日期范围
-            last_date = sales_data.index[-1]
-            future_dates = pd.date_range(
-                start=last_date + timedelta(days=1),
-                periods=days,
-                freq='D'
-            )
-            
-            # 根据模型类型进行预测
-            if model_type == 'SARIMA':
-                # 加载SARIMA模型
-                model_fit = joblib.load(model_path)
-                
-                # 预测未来销量
-                forecast = model_fit.forecast(steps=days)
+            if model_type in ('Global', 'Croston'):
+                # 全局模型和间歇需求模型不依赖单个产品的训练文件，直接批量预测
+                if model_type == 'Global':
+                    future_dates, predictions = ForecastService.predict_global_batch(db, [product], days)
+                else:
+                    future_dates, predictions = ForecastService.predict_intermittent_batch(db, [product], days)
                 forecast_df = pd.DataFrame({
                     'date': future_dates,
-                    'predicted_quantity': forecast
+                    'predicted_quantity': predictions[0]
                 })
+            
+            else:
+                # 获取最近的销售数据
+                sales_data = ForecastService._get_sales_data(db, product_id)
                 
-            else:  # RandomForest
-                # 加载RandomForest模型和缩放器
-                model = joblib.load(model_path)
-                scaler = joblib.load(scaler_path)
-                
-                # 准备预测数据
-                future_df = pd.DataFrame(index=future_dates)
-                future_df['quantity'] = np.nan  # 占位，后面会删除
-                
-                # 提取特征
-                future_features = ForecastService._extract_features(future_df)
-                future_features = future_features.drop('quantity', axis=1)
-                
-                # 标准化特征
-                future_features_scaled = scaler.transform(future_features)
-                
-                # 预测
-                predictions = model.predict(future_features_scaled)
-                
-                # 确保预测值非负
-                predictions = np.maximum(predictions, 0)
+                # 生成预测日期范围
+                last_date = sales_data.index[-1]
+                future_dates = pd.date_range(
+                    start=last_date + timedelta(days=1),
+                    periods=days,
+                    freq='D'
+                )
                 
-                forecast_df = pd.DataFrame({
-                    'date': future_dates,
-                    'predicted_quantity': predictions
-                })
+                # 根据模型类型进行预测
+                if model_type == 'SARIMA':
+                    # 从模型注册表获取SARIMA模型
+                    model_fit = model_registry.load(model_path)
+                    
+                    # 预测未来销量
+                    forecast = model_fit.forecast(steps=days)
+                    forecast_df = pd.DataFrame({
+                        'date': future_dates,
+                        'predicted_quantity': forecast
+                    })
+                    
+                else:  # RandomForest
+                    # 从模型注册表获取RandomForest模型和缩放器
+                    model = model_registry.load(model_path)
+                    scaler = model_registry.load(scaler_path)
+                    
+                    # 以最近的真实销量为起点递归预测（预测值已保证非负）
+                    predictions = ForecastService._recursive_forecast(
+                        model,
+                        scaler,
+                        sales_data['quantity'].to_numpy(dtype=float),
+                        future_dates
+                    )
+                    
+                    forecast_df = pd.DataFrame({
+                        'date': future_dates,
+                        'predicted_quantity': predictions
+                    })
             
             # 计算总预测销量
             total_predicted = forecast_df['predicted_quantity'].sum()
@@ -396,12 +1250,353 @@ class ForecastService:
                 detail=f"预测失败: {str(e)}"
             )
     
+    @staticmethod
+    def refresh_forecast_table(
+        db: Session,
+        model_type: str = 'Global',
+        days: int = 30,
+        category: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        为所有活跃产品生成预测并写入预测表，供读取接口直接查询
+        
+        每批预测从生成当天开始，并多存FORECAST_MAX_AGE_HOURS对应的天数，
+        保证批次在有效期内任何一天读取时，从当天起都还有days天的预测。
+        
+        Args:
+            db: 数据库会话
+            model_type: 模型类型 ('SARIMA'、'RandomForest'、'Global' 或 'Croston')
+            days: 预测天数
+            category: 产品类别筛选
+            
+        Returns:
+            刷新结果统计
+        """
+        started_at = time.perf_counter()
+        generated_at = datetime.now()
+        
+        query = db.query(Product).filter(Product.is_active == True)
+        if category:
+            query = query.filter(Product.category == category)
+        products = query.order_by(Product.id).all()
+        
+        if model_type == 'Global' and products and not os.path.exists(ForecastService._global_model_path()):
+            training_result = ForecastService.train_global_model(db)
+            if not training_result['training_success']:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"模型训练失败: {training_result.get('error', '未知错误')}"
+                )
+        
+        generated_date = generated_at.date()
+        stored_days = days + -(-settings.FORECAST_MAX_AGE_HOURS // 24)
+        
+        row_count = 0
+        failures = []
+        for offset in range(0, len(products), ForecastService.REFRESH_CHUNK_SIZE):
+            chunk = products[offset:offset + ForecastService.REFRESH_CHUNK_SIZE]
+            rows = []
+            
+            if model_type in ('Global', 'Croston'):
+                # 全局模型和间歇需求模型对整批产品一次预测
+                if model_type == 'Global':
+                    future_dates, predictions = ForecastService.predict_global_batch(db, chunk, stored_days)
+                else:
+                    future_dates, predictions = ForecastService.predict_intermittent_batch(db, chunk, stored_days)
+                forecast_dates = [future_date.date() for future_date in future_dates]
+                for product, product_predictions in zip(chunk, np.round(predictions, 2)):
+                    for forecast_date, quantity in zip(forecast_dates, product_predictions):
+                        rows.append({
+                            'product_id': product.id,
+                            'model_type': model_type,
+                            'generated_at': generated_at,
+                            'forecast_date': forecast_date,
+                            'predicted_quantity': float(quantity),
+                            'lower_bound': round(float(quantity) * 0.8, 2),
+                            'upper_bound': round(float(quantity) * 1.2, 2)
+                        })
+            else:
+                # 单产品模型的预测从最后一次销售的次日开始，需要多预测到生成当天为止的天数
+                last_sale_dates = dict(db.query(
+                    SalesDaily.product_id,
+                    func.max(SalesDaily.sale_date)
+                ).filter(
+                    SalesDaily.product_id.in_([product.id for product in chunk])
+                ).group_by(SalesDaily.product_id).all())
+                for product in chunk:
+                    last_sale_date = last_sale_dates.get(product.id)
+                    skipped_days = max((generated_date - last_sale_date).days - 1, 0) if last_sale_date else 0
+                    try:
+                        result = ForecastService.predict_sales(
+                            db, product.id, stored_days + skipped_days, model_type
+                        )
+                    except HTTPException as e:
+                        failures.append({'product_id': product.id, 'error': e.detail})
+                        continue
+                    for item in result['forecast_data']:
+                        forecast_date = datetime.strptime(item['date'], '%Y-%m-%d').date()
+                        if forecast_date < generated_date:
+                            continue
+                        rows.append({
+                            'product_id': product.id,
+                            'model_type': model_type,
+                            'generated_at': generated_at,
+                            'forecast_date': forecast_date,
+                            'predicted_quantity': item['predicted_quantity'],
+                            'lower_bound': item['lower_bound'],
+                            'upper_bound': item['upper_bound']
+                        })
+            
+            # 多行批量插入
+            if rows:
+                db.execute(Forecast.__table__.insert(), rows)
+                row_count += len(rows)
+        
+        # 清理超过保留期的旧批次
+        removed_count = db.query(Forecast).filter(
+            Forecast.model_type == model_type,
+            Forecast.generated_at < generated_at - timedelta(days=settings.FORECAST_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+        
+        db.commit()
+        
+        return {
+            'model_type': model_type,
+            'generated_at': generated_at.isoformat(),
+            'forecast_days': days,
+            'product_count': len(products) - len(failures),
+            'row_count': row_count,
+            'removed_count': removed_count,
+            'failed_count': len(failures),
+            'failures': failures,
+            'elapsed_seconds': round(time.perf_counter() - started_at, 2)
+        }
+    
+    @staticmethod
+    def _format_stored_forecast(
+        product_id: int,
+        product_name: str,
+        product_sku: str,
+        model_type: str,
+        rows: List[Forecast]
+    ) -> Dict[str, Any]:
+        """
+        将预测表中的记录格式化为与predict_sales一致的结构
+        
+        Args:
+            product_id: 产品ID
+            product_name: 产品名称
+            product_sku: 产品SKU
+            model_type: 模型类型
+            rows: 按日期排序的预测记录
+            
+        Returns:
+            预测结果字典
+        """
+        total_predicted = sum(row.predicted_quantity for row in rows)
+        return {
+            'product_id': product_id,
+            'product_name': product_name,
+            'product_sku': product_sku,
+            'model_type': model_type,
+            'forecast_days': len(rows),
+            'total_predicted_quantity': round(total_predicted, 2),
+            'average_daily_quantity': round(total_predicted / len(rows), 2) if rows else 0,
+            'forecast_data': [
+                {
+                    'date': row.forecast_date.strftime('%Y-%m-%d'),
+                    'predicted_quantity': row.predicted_quantity,
+                    'lower_bound': row.lower_bound,
+                    'upper_bound': row.upper_bound
+                }
+                for row in rows
+            ],
+            'generated_at': rows[0].generated_at.isoformat() if rows else None,
+            'source': 'precomputed'
+        }
+    
+    @staticmethod
+    def get_stored_forecast(
+        db: Session,
+        product: Product,
+        days: int = 30,
+        model_type: str = 'RandomForest',
+        max_age_hours: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        从预测表读取产品最新一批预测
+        
+        Args:
+            db: 数据库会话
+            product: 产品对象
+            days: 预测天数
+            model_type: 模型类型
+            max_age_hours: 预测的最长有效时间（小时），默认使用配置的FORECAST_MAX_AGE_HOURS
+            
+        Returns:
+            预测结果字典；没有足够新或足够长的预测时返回None
+        """
+        if max_age_hours is None:
+            max_age_hours = settings.FORECAST_MAX_AGE_HOURS
+        
+        latest_generated_at = db.query(func.max(Forecast.generated_at)).filter(
+            Forecast.product_id == product.id,
+            Forecast.model_type == model_type,
+            Forecast.generated_at >= datetime.now() - timedelta(hours=max_age_hours)
+        ).scalar()
+        if latest_generated_at is None:
+            return None
+        
+        rows = db.query(Forecast).filter(
+            Forecast.product_id == product.id,
+            Forecast.model_type == model_type,
+            Forecast.generated_at == latest_generated_at,
+            Forecast.forecast_date >= date.today()
+        ).order_by(Forecast.forecast_date).limit(days).all()
+        
+        # 预测天数不足时由调用方实时计算
+        if len(rows) < days:
+            return None
+        
+        return ForecastService._format_stored_forecast(
+            product.id, product.name, product.sku, model_type, rows
+        )
+    
+    @staticmethod
+    def get_forecast(
+        db: Session,
+        product_id: int,
+        days: int = 30,
+        model_type: str = 'RandomForest',
+        max_age_hours: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        获取产品预测：优先读取预测表中未过期的结果，否则实时预测
+        
+        Args:
+            db: 数据库会话
+            product_id: 产品ID
+            days: 预测天数
+            model_type: 模型类型
+            max_age_hours: 预计算结果的最长有效时间（小时），为0时总是实时预测
+            
+        Returns:
+            包含预测结果的字典
+        """
+        if max_age_hours is None:
+            max_age_hours = settings.FORECAST_MAX_AGE_HOURS
+        
+        if max_age_hours > 0:
+            product = db.query(Product).filter(Product.id == product_id).first()
+            if not product:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"未找到ID为 {product_id} 的产品"
+                )
+            if model_type == 'Auto':
+                model_type = ForecastService.select_model_type(db, product_id)
+            stored = ForecastService.get_stored_forecast(
+                db, product, days, model_type, max_age_hours
+            )
+            if stored:
+                return stored
+        
+        result = ForecastService.predict_sales(db, product_id, days, model_type)
+        result['source'] = 'live'
+        return result
+    
+    @staticmethod
+    def get_stored_forecasts_bulk(
+        db: Session,
+        model_type: str = 'Global',
+        days: int = 30,
+        product_ids: Optional[List[int]] = None,
+        category: Optional[str] = None,
+        max_age_hours: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        一次查询读取多个产品最新一批的预计算预测
+        
+        每个产品各自取有效期内最新的一批（按类别刷新的批次互不影响），
+        返回从今天起的前days天。
+        
+        Args:
+            db: 数据库会话
+            model_type: 模型类型
+            days: 每个产品返回的预测天数
+            product_ids: 产品ID筛选
+            category: 产品类别筛选
+            max_age_hours: 预测的最长有效时间（小时）
+            
+        Returns:
+            包含最新批次生成时间和各产品预测的字典
+        """
+        if max_age_hours is None:
+            max_age_hours = settings.FORECAST_MAX_AGE_HOURS
+        
+        latest = ForecastService._latest_forecast_batches(db, model_type, max_age_hours, product_ids)
+        today = date.today()
+        query = db.query(
+            Forecast, Product.name, Product.sku
+        ).join(
+            latest,
+            (Forecast.product_id == latest.c.product_id) & (Forecast.generated_at == latest.c.generated_at)
+        ).join(
+            Product, Forecast.product_id == Product.id
+        ).filter(
+            Forecast.model_type == model_type,
+            Forecast.forecast_date >= today,
+            Forecast.forecast_date <= today + timedelta(days=days)
+        )
+        if product_ids:
+            query = query.filter(Forecast.product_id.in_(product_ids))
+        if category:
+            query = query.filter(Product.category == category)
+        rows = query.order_by(Forecast.product_id, Forecast.forecast_date).all()
+        
+        items = []
+        for product_id, product_rows in groupby(rows, key=lambda row: row.Forecast.product_id):
+            product_rows = list(product_rows)[:days]
+            items.append(ForecastService._format_stored_forecast(
+                product_id,
+                product_rows[0].name,
+                product_rows[0].sku,
+                model_type,
+                [row.Forecast for row in product_rows]
+            ))
+        
+        return {
+            'model_type': model_type,
+            'generated_at': max(row.Forecast.generated_at for row in rows).isoformat() if rows else None,
+            'items': items
+        }
+    
+    @staticmethod
+    def _latest_forecast_batches(
+        db: Session,
+        model_type: str,
+        max_age_hours: int,
+        product_ids: Optional[List[int]] = None
+    ):
+        """每个产品在有效期内最新一批预测的生成时间，返回 (product_id, generated_at) 子查询"""
+        query = db.query(
+            Forecast.product_id.label('product_id'),
+            func.max(Forecast.generated_at).label('generated_at')
+        ).filter(
+            Forecast.model_type == model_type,
+            Forecast.generated_at >= datetime.now() - timedelta(hours=max_age_hours)
+        )
+        if product_ids:
+            query = query.filter(Forecast.product_id.in_(product_ids))
+        return query.group_by(Forecast.product_id).subquery()
+    
     @staticmethod
     def calculate_replenishment_quantity(
         db: Session,
         product_id: int,
         forecast_days: int = 30,
-        model_type: str = 'RandomForest'
+        model_type: str = 'RandomForest',
+        max_age_hours: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         计算补货数量
@@ -411,6 +1606,7 @@ class ForecastService:
             product_id: 产品ID
             forecast_days: 预测天数
             model_type: 模型类型
+            max_age_hours: 预计算预测的最长有效时间（小时），为0时实时预测
             
         Returns:
             包含补货建议的字典
@@ -423,40 +1619,28 @@ class ForecastService:
                 detail=f"未找到ID为 {product_id} 的产品"
             )
         
-        # 获取销量预测
-        forecast_result = ForecastService.predict_sales(
-            db, product_id, forecast_days, model_type
+        # 获取销量预测（优先使用预计算结果）
+        forecast_result = ForecastService.get_forecast(
+            db, product_id, forecast_days, model_type, max_age_hours
         )
         
-        # 计算补货数量
-        # 补货数量 = 预测销量 + 安全库存 - 当前库存
         predicted_quantity = forecast_result['total_predicted_quantity']
         safety_stock = product.safety_stock
         current_stock = product.stock_quantity
-        
-        replenishment_quantity = max(0, predicted_quantity + safety_stock - current_stock)
-        replenishment_quantity = round(replenishment_quantity)
-        
-        # 计算补货点 (ROP)
-        # ROP = 提前期内平均需求 + 安全库存
-        daily_avg_demand = forecast_result['average_daily_quantity']
         lead_time = product.lead_time_days
-        reorder_point = (daily_avg_demand * lead_time) + safety_stock
-        reorder_point = round(reorder_point)
-        
-        # 计算经济订货批量 (简化版EOQ)
-        # EOQ = sqrt(2 * 年需求量 * 订货成本 / 库存持有成本率 * 单位成本)
-        # 假设订货成本为100，库存持有成本率为20%
-        annual_demand = daily_avg_demand * 365
-        ordering_cost = 100  # 假设值
-        holding_cost_rate = 0.2  # 假设值
-        unit_cost = product.cost
-        
-        eoq = np.sqrt((2 * annual_demand * ordering_cost) / (holding_cost_rate * unit_cost))
-        eoq = round(eoq)
         
-        # 最终补货建议 (取EOQ和计算补货量的较大值)
-        suggested_quantity = max(replenishment_quantity, eoq)
+        metrics = ForecastService.replenishment_metrics(
+            np.array([predicted_quantity]),
+            forecast_days,
+            np.array([safety_stock]),
+            np.array([current_stock]),
+            np.array([lead_time]),
+            np.array([product.cost])
+        )
+        replenishment_quantity = int(metrics['replenishment_quantity'][0])
+        reorder_point = int(metrics['reorder_point'][0])
+        eoq = int(metrics['economic_order_quantity'][0])
+        suggested_quantity = int(metrics['suggested_quantity'][0])
         
         return {
             'product_id': product_id,
@@ -473,4 +1657,314 @@ class ForecastService:
             'forecast_period_days': forecast_days,
             'model_type': model_type,
             'needs_replenishment': current_stock <= reorder_point
-        }
\ No newline at end of file
+        }
+    
+    @staticmethod
+    def replenishment_metrics(
+        predicted_quantity: np.ndarray,
+        forecast_days: int,
+        safety_stock: np.ndarray,
+        current_stock: np.ndarray,
+        lead_time_days: np.ndarray,
+        unit_cost: np.ndarray,
+        pending_quantity: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        以数组方式同时计算多个产品的补货点、经济订货批量和建议补货量
+        
+        Args:
+            predicted_quantity: 预测期内的总预测销量
+            forecast_days: 预测天数
+            safety_stock: 安全库存
+            current_stock: 当前库存
+            lead_time_days: 补货提前期（天）
+            unit_cost: 单位成本
+            pending_quantity: 在途补货数量，计入库存位置
+            
+        Returns:
+            各指标数组组成的字典
+        """
+        predicted_quantity = np.asarray(predicted_quantity, dtype=float)
+        safety_stock = np.nan_to_num(np.asarray(safety_stock, dtype=float))
+        current_stock = np.nan_to_num(np.asarray(current_stock, dtype=float))
+        lead_time_days = np.nan_to_num(np.asarray(lead_time_days, dtype=float))
+        unit_cost = np.nan_to_num(np.asarray(unit_cost, dtype=float))
+        if pending_quantity is None:
+            pending_quantity = np.zeros_like(current_stock)
+        
+        # 库存位置 = 当前库存 + 在途数量
+        inventory_position = current_stock + pending_quantity
+        
+        # 补货数量 = 预测销量 + 安全库存 - 库存位置
+        replenishment_quantity = np.round(np.maximum(0, predicted_quantity + safety_stock - inventory_position))
+        
+        # 补货点 (ROP) = 提前期内平均需求 + 安全库存
+        daily_avg_demand = predicted_quantity / forecast_days
+        reorder_point = np.round(daily_avg_demand * lead_time_days + safety_stock)
+        
+        # 经济订货批量 (简化版EOQ)
+        # EOQ = sqrt(2 * 年需求量 * 订货成本 / 库存持有成本率 * 单位成本)，单位成本缺失时为0
+        annual_demand = daily_avg_demand * 365
+        with np.errstate(divide='ignore', invalid='ignore'):
+            eoq = np.sqrt(
+                (2 * annual_demand * ForecastService.ORDERING_COST)
+                / (ForecastService.HOLDING_COST_RATE * unit_cost)
+            )
+        eoq = np.round(np.where(unit_cost > 0, eoq, 0))
+        
+        # 最终补货建议 (取EOQ和计算补货量的较大值)
+        suggested_quantity = np.maximum(replenishment_quantity, eoq)
+        
+        return {
+            'daily_avg_demand': daily_avg_demand,
+            'inventory_position': inventory_position,
+            'replenishment_quantity': replenishment_quantity.astype(np.int64),
+            'reorder_point': reorder_point.astype(np.int64),
+            'economic_order_quantity': eoq.astype(np.int64),
+            'suggested_quantity': suggested_quantity.astype(np.int64),
+            'needs_replenishment': inventory_position <= reorder_point
+        }
+
+
+# 以下拟合函数定义在模块级别，以便ProcessPoolExecutor在子进程中序列化调用
+
+def _check_cancelled(cancel_marker: Optional[str]):
+    """
+    保存模型前检查所属训练任务是否已请求取消
+    
+    拟合在子进程中运行，无法读取任务状态，调度线程在取消时创建标记文件通知子进程
+    """
+    if cancel_marker is not None and os.path.exists(cancel_marker):
+        raise RuntimeError("训练任务已取消，未保存模型")
+
+
+def _fit_sarima_model(product_id: int, sales_data: pd.DataFrame, cancel_marker: Optional[str] = None) -> Dict[str, Any]:
+    """
+    拟合并保存单个产品的SARIMA模型
+    
+    Args:
+        product_id: 产品ID
+        sales_data: 按日聚合的销售数据
+        cancel_marker: 训练任务的取消标记文件，存在时不保存模型
+        
+    Returns:
+        包含模型训练结果的字典
+    """
+    try:
+        # 使用SARIMA模型 (1,1,1)x(1,1,1,7) - 适用于有周期性的时间序列
+        model = SARIMAX(
+            sales_data['quantity'],
+            order=ForecastService.SARIMA_ORDER,
+            seasonal_order=ForecastService.SARIMA_SEASONAL_ORDER,
+            enforce_stationarity=False,
+            enforce_invertibility=False
+        )
+        
+        # 训练模型
+        model_fit = model.fit(disp=False)
+        
+        # 计算模型评估指标
+        predictions = model_fit.predict(dynamic=False)
+        mae = mean_absolute_error(sales_data['quantity'], predictions)
+        rmse = np.sqrt(mean_squared_error(sales_data['quantity'], predictions))
+        
+        # 保存模型及增量更新所需的元数据
+        _check_cancelled(cancel_marker)
+        ForecastService._ensure_model_dir()
+        model_path, meta_path = ForecastService._sarima_paths(product_id)
+        joblib.dump(model_fit, model_path)
+        joblib.dump({
+            'last_date': sales_data.index[-1],
+            'fitted_date': sales_data.index[-1],
+            # 跳过差分初始化阶段，作为漂移检测的误差基准
+            'baseline_mae': float(np.abs(model_fit.resid[model_fit.loglikelihood_burn:]).mean()),
+            # 拟合之后追加的观测的一步预测绝对误差，只保留最近的窗口
+            'recent_errors': []
+        }, meta_path)
+        
+        return {
+            'product_id': product_id,
+            'model_type': 'SARIMA',
+            'update_mode': 'refit',
+            'model_path': model_path,
+            'data_points': len(sales_data),
+            'metrics': {
+                'mae': round(mae, 2),
+                'rmse': round(rmse, 2)
+            },
+            'training_success': True
+        }
+    
+    except Exception as e:
+        return {
+            'product_id': product_id,
+            'model_type': 'SARIMA',
+            'training_success': False,
+            'error': str(e)
+        }
+
+
+def _refresh_sarima_model(product_id: int, sales_data: pd.DataFrame, cancel_marker: Optional[str] = None) -> Dict[str, Any]:
+    """
+    增量更新单个产品的SARIMA模型
+    
+    在已保存的拟合结果上用原有参数追加新观测（只对新数据运行卡尔曼滤波），
+    耗时与新增天数成正比而与历史长度无关。以下情况回退为完整重新拟合：
+    没有已保存的模型、距上次完整拟合超过SARIMA_REFIT_INTERVAL_DAYS天、
+    新数据与已保存模型之间存在缺口、或最近的一步预测误差显示出漂移。
+    漂移按最近SARIMA_DRIFT_WINDOW_DAYS天的一步预测误差判断，跨多次追加累计，
+    累计不足SARIMA_DRIFT_MIN_OBSERVATIONS天时不判断，避免单日异常触发重新拟合。
+    
+    Args:
+        product_id: 产品ID
+        sales_data: 按日聚合的销售数据
+        cancel_marker: 训练任务的取消标记文件，存在时不保存模型
+        
+    Returns:
+        包含模型更新结果的字典，update_mode为 'append'、'unchanged' 或 'refit'
+    """
+    model_path, meta_path = ForecastService._sarima_paths(product_id)
+    if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+        return dict(_fit_sarima_model(product_id, sales_data, cancel_marker), refit_reason='no_model')
+    
+    try:
+        meta = joblib.load(meta_path)
+        last_date = meta['last_date']
+        
+        if (sales_data.index[-1] - meta['fitted_date']).days >= ForecastService.SARIMA_REFIT_INTERVAL_DAYS:
+            return dict(_fit_sarima_model(product_id, sales_data, cancel_marker), refit_reason='interval')
+        
+        if sales_data.index[-1] <= last_date:
+            return {
+                'product_id': product_id,
+                'model_type': 'SARIMA',
+                'update_mode': 'unchanged',
+                'model_path': model_path,
+                'appended_days': 0,
+                'training_success': True
+            }
+        
+        # 新观测必须紧接在已保存模型的最后一天之后
+        new_dates = pd.date_range(start=last_date + timedelta(days=1), end=sales_data.index[-1], freq='D')
+        if new_dates[0] < sales_data.index[0]:
+            return dict(_fit_sarima_model(product_id, sales_data, cancel_marker), refit_reason='gap')
+        new_quantity = sales_data['quantity'].reindex(new_dates, fill_value=0).astype(float)
+        
+        model_fit = joblib.load(model_path).extend(new_quantity)
+        
+        # 最近的一步预测误差明显大于样本内误差时，说明参数已不适用
+        recent_errors = (
+            list(meta.get('recent_errors', [])) + np.abs(model_fit.forecasts_error[0]).tolist()
+        )[-ForecastService.SARIMA_DRIFT_WINDOW_DAYS:]
+        forecast_mae = float(np.mean(recent_errors))
+        if (
+            len(recent_errors) >= ForecastService.SARIMA_DRIFT_MIN_OBSERVATIONS
+            and forecast_mae > ForecastService.SARIMA_DRIFT_FACTOR * meta['baseline_mae']
+        ):
+            return dict(_fit_sarima_model(product_id, sales_data, cancel_marker), refit_reason='drift')
+        
+        _check_cancelled(cancel_marker)
+        joblib.dump(model_fit, model_path)
+        joblib.dump(dict(meta, last_date=new_dates[-1], recent_errors=recent_errors), meta_path)
+        
+        return {
+            'product_id': product_id,
+            'model_type': 'SARIMA',
+            'update_mode': 'append',
+            'model_path': model_path,
+            'appended_days': len(new_dates),
+            'metrics': {
+                'forecast_mae': round(forecast_mae, 2),
+                'baseline_mae': round(meta['baseline_mae'], 2)
+            },
+            'training_success': True
+        }
+    
+    except Exception as e:
+        return {
+            'product_id': product_id,
+            'model_type': 'SARIMA',
+            'training_success': False,
+            'error': str(e)
+        }
+
+
+def _fit_random_forest_model(product_id: int, sales_data: pd.DataFrame, cancel_marker: Optional[str] = None) -> Dict[str, Any]:
+    """
+    拟合并保存单个产品的RandomForest模型
+    
+    Args:
+        product_id: 产品ID
+        sales_data: 按日聚合的销售数据
+        cancel_marker: 训练任务的取消标记文件，存在时不保存模型
+        
+    Returns:
+        包含模型训练结果的字典
+    """
+    try:
+        # 提取特征
+        features_df = ForecastService._extract_features(sales_data)
+        
+        # 准备训练数据
+        X = features_df.drop('quantity', axis=1)
+        y = features_df['quantity']
+        
+        # 划分训练集和测试集
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, shuffle=False
+        )
+        
+        # 标准化特征
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
+        
+        # 训练RandomForest模型
+        model = RandomForestRegressor(**ForecastService.RANDOM_FOREST_PARAMS)
+        model.fit(X_train_scaled, y_train)
+        
+        # 保存模型和特征缩放器
+        _check_cancelled(cancel_marker)
+        ForecastService._ensure_model_dir()
+        model_path = f"{ForecastService.MODELS_DIR}/rf_{product_id}.pkl"
+        scaler_path = f"{ForecastService.MODELS_DIR}/scaler_{product_id}.pkl"
+        
+        joblib.dump(model, model_path)
+        joblib.dump(scaler, scaler_path)
+        
+        # 评估模型
+        y_pred = model.predict(X_test_scaled)
+        mae = mean_absolute_error(y_test, y_pred)
+        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+        r2 = r2_score(y_test, y_pred)
+        
+        # 特征重要性
+        feature_importance = dict(zip(X.columns, model.feature_importances_))
+        top_features = sorted(
+            feature_importance.items(),
+            key=lambda x: x[1],
+            reverse=True
+        )[:5]
+        
+        return {
+            'product_id': product_id,
+            'model_type': 'RandomForest',
+            'model_path': model_path,
+            'scaler_path': scaler_path,
+            'data_points': len(sales_data),
+            'metrics': {
+                'mae': round(mae, 2),
+                'rmse': round(rmse, 2),
+                'r2': round(r2, 2)
+            },
+            'top_features': top_features,
+            'training_success': True
+        }
+    
+    except Exception as e:
+        return {
+            'product_id': product_id,
+            'model_type': 'RandomForest',
+            'training_success': False,
+            'error': str(e)
+        }
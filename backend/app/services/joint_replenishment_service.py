@@ -0,0 +1,277 @@
+from typing import Dict, List, Any, Optional
+from datetime import date, timedelta
+import time
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.replenishment import Replenishment
+from app.services.forecast_service import ForecastService
+from app.services.replenishment_plan_service import ReplenishmentPlanService
+
+
+class JointReplenishmentService:
+    """
+    联合补货服务：同一供应商的SKU合并下单，分摊每单固定成本
+    
+    对每个供应商求解联合补货问题（JRP）：选择共同的基本订货周期T和每个SKU的整数倍数k，
+    使 (S + Σ s_i/k_i)/T + T/2·Σ k_i·D_i·h_i 最小，其中S为供应商每单固定成本，
+    s_i为每个SKU的附加成本，D_i为年需求，h_i为单位年持有成本。
+    T和k交替优化，所有供应商的SKU在同一组数组上同时迭代。
+    """
+    
+    MAX_ITERATIONS = 50
+    
+    @staticmethod
+    def optimize(
+        supplier_codes: np.ndarray,
+        annual_demand: np.ndarray,
+        holding_cost: np.ndarray,
+        order_costs: np.ndarray,
+        line_cost: float
+    ) -> Dict[str, np.ndarray]:
+        """
+        以向量化方式同时求解多个供应商的联合补货周期和倍数
+        
+        Args:
+            supplier_codes: 每个SKU所属供应商的编号（0..G-1）
+            annual_demand: 每个SKU的年需求
+            holding_cost: 每个SKU的单位年持有成本，需大于0
+            order_costs: 每个供应商的每单固定成本，长度为G
+            line_cost: 每个SKU的附加成本；与每个供应商的order_costs之和需大于0，否则周期为0、成本为NaN
+        
+        Returns:
+            cycle_years（每个供应商的基本周期，单位年）、multiples（每个SKU的倍数）、
+            joint_cost和independent_cost（每个供应商联合/单独下单的年总成本）
+        """
+        n_groups = len(order_costs)
+        demand_holding = annual_demand * holding_cost
+        multiples = np.ones(len(supplier_codes), dtype=np.int64)
+        
+        for _ in range(JointReplenishmentService.MAX_ITERATIONS):
+            # 给定倍数时的最优基本周期
+            fixed = order_costs + np.bincount(supplier_codes, line_cost / multiples, minlength=n_groups)
+            weight = np.bincount(supplier_codes, multiples * demand_holding, minlength=n_groups)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cycle_years = np.sqrt(2 * fixed / weight)
+            
+            # 给定周期时每个SKU的最优倍数：满足 k(k-1) ≤ 2s/(D·h·T²) ≤ k(k+1) 的最大k
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = 2 * line_cost / (demand_holding * cycle_years[supplier_codes] ** 2)
+            new_multiples = np.maximum(
+                1, np.floor((1 + np.sqrt(1 + 4 * np.nan_to_num(ratio))) / 2)
+            ).astype(np.int64)
+            if np.array_equal(new_multiples, multiples):
+                break
+            multiples = new_multiples
+        
+        fixed = order_costs + np.bincount(supplier_codes, line_cost / multiples, minlength=n_groups)
+        weight = np.bincount(supplier_codes, multiples * demand_holding, minlength=n_groups)
+        joint_cost = fixed / cycle_years + cycle_years / 2 * weight
+        
+        # 对比：每个SKU单独按EOQ下单，每单承担全部固定成本
+        independent_cost = np.bincount(
+            supplier_codes,
+            np.sqrt(2 * (order_costs[supplier_codes] + line_cost) * demand_holding),
+            minlength=n_groups
+        )
+        
+        return {
+            'cycle_years': cycle_years,
+            'multiples': multiples,
+            'joint_cost': joint_cost,
+            'independent_cost': independent_cost
+        }
+    
+    @staticmethod
+    def _latest_suppliers(db: Session) -> Dict[int, str]:
+        """每个产品最近一次补货记录中的供应商"""
+        latest = db.query(
+            func.max(Replenishment.id).label('id')
+        ).filter(
+            Replenishment.supplier_info.isnot(None),
+            Replenishment.supplier_info != ''
+        ).group_by(Replenishment.product_id).subquery()
+        rows = db.query(
+            Replenishment.product_id, Replenishment.supplier_info
+        ).join(latest, Replenishment.id == latest.c.id).all()
+        return {row.product_id: row.supplier_info for row in rows}
+    
+    @staticmethod
+    def create_joint_orders(
+        db: Session,
+        category: Optional[str] = None,
+        model_type: str = 'Global',
+        forecast_days: int = 30,
+        max_age_hours: Optional[int] = None,
+        supplier_order_costs: Optional[Dict[str, float]] = None,
+        order_cost: Optional[float] = None,
+        line_cost: Optional[float] = None,
+        holding_cost_rate: Optional[float] = None,
+        dry_run: bool = False,
+        created_by: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        按供应商合并所有活跃产品的补货，求解联合补货方案并批量创建补货记录
+        
+        SKU的供应商取其最近一次补货记录的supplier_info；需求来自补货计划的批量预测，库存位置已扣除在途数量。
+        每个供应商按基本周期下单：库存位置在下一个周期的订单到货前会低于安全库存的SKU计入本次订单，
+        订货量补足到覆盖 提前期 + k个周期 的需求加安全库存。
+        
+        Args:
+            db: 数据库会话
+            category: 产品类别筛选
+            model_type: 预测模型类型（'Global'、'Croston' 或 'Auto'）
+            forecast_days: 预测天数
+            max_age_hours: 预计算预测的最长有效时间（小时）
+            supplier_order_costs: 各供应商的每单固定成本
+            order_cost: 未单独指定的供应商的每单固定成本，默认SUPPLIER_ORDER_COST
+            line_cost: 每个SKU的附加成本，默认ORDER_LINE_COST
+            holding_cost_rate: 年库存持有成本率，默认ForecastService.HOLDING_COST_RATE
+            dry_run: 为真时只返回方案，不创建补货记录
+            created_by: 创建人ID
+        
+        Returns:
+            各供应商的周期、成本和订单明细
+        
+        Raises:
+            HTTPException: 成本参数为负数、供应商的每单固定成本不大于0，或每单固定成本与SKU附加成本之和为0
+        """
+        started_at = time.perf_counter()
+        supplier_order_costs = supplier_order_costs or {}
+        order_cost = settings.SUPPLIER_ORDER_COST if order_cost is None else order_cost
+        line_cost = settings.ORDER_LINE_COST if line_cost is None else line_cost
+        holding_cost_rate = holding_cost_rate or ForecastService.HOLDING_COST_RATE
+        
+        # 每单的固定成本为0时最优周期为0，成本无法计算
+        if any(cost <= 0 for cost in supplier_order_costs.values()):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="供应商的每单固定成本必须大于0"
+            )
+        if order_cost < 0 or line_cost < 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="每单固定成本和SKU附加成本不能为负数"
+            )
+        if order_cost + line_cost <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="每单固定成本与SKU附加成本之和必须大于0"
+            )
+        
+        ReplenishmentPlanService.prepare_plan(db, model_type)
+        suppliers = JointReplenishmentService._latest_suppliers(db)
+        
+        plan = []
+        unassigned = []
+        for row in ReplenishmentPlanService.iter_replenishment_plan(
+            db, model_type, forecast_days, category, max_age_hours
+        ):
+            supplier = suppliers.get(row['product_id'])
+            if supplier is None:
+                unassigned.append({'product_id': row['product_id'], 'reason': '没有供应商信息'})
+            elif row['daily_avg_demand'] <= 0 or row['unit_cost'] <= 0:
+                unassigned.append({'product_id': row['product_id'], 'reason': '没有预测需求或单位成本'})
+            else:
+                plan.append((supplier, row))
+        
+        if not plan:
+            return {
+                'dry_run': dry_run,
+                'supplier_count': 0,
+                'order_count': 0,
+                'suppliers': [],
+                'orders': [],
+                'unassigned': unassigned,
+                'elapsed_seconds': round(time.perf_counter() - started_at, 2)
+            }
+        
+        supplier_names, supplier_codes = np.unique([supplier for supplier, _ in plan], return_inverse=True)
+        daily_demand = np.array([row['daily_avg_demand'] for _, row in plan])
+        unit_cost = np.array([row['unit_cost'] for _, row in plan])
+        position = np.array([row['inventory_position'] for _, row in plan], dtype=float)
+        safety_stock = np.array([row['safety_stock'] for _, row in plan], dtype=float)
+        lead_time = np.array([row['lead_time_days'] for _, row in plan], dtype=float)
+        group_order_costs = np.array([
+            supplier_order_costs.get(name, order_cost) for name in supplier_names
+        ], dtype=float)
+        
+        solution = JointReplenishmentService.optimize(
+            supplier_codes,
+            daily_demand * 365,
+            unit_cost * holding_cost_rate,
+            group_order_costs,
+            line_cost
+        )
+        cycle_days = solution['cycle_years'] * 365
+        sku_cycle_days = cycle_days[supplier_codes]
+        multiples = solution['multiples']
+        
+        # 下一个周期的订单到货前会跌破安全库存的SKU本次下单，订货至覆盖 提前期 + k个周期
+        due = position < safety_stock + daily_demand * (lead_time + sku_cycle_days)
+        order_up_to = safety_stock + daily_demand * (lead_time + multiples * sku_cycle_days)
+        quantities = np.ceil(np.maximum(order_up_to - position, 0)).astype(np.int64)
+        due &= quantities > 0
+        
+        today = date.today()
+        orders = []
+        rows = []
+        for index in np.flatnonzero(due):
+            product_id = plan[index][1]['product_id']
+            supplier = str(supplier_names[supplier_codes[index]])
+            expected_arrival_date = today + timedelta(days=int(lead_time[index]))
+            orders.append({
+                'product_id': product_id,
+                'product_sku': plan[index][1]['product_sku'],
+                'supplier': supplier,
+                'quantity': int(quantities[index]),
+                'multiple': int(multiples[index]),
+                'expected_arrival_date': expected_arrival_date
+            })
+            rows.append({
+                'product_id': product_id,
+                'quantity': int(quantities[index]),
+                'order_date': today,
+                'expected_arrival_date': expected_arrival_date,
+                'status': 'pending',
+                'supplier_info': supplier,
+                'notes': f"联合补货：基本周期{cycle_days[supplier_codes[index]]:.1f}天 × {int(multiples[index])}",
+                'created_by': created_by
+            })
+        
+        due_counts = np.bincount(supplier_codes[due], minlength=len(supplier_names))
+        sku_counts = np.bincount(supplier_codes, minlength=len(supplier_names))
+        suppliers_summary = [
+            {
+                'supplier': str(name),
+                'sku_count': int(sku_counts[code]),
+                'order_line_count': int(due_counts[code]),
+                'order_cost': float(group_order_costs[code]),
+                'cycle_days': round(float(cycle_days[code]), 1),
+                'annual_joint_cost': round(float(solution['joint_cost'][code]), 2),
+                'annual_independent_cost': round(float(solution['independent_cost'][code]), 2)
+            }
+            for code, name in enumerate(supplier_names)
+        ]
+        
+        result = {
+            'dry_run': dry_run,
+            'supplier_count': len(supplier_names),
+            'order_count': len(orders),
+            'suppliers': suppliers_summary,
+            'orders': orders,
+            'unassigned': unassigned
+        }
+        
+        # 响应构建完成后再写入，避免记录已提交而请求失败
+        if rows and not dry_run:
+            # 所有补货记录一次多行插入
+            db.execute(Replenishment.__table__.insert(), rows)
+            db.commit()
+        
+        result['elapsed_seconds'] = round(time.perf_counter() - started_at, 2)
+        return result
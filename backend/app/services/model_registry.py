@@ -0,0 +1,140 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import joblib
+
+from app.core.config import settings
+
+
+class ModelRegistry:
+    """
+    模型注册表：在进程内以LRU方式缓存已加载的模型文件
+    
+    缓存键为模型文件路径，文件的修改时间(mtime)变化时自动重新加载，
+    因此重新训练后的模型无需手动清理缓存即可生效。
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int):
+        """
+        Args:
+            max_entries: 最多缓存的模型数量
+            max_bytes: 缓存总大小上限（按模型文件大小估算）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._reloads = 0
+        self._evictions = 0
+    
+    def load(self, path: str) -> Any:
+        """
+        获取模型对象，命中缓存且文件未变化时不读取磁盘
+        
+        Args:
+            path: 模型文件路径
+        
+        Returns:
+            反序列化后的模型对象
+        
+        Raises:
+            FileNotFoundError: 如果模型文件不存在
+        """
+        file_stat = os.stat(path)
+        
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                if entry["mtime_ns"] == file_stat.st_mtime_ns:
+                    self._entries.move_to_end(path)
+                    self._hits += 1
+                    return entry["model"]
+                # 模型文件已被重新训练覆盖
+                self._remove(path)
+                self._reloads += 1
+            self._misses += 1
+        
+        # 在锁外反序列化，避免阻塞其他请求
+        model = joblib.load(path)
+        
+        with self._lock:
+            if path in self._entries:
+                self._remove(path)
+            if file_stat.st_size <= self.max_bytes:
+                self._entries[path] = {
+                    "model": model,
+                    "mtime_ns": file_stat.st_mtime_ns,
+                    "size": file_stat.st_size
+                }
+                self._total_bytes += file_stat.st_size
+                self._evict()
+        
+        return model
+    
+    def invalidate(self, path: Optional[str] = None) -> int:
+        """
+        使缓存失效
+        
+        Args:
+            path: 模型文件路径，为空时清空全部缓存
+        
+        Returns:
+            被移除的缓存条目数
+        """
+        with self._lock:
+            if path is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._total_bytes = 0
+                return removed
+            if path in self._entries:
+                self._remove(path)
+                return 1
+            return 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+        
+        Returns:
+            包含命中、未命中、淘汰次数和当前占用的字典
+        """
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / requests, 4) if requests else 0,
+                "reloads": self._reloads,
+                "evictions": self._evictions
+            }
+    
+    def _remove(self, path: str) -> None:
+        """移除单个缓存条目（调用方需持有锁）"""
+        entry = self._entries.pop(path)
+        self._total_bytes -= entry["size"]
+    
+    def _evict(self) -> None:
+        """按最近最少使用顺序淘汰，直到满足数量和大小限制（调用方需持有锁）"""
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or self._total_bytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry["size"]
+            self._evictions += 1
+
+
+model_registry = ModelRegistry(
+    max_entries=settings.MODEL_CACHE_MAX_ENTRIES,
+    max_bytes=settings.MODEL_CACHE_MAX_BYTES
+)
@@ -1,22 +1,26 @@
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from sqlalchemy import func
+from sqlalchemy import func, bindparam
 import pandas as pd
 import numpy as np
 from sklearn.cluster import KMeans
 from datetime import datetime, timedelta
 
+from app.core.pagination import decode_cursor
 from app.models.product import Product
 from app.models.sale import Sale
 from app.models.replenishment import Replenishment
 from app.schemas.product import ProductCreate, ProductUpdate
+from app.services.event_bus import event_bus, STOCK_CHANGED
 
 class ProductService:
     """
     产品服务类：处理产品相关的业务逻辑
     """
     
+    BULK_UPDATE_CHUNK_SIZE = 1000  # 批量更新时每次executemany的行数
+    
     @staticmethod
     def get_product_by_id(db: Session, product_id: int) -> Optional[Product]:
         """
@@ -52,18 +56,26 @@ class ProductService:
         limit: int = 100,
         category: Optional[str] = None,
         is_active: Optional[bool] = None,
-        search: Optional[str] = None
+        search: Optional[str] = None,
+        name: Optional[str] = None,
+        sku: Optional[str] = None,
+        needs_replenishment: Optional[bool] = None,
+        cursor: Optional[str] = None
     ) -> List[Product]:
         """
-        获取产品列表
+        获取产品列表，按ID升序
         
         Args:
             db: 数据库会话
-            skip: 跳过的记录数
+            skip: 跳过的记录数，提供cursor时忽略
             limit: 返回的最大记录数
             category: 产品类别筛选
             is_active: 产品状态筛选
             search: 搜索关键词（匹配名称和SKU）
+            name: 名称筛选（模糊匹配）
+            sku: SKU筛选（模糊匹配）
+            needs_replenishment: 是否需要补货筛选
+            cursor: 上一页的游标，从该位置之后继续读取
             
         Returns:
             产品对象列表
@@ -83,7 +95,21 @@ class ProductService:
                 (Product.sku.ilike(search_pattern))
             )
         
-        return query.offset(skip).limit(limit).all()
+        if name:
+            query = query.filter(Product.name.ilike(f"%{name}%"))
+        
+        if sku:
+            query = query.filter(Product.sku.ilike(f"%{sku}%"))
+        
+        if needs_replenishment is not None:
+            query = query.filter(Product.needs_replenishment == needs_replenishment)
+        
+        if cursor:
+            last_id, = decode_cursor(cursor, 1, (int,))
+            query = query.filter(Product.id > last_id)
+            skip = 0
+        
+        return query.order_by(Product.id).offset(skip).limit(limit).all()
     
     @staticmethod
     def get_product_categories(db: Session) -> List[str]:
@@ -251,6 +277,7 @@ class ProductService:
             )
         
         # 更新库存
+        old_quantity = db_product.stock_quantity
         db_product.stock_quantity += quantity_change
         
         # 如果是销售操作，更新销售相关信息
@@ -274,6 +301,17 @@ class ProductService:
         db.commit()
         db.refresh(db_product)
         
+        # 提交后发布库存变化事件，由补货触发等订阅者异步处理
+        event_bus.publish(
+            STOCK_CHANGED,
+            product_id=db_product.id,
+            old_quantity=old_quantity,
+            new_quantity=db_product.stock_quantity,
+            safety_stock=db_product.safety_stock,
+            needs_replenishment=db_product.needs_replenishment,
+            operation_type=operation_type
+        )
+        
         return db_product
         
     @staticmethod
@@ -457,21 +495,71 @@ class ProductService:
         }
         
     @staticmethod
-    def calculate_dynamic_safety_stock(db: Session, service_level: float = 0.95) -> Dict[str, Any]:
+    def bulk_update_products(
+        db: Session,
+        rows: List[Dict[str, Any]],
+        chunk_size: Optional[int] = None
+    ) -> int:
+        """
+        按主键批量更新产品字段，不加载ORM对象
+        
+        每个分块以一条UPDATE语句配合executemany执行，不会提交事务。
+        
+        Args:
+            db: 数据库会话
+            rows: 更新数据列表，每项包含 id 和需要更新的字段，所有项的字段必须相同
+            chunk_size: 每次executemany的行数，默认使用BULK_UPDATE_CHUNK_SIZE
+            
+        Returns:
+            提交给数据库的行数
+        """
+        if not rows:
+            return 0
+        
+        table = Product.__table__
+        columns = [column for column in rows[0] if column != 'id']
+        # 绑定参数名不能与SET中的列名相同
+        statement = table.update().where(
+            table.c.id == bindparam('b_id')
+        ).values({column: bindparam(f'b_{column}') for column in columns})
+        
+        chunk_size = chunk_size or ProductService.BULK_UPDATE_CHUNK_SIZE
+        for offset in range(0, len(rows), chunk_size):
+            db.execute(statement, [
+                {f'b_{key}': value for key, value in row.items()}
+                for row in rows[offset:offset + chunk_size]
+            ])
+        return len(rows)
+    
+    @staticmethod
+    def calculate_dynamic_safety_stock(
+        db: Session,
+        service_level: float = 0.95,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
         """
         计算动态安全库存
         
         Args:
             db: 数据库会话
             service_level: 服务水平（默认95%）
+            dry_run: 为True时只返回变化的产品，不写入数据库
             
         Returns:
             包含安全库存计算结果的字典
         """
         from scipy import stats
         
-        # 获取所有活跃产品
-        products = db.query(Product).filter(Product.is_active == True).all()
+        # 只读取计算需要的列，避免加载完整的ORM对象
+        products = db.query(
+            Product.id,
+            Product.name,
+            Product.sku,
+            Product.safety_stock,
+            Product.sales_quantity,
+            Product.lead_time_days,
+            Product.stock_quantity
+        ).filter(Product.is_active == True).order_by(Product.id).all()
         
         if not products:
             raise HTTPException(
@@ -482,36 +570,53 @@ class ProductService:
         # 服务水平对应的z值
         z_score = stats.norm.ppf(service_level)
         
+        # 假设需求标准差为销售量的20%（简化计算，实际应从销售记录中计算）
+        sales_quantities = np.array([product.sales_quantity or 0 for product in products], dtype=np.float64)
+        lead_times = np.array([product.lead_time_days or 0 for product in products], dtype=np.float64)
+        current_stocks = np.array([product.stock_quantity or 0 for product in products])
+        
+        # 计算安全库存 = Z * σ * √(提前期)，确保安全库存非负
+        safety_stocks = np.maximum(
+            np.round(z_score * sales_quantities * 0.2 * np.sqrt(lead_times)), 0
+        ).astype(np.int64)
+        
         safety_stock_data = []
-        for product in products:
-            # 假设我们有销售数据的标准差
-            # 在实际应用中，应该从销售记录中计算
-            # 这里使用一个简化的计算方式
-            demand_std_dev = product.sales_quantity * 0.2  # 假设需求标准差为销售量的20%
-            lead_time = product.lead_time_days
-            
-            # 计算安全库存 = Z * σ * √(提前期)
-            safety_stock = z_score * demand_std_dev * np.sqrt(lead_time)
-            safety_stock = max(round(safety_stock), 0)  # 确保安全库存非负
-            
-            # 更新产品的安全库存
-            product.safety_stock = safety_stock
-            
+        changes = []
+        for index, product in enumerate(products):
+            safety_stock = int(safety_stocks[index])
             safety_stock_data.append({
                 'id': product.id,
                 'name': product.name,
                 'sku': product.sku,
                 'safety_stock': safety_stock,
-                'lead_time_days': lead_time,
+                'lead_time_days': product.lead_time_days,
                 'current_stock': product.stock_quantity,
-                'needs_replenishment': product.stock_quantity <= safety_stock
+                'needs_replenishment': bool(current_stocks[index] <= safety_stock)
             })
+            if product.safety_stock != safety_stock:
+                changes.append({
+                    'id': product.id,
+                    'sku': product.sku,
+                    'old_safety_stock': product.safety_stock,
+                    'new_safety_stock': safety_stock
+                })
         
-        db.commit()
+        # 只写回发生变化的产品
+        if not dry_run:
+            ProductService.bulk_update_products(db, [
+                {'id': change['id'], 'safety_stock': change['new_safety_stock']}
+                for change in changes
+            ])
+            db.commit()
         
-        return {
+        result = {
             'safety_stock_data': safety_stock_data,
             'service_level': service_level,
             'z_score': z_score,
-            'total_products': len(safety_stock_data)
-        }
\ No newline at end of file
+            'total_products': len(safety_stock_data),
+            'changed_count': len(changes),
+            'dry_run': dry_run
+        }
+        if dry_run:
+            result['changes'] = changes
+        return result
@@ -0,0 +1,141 @@
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.db.session import SessionLocal
+from app.services.event_bus import EventBus, STOCK_CHANGED, REPLENISHMENT_RECEIVED
+from app.services.replenishment_plan_service import ReplenishmentPlanService
+
+# 最近一次触发的补货建议，按产品ID保存。只保存在当前进程内：多个worker进程部署时，
+# 每个进程只看到由本进程发布的库存变化所触发的建议
+_suggestions: Dict[int, Dict[str, Any]] = {}
+_suggestions_lock = threading.Lock()
+
+
+class ReorderTriggerService:
+    """
+    补货触发服务：订阅库存变化事件，库存跌破安全库存时立即生成补货建议
+    
+    建议在事件批次到达后为越过阈值的产品一次性计算（与补货计划相同的批量预测和公式），
+    库存恢复时移除对应建议，读取时无需扫描产品表。
+    
+    事件总线和建议都在进程内：以多个worker进程运行时（如 uvicorn --workers N），
+    每个进程只保存自己处理的请求所触发的建议，读取接口的结果取决于请求落到哪个进程。
+    需要完整的建议列表时应以单个worker运行，或改用补货计划接口。
+    """
+    
+    MODEL_TYPE = 'Croston'  # 间歇需求模型无需模型文件，适合在事件处理中即时预测
+    FORECAST_DAYS = 30
+    
+    @staticmethod
+    def register(bus: EventBus) -> None:
+        """订阅库存变化和补货到货事件"""
+        bus.subscribe(STOCK_CHANGED, ReorderTriggerService.handle_stock_changes)
+        bus.subscribe(REPLENISHMENT_RECEIVED, ReorderTriggerService.handle_replenishments_received)
+    
+    @staticmethod
+    def handle_stock_changes(events: List[Dict[str, Any]]) -> None:
+        """
+        处理一批库存变化事件
+        
+        同一产品只看本批中的首个原库存和最后的新库存：从高于安全库存降到不高于安全库存视为越过阈值。
+        """
+        first_old: Dict[int, int] = {}
+        last_event: Dict[int, Dict[str, Any]] = {}
+        for event in events:
+            first_old.setdefault(event['product_id'], event['old_quantity'])
+            last_event[event['product_id']] = event
+        
+        crossed = []
+        recovered = []
+        for product_id, event in last_event.items():
+            safety_stock = event['safety_stock'] or 0
+            if event['new_quantity'] > safety_stock:
+                recovered.append(product_id)
+            elif first_old[product_id] > safety_stock:
+                crossed.append(product_id)
+        
+        ReorderTriggerService._discard(recovered)
+        if crossed:
+            ReorderTriggerService.generate_suggestions(crossed, triggered_at=max(
+                last_event[product_id]['occurred_at'] for product_id in crossed
+            ))
+    
+    @staticmethod
+    def handle_replenishments_received(events: List[Dict[str, Any]]) -> None:
+        """
+        处理一批补货到货事件
+        
+        到货后库存位置已变化：库存恢复到安全库存以上的产品移除建议，
+        部分到货后仍不高于安全库存的产品按新的库存位置重新生成建议。
+        """
+        last_event: Dict[int, Dict[str, Any]] = {}
+        for event in events:
+            last_event[event['product_id']] = event
+        
+        recovered = []
+        still_short = []
+        for product_id, event in last_event.items():
+            if event['stock_quantity'] > (event['safety_stock'] or 0):
+                recovered.append(product_id)
+            else:
+                still_short.append(product_id)
+        
+        ReorderTriggerService._discard(recovered)
+        if still_short:
+            ReorderTriggerService.generate_suggestions(still_short, triggered_at=max(
+                last_event[product_id]['occurred_at'] for product_id in still_short
+            ))
+    
+    @staticmethod
+    def generate_suggestions(product_ids: List[int], triggered_at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        为指定产品计算补货建议并保存
+        
+        Args:
+            product_ids: 产品ID列表
+            triggered_at: 触发时间（库存变化发生的时间）
+        
+        Returns:
+            生成的建议列表
+        """
+        db = SessionLocal()
+        try:
+            rows = list(ReplenishmentPlanService.iter_replenishment_plan(
+                db,
+                ReorderTriggerService.MODEL_TYPE,
+                ReorderTriggerService.FORECAST_DAYS,
+                product_ids=product_ids
+            ))
+        finally:
+            db.close()
+        
+        generated_at = datetime.now()
+        for row in rows:
+            row['triggered_at'] = triggered_at or generated_at
+            row['generated_at'] = generated_at
+        with _suggestions_lock:
+            for row in rows:
+                _suggestions[row['product_id']] = row
+        return rows
+    
+    @staticmethod
+    def get_suggestions(category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        获取当前的补货建议，按触发时间倒序
+        
+        Args:
+            category: 产品类别筛选
+        """
+        with _suggestions_lock:
+            rows = [
+                dict(row) for row in _suggestions.values()
+                if category is None or row['category'] == category
+            ]
+        return sorted(rows, key=lambda row: row['triggered_at'], reverse=True)
+    
+    @staticmethod
+    def _discard(product_ids: List[int]) -> None:
+        with _suggestions_lock:
+            for product_id in product_ids:
+                _suggestions.pop(product_id, None)
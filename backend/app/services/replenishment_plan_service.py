@@ -0,0 +1,247 @@
+from typing import Dict, List, Any, Optional, Iterator
+from datetime import date, datetime, timedelta
+import os
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.forecast import Forecast
+from app.models.product import Product
+from app.models.replenishment import Replenishment
+from app.services.forecast_service import ForecastService
+
+
+class ReplenishmentPlanService:
+    """
+    补货计划服务：一次性为所有活跃产品生成补货点、经济订货批量和建议补货量
+    
+    按批处理产品：每批的预测来自预计算预测表或批量预测（全局模型/间歇需求模型），
+    在途数量通过一次分组查询取出，补货公式以数组方式整体计算。
+    """
+    
+    PLAN_MODEL_TYPES = ('Global', 'Croston', 'Auto')
+    PLAN_COLUMNS = [
+        'product_id', 'product_sku', 'product_name', 'category', 'model_type',
+        'current_stock', 'pending_quantity', 'inventory_position', 'safety_stock',
+        'lead_time_days', 'unit_cost', 'predicted_demand', 'daily_avg_demand', 'reorder_point',
+        'economic_order_quantity', 'replenishment_quantity', 'suggested_quantity',
+        'needs_replenishment'
+    ]
+    
+    @staticmethod
+    def prepare_plan(db: Session, model_type: str = 'Global'):
+        """
+        在开始流式输出之前检查参数并准备模型，错误以HTTP异常返回
+        
+        Args:
+            db: 数据库会话
+            model_type: 'Global'、'Croston' 或 'Auto'
+        """
+        if model_type not in ReplenishmentPlanService.PLAN_MODEL_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"补货计划仅支持批量预测模型: {', '.join(ReplenishmentPlanService.PLAN_MODEL_TYPES)}"
+            )
+        
+        if model_type in ('Global', 'Auto') and not os.path.exists(ForecastService._global_model_path()):
+            training_result = ForecastService.train_global_model(db)
+            if not training_result['training_success']:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"模型训练失败: {training_result.get('error', '未知错误')}"
+                )
+    
+    @staticmethod
+    def iter_replenishment_plan(
+        db: Session,
+        model_type: str = 'Global',
+        forecast_days: int = 30,
+        category: Optional[str] = None,
+        max_age_hours: Optional[int] = None,
+        only_needed: bool = False,
+        product_ids: Optional[List[int]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        逐个产品生成补货计划行，每次只在内存中保留一批产品
+        
+        Args:
+            db: 数据库会话
+            model_type: 'Global'、'Croston' 或 'Auto'（间歇需求产品用Croston，其余用全局模型）
+            forecast_days: 预测天数
+            category: 产品类别筛选
+            max_age_hours: 预计算预测的最长有效时间（小时），为0时总是批量实时预测
+            only_needed: 是否只输出需要补货的产品
+            product_ids: 只计划指定的产品
+        
+        Yields:
+            补货计划行，字段见PLAN_COLUMNS
+        """
+        if max_age_hours is None:
+            max_age_hours = settings.FORECAST_MAX_AGE_HOURS
+        
+        query = db.query(Product).filter(Product.is_active == True)
+        if category:
+            query = query.filter(Product.category == category)
+        if product_ids is not None:
+            query = query.filter(Product.id.in_(product_ids))
+        products = query.order_by(Product.id).all()
+        
+        chunk_size = ForecastService.REFRESH_CHUNK_SIZE
+        for offset in range(0, len(products), chunk_size):
+            chunk = products[offset:offset + chunk_size]
+            product_ids = [product.id for product in chunk]
+            
+            predicted, model_types = ReplenishmentPlanService._chunk_forecasts(
+                db, chunk, model_type, forecast_days, max_age_hours
+            )
+            pending = ReplenishmentPlanService._pending_quantities(db, product_ids)
+            
+            safety_stock = np.array([product.safety_stock or 0 for product in chunk])
+            current_stock = np.array([product.stock_quantity or 0 for product in chunk])
+            lead_time_days = np.array([product.lead_time_days or 0 for product in chunk])
+            unit_cost = np.array([product.cost or 0 for product in chunk], dtype=float)
+            metrics = ForecastService.replenishment_metrics(
+                predicted,
+                forecast_days,
+                safety_stock,
+                current_stock,
+                lead_time_days,
+                unit_cost,
+                pending
+            )
+            
+            for index, product in enumerate(chunk):
+                needs_replenishment = bool(metrics['needs_replenishment'][index])
+                if only_needed and not needs_replenishment:
+                    continue
+                yield {
+                    'product_id': product.id,
+                    'product_sku': product.sku,
+                    'product_name': product.name,
+                    'category': product.category,
+                    'model_type': model_types[index],
+                    'current_stock': int(current_stock[index]),
+                    'pending_quantity': int(pending[index]),
+                    'inventory_position': int(metrics['inventory_position'][index]),
+                    'safety_stock': int(safety_stock[index]),
+                    'lead_time_days': int(lead_time_days[index]),
+                    'unit_cost': float(unit_cost[index]),
+                    'predicted_demand': round(float(predicted[index]), 2),
+                    'daily_avg_demand': round(float(metrics['daily_avg_demand'][index]), 2),
+                    'reorder_point': int(metrics['reorder_point'][index]),
+                    'economic_order_quantity': int(metrics['economic_order_quantity'][index]),
+                    'replenishment_quantity': int(metrics['replenishment_quantity'][index]),
+                    'suggested_quantity': int(metrics['suggested_quantity'][index]),
+                    'needs_replenishment': needs_replenishment
+                }
+    
+    @staticmethod
+    def _chunk_forecasts(
+        db: Session,
+        products: List[Product],
+        model_type: str,
+        days: int,
+        max_age_hours: int
+    ):
+        """
+        取得一批产品在预测期内的总预测销量
+        
+        优先使用预测表中未过期且天数足够的预测，其余产品按模型类型批量实时预测。
+        
+        Returns:
+            (总预测销量数组, 每个产品实际使用的模型类型列表)
+        """
+        if model_type == 'Auto':
+            # 按零需求占比为每个产品选择间歇需求模型或全局模型
+            profile_days = 90
+            end_date = datetime.now()
+            sales_frame = ForecastService._query_daily_sales(db, [product.id for product in products], profile_days)
+            _, _, matrix = ForecastService.build_sales_matrix(
+                sales_frame,
+                product_ids=[product.id for product in products],
+                start_date=end_date - timedelta(days=profile_days - 1),
+                end_date=end_date
+            )
+            history_days, zero_ratio = ForecastService._demand_profile(matrix)
+            model_types = [
+                'Croston' if ForecastService.recommend_model_type(float(ratio), int(history)) == 'Croston' else 'Global'
+                for ratio, history in zip(zero_ratio, history_days)
+            ]
+        else:
+            model_types = [model_type] * len(products)
+        
+        predicted = np.full(len(products), np.nan)
+        for batch_model_type in sorted(set(model_types)):
+            indices = [index for index, value in enumerate(model_types) if value == batch_model_type]
+            
+            if max_age_hours > 0:
+                stored = ReplenishmentPlanService._stored_totals(
+                    db, [products[index].id for index in indices], batch_model_type, days, max_age_hours
+                )
+                for index in indices:
+                    if products[index].id in stored:
+                        predicted[index] = stored[products[index].id]
+            
+            missing = [index for index in indices if np.isnan(predicted[index])]
+            if not missing:
+                continue
+            missing_products = [products[index] for index in missing]
+            if batch_model_type == 'Global':
+                _, predictions = ForecastService.predict_global_batch(db, missing_products, days)
+            else:
+                _, predictions = ForecastService.predict_intermittent_batch(db, missing_products, days)
+            predicted[missing] = predictions.sum(axis=1)
+        
+        return predicted, model_types
+    
+    @staticmethod
+    def _stored_totals(
+        db: Session,
+        product_ids: List[int],
+        model_type: str,
+        days: int,
+        max_age_hours: int
+    ) -> Dict[int, float]:
+        """
+        从各产品最新一批预计算预测中汇总预测销量，天数不足的产品不返回
+        
+        与ForecastService.get_stored_forecast的口径一致：取今天及之后的前days天。
+        全局模型和间歇需求模型的批次从生成次日开始，生成当天同样能取满days天。
+        """
+        latest = ForecastService._latest_forecast_batches(db, model_type, max_age_hours, product_ids)
+        today = date.today()
+        rows = db.query(
+            Forecast.product_id,
+            Forecast.predicted_quantity
+        ).join(
+            latest,
+            (Forecast.product_id == latest.c.product_id) & (Forecast.generated_at == latest.c.generated_at)
+        ).filter(
+            Forecast.model_type == model_type,
+            Forecast.forecast_date >= today,
+            Forecast.forecast_date <= today + timedelta(days=days)
+        ).order_by(Forecast.product_id, Forecast.forecast_date).all()
+        
+        totals: Dict[int, float] = {}
+        counts: Dict[int, int] = {}
+        for row in rows:
+            if counts.get(row.product_id, 0) < days:
+                totals[row.product_id] = totals.get(row.product_id, 0.0) + float(row.predicted_quantity)
+                counts[row.product_id] = counts.get(row.product_id, 0) + 1
+        return {product_id: total for product_id, total in totals.items() if counts[product_id] >= days}
+    
+    @staticmethod
+    def _pending_quantities(db: Session, product_ids: List[int]) -> np.ndarray:
+        """一次分组查询取出产品的在途（pending）补货数量，顺序与product_ids一致"""
+        rows = db.query(
+            Replenishment.product_id,
+            func.sum(Replenishment.quantity).label('total')
+        ).filter(
+            Replenishment.product_id.in_(product_ids),
+            Replenishment.status == "pending"
+        ).group_by(Replenishment.product_id).all()
+        totals = {row.product_id: row.total or 0 for row in rows}
+        return np.array([totals.get(product_id, 0) for product_id in product_ids], dtype=float)
@@ -2,12 +2,14 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case, cast, Float, or_, and_, bindparam, tuple_
 
+from app.core.pagination import encode_cursor, decode_cursor
 from app.models.replenishment import Replenishment
 from app.models.product import Product
 from app.schemas.replenishment import ReplenishmentCreate, ReplenishmentUpdate
 from app.services.product_service import ProductService
+from app.services.event_bus import event_bus, STOCK_CHANGED, REPLENISHMENT_RECEIVED
 
 class ReplenishmentService:
     """
@@ -36,19 +38,21 @@ class ReplenishmentService:
         product_id: Optional[int] = None,
         status: Optional[str] = None,
         start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None
+        end_date: Optional[datetime] = None,
+        cursor: Optional[str] = None
     ) -> List[Replenishment]:
         """
-        获取补货记录列表
+        获取补货记录列表，按 (created_at, id) 倒序
         
         Args:
             db: 数据库会话
-            skip: 跳过的记录数
+            skip: 跳过的记录数，提供cursor时忽略
             limit: 返回的最大记录数
             product_id: 产品ID筛选
             status: 状态筛选（pending, received, cancelled）
             start_date: 开始日期筛选
             end_date: 结束日期筛选
+            cursor: 上一页的游标，从该位置之后继续读取
             
         Returns:
             补货记录对象列表
@@ -67,7 +71,21 @@ class ReplenishmentService:
         if end_date:
             query = query.filter(Replenishment.created_at <= end_date)
         
-        return query.order_by(desc(Replenishment.created_at)).offset(skip).limit(limit).all()
+        if cursor:
+            last_created_at, last_id = decode_cursor(cursor, 2, (datetime.fromisoformat, int))
+            query = query.filter(
+                tuple_(Replenishment.created_at, Replenishment.id) < tuple_(last_created_at, last_id)
+            )
+            skip = 0
+        
+        return query.order_by(
+            desc(Replenishment.created_at), desc(Replenishment.id)
+        ).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def replenishment_cursor_key(replenishment: Replenishment) -> List[Any]:
+        """补货记录列表的分页排序键"""
+        return [replenishment.created_at.isoformat(), replenishment.id]
     
     @staticmethod
     def create_replenishment(db: Session, replenishment: ReplenishmentCreate) -> Replenishment:
@@ -216,8 +234,145 @@ class ReplenishmentService:
         db.commit()
         db.refresh(db_replenishment)
         
+        event_bus.publish(
+            REPLENISHMENT_RECEIVED,
+            product_id=db_replenishment.product_id,
+            replenishment_id=db_replenishment.id,
+            quantity=final_quantity,
+            stock_quantity=db_product.stock_quantity,
+            safety_stock=db_product.safety_stock
+        )
+        
         return db_replenishment
     
+    @staticmethod
+    def bulk_confirm_replenishments(
+        db: Session,
+        lines: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        批量确认补货到货，所有库存增加和状态变更在一个事务中完成
+        
+        补货记录和涉及的产品各用一次查询加锁读取，状态和库存分别以一条UPDATE语句配合executemany写入，
+        只提交一次。无法确认的行（不存在、状态不是待处理、重复）不影响其他行。
+        
+        Args:
+            db: 数据库会话
+            lines: 到货明细列表，每项包含 replenishment_id 和可选的 actual_quantity（默认使用计划数量）
+            
+        Returns:
+            包含每行结果和成功、失败数量的字典
+        """
+        ids = [line['replenishment_id'] for line in lines]
+        replenishments = {
+            row.id: row
+            for row in db.query(
+                Replenishment.id, Replenishment.product_id, Replenishment.quantity, Replenishment.status
+            ).filter(Replenishment.id.in_(ids)).order_by(Replenishment.id).with_for_update().all()
+        }
+        
+        results = []
+        received = []
+        seen = set()
+        for line in lines:
+            replenishment_id = line['replenishment_id']
+            replenishment = replenishments.get(replenishment_id)
+            error = None
+            if replenishment_id in seen:
+                error = "同一补货记录在请求中重复"
+            elif replenishment is None:
+                error = "补货记录不存在"
+            elif replenishment.status != "pending":
+                error = f"补货记录状态为{replenishment.status}，无法确认到货"
+            seen.add(replenishment_id)
+            
+            if error:
+                results.append({
+                    "replenishment_id": replenishment_id,
+                    "success": False,
+                    "error": error
+                })
+                continue
+            
+            actual_quantity = line.get('actual_quantity')
+            final_quantity = actual_quantity if actual_quantity is not None else replenishment.quantity
+            received.append((replenishment_id, replenishment.product_id, final_quantity))
+            results.append({
+                "replenishment_id": replenishment_id,
+                "success": True,
+                "product_id": replenishment.product_id,
+                "actual_quantity": final_quantity
+            })
+        
+        stock_changes = []
+        if received:
+            received_at = datetime.now()
+            
+            # 按产品汇总到货数量，锁定产品行后计算新库存
+            increments: Dict[int, int] = {}
+            for _, product_id, quantity in received:
+                increments[product_id] = increments.get(product_id, 0) + quantity
+            products = db.query(
+                Product.id, Product.stock_quantity, Product.safety_stock
+            ).filter(Product.id.in_(list(increments))).order_by(Product.id).with_for_update().all()
+            
+            product_rows = []
+            for product in products:
+                new_quantity = (product.stock_quantity or 0) + increments[product.id]
+                needs_replenishment = new_quantity <= (product.safety_stock or 0)
+                product_rows.append({
+                    'id': product.id,
+                    'stock_quantity': new_quantity,
+                    'needs_replenishment': needs_replenishment
+                })
+                stock_changes.append({
+                    'product_id': product.id,
+                    'old_quantity': product.stock_quantity,
+                    'new_quantity': new_quantity,
+                    'safety_stock': product.safety_stock,
+                    'needs_replenishment': needs_replenishment
+                })
+            
+            table = Replenishment.__table__
+            db.execute(
+                table.update().where(
+                    table.c.id == bindparam('b_id')
+                ).where(
+                    table.c.status == "pending"
+                ).values(
+                    status="received",
+                    received_at=received_at,
+                    actual_quantity=bindparam('b_actual_quantity')
+                ),
+                [
+                    {'b_id': replenishment_id, 'b_actual_quantity': quantity}
+                    for replenishment_id, _, quantity in received
+                ]
+            )
+            ProductService.bulk_update_products(db, product_rows)
+            db.commit()
+        
+        # 提交后发布事件
+        for change in stock_changes:
+            event_bus.publish(STOCK_CHANGED, operation_type='replenishment', **change)
+        new_stock = {change['product_id']: change for change in stock_changes}
+        for replenishment_id, product_id, quantity in received:
+            event_bus.publish(
+                REPLENISHMENT_RECEIVED,
+                product_id=product_id,
+                replenishment_id=replenishment_id,
+                quantity=quantity,
+                stock_quantity=new_stock[product_id]['new_quantity'],
+                safety_stock=new_stock[product_id]['safety_stock']
+            )
+        
+        return {
+            "total": len(lines),
+            "received_count": len(received),
+            "failed_count": len(lines) - len(received),
+            "results": results
+        }
+    
     @staticmethod
     def cancel_replenishment(
         db: Session,
@@ -323,61 +478,92 @@ class ReplenishmentService:
     @staticmethod
     def get_products_needing_replenishment(
         db: Session,
-        skip: int = 0,
-        limit: int = 100
-    ) -> List[Dict[str, Any]]:
+        limit: Optional[int] = 100,
+        cursor: Optional[str] = None,
+        category: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         获取需要补货的产品列表
         
+        在途数量通过一次分组聚合子查询连接得到，按 (库存量/安全库存比例, 产品ID) 键集分页。
+        
         Args:
             db: 数据库会话
-            skip: 跳过的记录数
-            limit: 返回的最大记录数
+            limit: 返回的最大记录数，为空时返回全部
+            cursor: 上一页返回的next_cursor，为空时从第一页开始
+            category: 产品类别过滤
             
         Returns:
-            需要补货的产品列表
+            包含items和next_cursor（没有更多数据时为None）的字典
         """
-        # 查询需要补货的产品
-        products = db.query(
-            Product
+        # 所有产品的在途（pending）补货数量只聚合一次
+        pending = db.query(
+            Replenishment.product_id.label("product_id"),
+            func.sum(Replenishment.quantity).label("total")
+        ).filter(
+            Replenishment.status == "pending"
+        ).group_by(
+            Replenishment.product_id
+        ).subquery()
+        
+        # 优先级：库存量/安全库存比例升序，安全库存不大于0时按0处理
+        stock_ratio = case(
+            [(Product.safety_stock > 0, cast(Product.stock_quantity, Float) / Product.safety_stock)],
+            else_=0.0
+        )
+        
+        query = db.query(
+            Product,
+            stock_ratio.label("stock_ratio"),
+            func.coalesce(pending.c.total, 0).label("pending_quantity")
+        ).outerjoin(
+            pending, pending.c.product_id == Product.id
         ).filter(
             Product.is_active == True,
             Product.needs_replenishment == True
-        ).order_by(
-            # 优先级：库存量/安全库存比例升序
-            (Product.stock_quantity / Product.safety_stock).asc()
-        ).offset(skip).limit(limit).all()
+        )
+        if category:
+            query = query.filter(Product.category == category)
+        if cursor:
+            last_ratio, last_id = decode_cursor(cursor, 2, (float, int))
+            query = query.filter(or_(
+                stock_ratio > last_ratio,
+                and_(stock_ratio == last_ratio, Product.id > last_id)
+            ))
+        
+        query = query.order_by(stock_ratio.asc(), Product.id.asc())
+        if limit is not None:
+            # 多取一行用于判断是否还有下一页
+            query = query.limit(limit + 1)
+        rows = query.all()
+        
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
         
         # 格式化结果
-        result = []
-        for product in products:
-            # 计算建议补货数量：目标库存 - 当前库存
+        items = []
+        for product, ratio, pending_quantity in rows:
+            # 计算建议补货数量：目标库存（最大库存） - 当前库存
             suggested_quantity = max(
                 0, 
-                product.target_stock - product.stock_quantity
+                (product.max_stock or 0) - product.stock_quantity
             )
             
-            # 检查是否有未完成的补货
-            pending_replenishments = db.query(
-                func.sum(Replenishment.quantity).label("total")
-            ).filter(
-                Replenishment.product_id == product.id,
-                Replenishment.status == "pending"
-            ).first()
-            
-            pending_quantity = pending_replenishments.total or 0
-            
-            result.append({
+            items.append({
                 "product_id": product.id,
                 "name": product.name,
                 "sku": product.sku,
                 "category": product.category,
                 "current_stock": product.stock_quantity,
                 "safety_stock": product.safety_stock,
-                "target_stock": product.target_stock,
+                "target_stock": product.max_stock,
                 "suggested_quantity": int(suggested_quantity),
                 "pending_quantity": int(pending_quantity),
-                "stock_ratio": round(product.stock_quantity / product.safety_stock, 2) if product.safety_stock > 0 else 0
+                "stock_ratio": round(ratio, 2)
             })
         
-        return result
\ No newline at end of file
+        return {
+            "items": items,
+            "next_cursor": encode_cursor([rows[-1].stock_ratio, rows[-1][0].id]) if has_more else None
+        }
\ No newline at end of file
@@ -1,14 +1,21 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import numpy as np
 from scipy import stats
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import desc
 from fastapi import HTTPException, status
 
+from app.core.config import settings
 from app.models.product import Product
+from app.models.replenishment import Replenishment
 from app.models.sale import Sale
 from app.services.forecast_service import ForecastService
+from app.services.product_service import ProductService
+from app.services.demand_statistics_service import DemandStatisticsService
+from app.services.seasonality_service import SeasonalityService
 
 
 class SafetyStockService:
@@ -16,6 +23,10 @@ class SafetyStockService:
     安全库存服务：计算和管理商品安全库存水平
     """
     
+    AUTO_UPDATE_CHUNK_SIZE = 5000  # 自动更新时每批计算的产品数
+    SIMULATION_TRIALS = 10000  # 蒙特卡洛模拟每个产品的试验次数
+    SIMULATION_MAX_ELEMENTS = 5_000_000  # 单批模拟数组（产品 × 试验 × 天）的元素上限，每个元素约占8字节
+    
     @staticmethod
     def calculate_safety_stock(
         db: Session,
@@ -50,99 +61,363 @@ class SafetyStockService:
                 detail="产品不存在"
             )
         
-        # 获取历史销售数据
-        start_date = datetime.now() - timedelta(days=history_months * 30)
-        sales_data = db.query(
-            func.date(Sale.sale_date).label("date"),
-            func.sum(Sale.quantity).label("quantity")
-        ).filter(
-            Sale.product_id == product_id,
-            Sale.sale_date >= start_date
-        ).group_by(
-            func.date(Sale.sale_date)
-        ).order_by(
-            func.date(Sale.sale_date)
-        ).all()
+        return SafetyStockService.calculate_safety_stock_batch(
+            db,
+            [product],
+            service_level,
+            history_months,
+            lead_time_days,
+            consider_seasonality
+        )[0]
+    
+    @staticmethod
+    def _load_demand_matrix(
+        db: Session,
+        product_ids: List[int],
+        history_months: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        一次分组查询取出多个产品的每日销量，缺失日期补0后组成 产品 × 日期 矩阵
         
-        # 检查是否有足够的销售数据
-        if len(sales_data) < 30:  # 至少需要30天的数据
-            return {
-                "product_id": product_id,
-                "current_safety_stock": product.safety_stock,
-                "suggested_safety_stock": product.safety_stock,  # 数据不足时保持原值
-                "change_percentage": 0,
-                "confidence_level": 0.5,
-                "reason": "历史销售数据不足，无法计算可靠的安全库存水平"
-            }
-        
-        # 提取销售数量数据
-        daily_sales = [sale.quantity for sale in sales_data]
-        
-        # 计算需求标准差
-        demand_std = np.std(daily_sales)
-        
-        # 根据服务水平获取Z值（标准正态分布的分位数）
-        z_score = stats.norm.ppf(service_level)
-        
-        # 计算安全库存
-        # 基本公式: 安全库存 = Z * 需求标准差 * sqrt(补货提前期)
-        safety_stock_base = z_score * demand_std * np.sqrt(lead_time_days)
-        
-        # 考虑季节性因素（如果需要）
-        seasonality_factor = 1.0
-        if consider_seasonality:
-            # 使用预测服务检测季节性
-            try:
-                seasonality_info = ForecastService.detect_seasonality(
-                    db, product_id, history_months
-                )
-                
-                if seasonality_info["has_seasonality"]:
-                    # 根据季节性强度调整因子
-                    seasonality_strength = seasonality_info["seasonality_strength"]
-                    # 季节性越强，因子越大
-                    seasonality_factor = 1.0 + min(seasonality_strength * 0.5, 0.5)
-                    
-                    # 考虑当前是否处于高峰期
-                    if seasonality_info["is_peak_season"]:
-                        seasonality_factor *= 1.2
-            except Exception:
-                # 如果季节性检测失败，使用默认因子
-                seasonality_factor = 1.0
-        
-        # 应用季节性因子
-        suggested_safety_stock = int(safety_stock_base * seasonality_factor)
-        
-        # 确保安全库存至少为1
-        suggested_safety_stock = max(1, suggested_safety_stock)
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表，决定矩阵的行顺序
+            history_months: 历史数据月数
+            
+        Returns:
+            (销量矩阵, 每个产品有效日期的掩码)，产品首次销售之前的日期不计入统计
+        """
+        days = history_months * 30
+        end_date = datetime.now()
+        sales_frame = ForecastService._query_daily_sales(db, product_ids, days)
+        _, _, matrix = ForecastService.build_sales_matrix(
+            sales_frame,
+            product_ids=product_ids,
+            start_date=end_date - timedelta(days=days),
+            end_date=end_date
+        )
+        matrix = matrix.astype(np.float64)
+        
+        n_days = matrix.shape[1]
+        has_sales = matrix > 0
+        first_sale = np.where(has_sales.any(axis=1), has_sales.argmax(axis=1), n_days)
+        observed = np.arange(n_days)[None, :] >= first_sale[:, None]
+        return matrix, observed
+    
+    @staticmethod
+    def calculate_safety_stock_batch(
+        db: Session,
+        products: List[Product],
+        service_level: float = 0.95,
+        history_months: int = 6,
+        lead_time_days: int = 7,
+        consider_seasonality: bool = True,
+        method: str = 'normal',
+        persist: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        以向量化方式同时计算多个商品的安全库存
+        
+        所有产品的销售数据通过一次分组查询取出，需求标准差、变异系数、置信度和安全库存
+        均按 产品 × 日期 矩阵整体计算。
+        
+        Args:
+            db: 数据库会话
+            products: 产品对象列表
+            service_level: 服务水平（默认0.95，即95%）
+            history_months: 历史数据月数（默认6个月）
+            lead_time_days: 补货提前期（天数），模拟模式下作为没有到货记录时的默认值
+            consider_seasonality: 是否考虑季节性因素（仅用于正态公式）
+            method: 'normal' 按正态分布公式计算；'simulation' 以蒙特卡洛模拟达到目标满足率
+            persist: 是否保存计算过程中新构建的需求统计；为False时不写入数据库
+            
+        Returns:
+            与products顺序一致的计算结果列表，每项格式与calculate_safety_stock相同
+        """
+        if not products:
+            return []
+        
+        product_ids = [product.id for product in products]
+        history_days = history_months * 30
+        if method == 'simulation' or history_days > DemandStatisticsService.WINDOW_DAYS:
+            matrix, observed = SafetyStockService._load_demand_matrix(db, product_ids, history_months)
+            
+            # 有销售的天数（至少需要30天）和首次销售以来的需求均值、标准差
+            sales_days = (matrix > 0).sum(axis=1)
+            observed_days = np.maximum(observed.sum(axis=1), 1)
+            demand_mean = np.where(observed, matrix, 0).sum(axis=1) / observed_days
+            demand_std = np.sqrt(
+                np.where(observed, (matrix - demand_mean[:, None]) ** 2, 0).sum(axis=1) / observed_days
+            )
+        else:
+            # 正态公式只需要均值和标准差，直接读取随销售写入增量维护的需求统计
+            statistics = DemandStatisticsService.get_statistics(db, product_ids, history_days, persist=persist)
+            sales_days = statistics['sales_days']
+            demand_mean = statistics['mean']
+            demand_std = statistics['std']
+        
+        if method == 'simulation':
+            # 从历史需求和实际到货提前期中重抽样，服务水平作为目标满足率
+            lead_times = SafetyStockService._load_lead_times(db, product_ids, lead_time_days)
+            simulation = SafetyStockService.simulate_lead_time_demand(
+                matrix, observed, lead_times, service_level
+            )
+            safety_stock_base = simulation['safety_stock']
+        else:
+            # 根据服务水平获取Z值（标准正态分布的分位数）
+            z_score = stats.norm.ppf(service_level)
+            
+            # 基本公式: 安全库存 = Z * 需求标准差 * sqrt(补货提前期)
+            safety_stock_base = z_score * demand_std * np.sqrt(lead_time_days)
+        
+        # 季节性因子取自季节性档案：有周季节性时按强度上调（最多50%），处于高峰月份再上调20%。
+        # 模拟直接从历史需求中重抽样，已包含季节性波动，再乘以因子会重复计算
+        seasonality_factors = np.ones(len(products))
+        if consider_seasonality and method != 'simulation':
+            profiles = SeasonalityService.get_profiles(db, [product.id for product in products], refresh=False)
+            for index, product in enumerate(products):
+                profile = profiles.get(product.id)
+                if profile is None:
+                    continue
+                if profile['has_seasonality']:
+                    seasonality_factors[index] += min(profile['seasonality_strength'] * 0.5, 0.5)
+                if profile['is_peak_season']:
+                    seasonality_factors[index] *= SeasonalityService.PEAK_SEASON_FACTOR
+        
+        # 应用季节性因子，确保安全库存至少为1
+        suggested_safety_stocks = np.maximum(
+            1, np.floor(safety_stock_base * seasonality_factors)
+        ).astype(np.int64)
         
         # 计算变化百分比
-        current_safety_stock = product.safety_stock or 1  # 避免除以零
-        change_percentage = (suggested_safety_stock - current_safety_stock) / current_safety_stock
+        current_safety_stocks = np.array([product.safety_stock or 1 for product in products])  # 避免除以零
+        change_percentages = (suggested_safety_stocks - current_safety_stocks) / current_safety_stocks
         
         # 计算置信度（基于数据量和变异系数）
-        cv = demand_std / np.mean(daily_sales) if np.mean(daily_sales) > 0 else 1
-        data_points_factor = min(len(sales_data) / 180, 1)  # 数据越多越好，最高1
-        cv_factor = max(1 - cv, 0.3)  # 变异系数越小越好，最低0.3
-        confidence_level = data_points_factor * cv_factor
-        
-        # 生成调整建议原因
-        reason = SafetyStockService._generate_adjustment_reason(
-            current_safety_stock,
-            suggested_safety_stock,
-            change_percentage,
-            service_level,
-            seasonality_factor,
-            cv
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cvs = np.where(demand_mean > 0, demand_std / demand_mean, 1.0)
+        data_points_factors = np.minimum(sales_days / 180, 1)  # 数据越多越好，最高1
+        cv_factors = np.maximum(1 - cvs, 0.3)  # 变异系数越小越好，最低0.3
+        confidence_levels = data_points_factors * cv_factors
+        
+        results = []
+        for index, product in enumerate(products):
+            if sales_days[index] < 30:
+                results.append({
+                    "product_id": product.id,
+                    "current_safety_stock": product.safety_stock,
+                    "suggested_safety_stock": product.safety_stock,  # 数据不足时保持原值
+                    "change_percentage": 0,
+                    "confidence_level": 0.5,
+                    "reason": "历史销售数据不足，无法计算可靠的安全库存水平"
+                })
+                continue
+            
+            # 生成调整建议原因
+            reason = SafetyStockService._generate_adjustment_reason(
+                int(current_safety_stocks[index]),
+                int(suggested_safety_stocks[index]),
+                float(change_percentages[index]),
+                service_level,
+                float(seasonality_factors[index]),
+                float(cvs[index])
+            )
+            
+            results.append({
+                "product_id": product.id,
+                "current_safety_stock": int(current_safety_stocks[index]),
+                "suggested_safety_stock": int(suggested_safety_stocks[index]),
+                "change_percentage": float(change_percentages[index]),
+                "confidence_level": float(confidence_levels[index]),
+                "reason": reason
+            })
+        
+        return results
+    
+    @staticmethod
+    def _load_lead_times(
+        db: Session,
+        product_ids: List[int],
+        default_lead_time_days: int
+    ) -> List[np.ndarray]:
+        """
+        一次查询取出多个产品已到货补货单的实际提前期（到货日期 - 下单日期）
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表
+            default_lead_time_days: 没有到货记录的产品使用的提前期
+            
+        Returns:
+            与product_ids顺序一致的提前期数组列表
+        """
+        records = db.query(
+            Replenishment.product_id,
+            Replenishment.order_date,
+            Replenishment.received_at
+        ).filter(
+            Replenishment.product_id.in_(product_ids),
+            Replenishment.status == "received",
+            Replenishment.received_at.isnot(None)
+        ).all()
+        
+        lead_times_by_product: Dict[int, List[int]] = {}
+        for record in records:
+            days = (record.received_at.date() - record.order_date).days
+            lead_times_by_product.setdefault(record.product_id, []).append(max(days, 0))
+        
+        return [
+            np.array(lead_times_by_product.get(product_id, [default_lead_time_days]), dtype=np.int64)
+            for product_id in product_ids
+        ]
+    
+    @staticmethod
+    def simulate_lead_time_demand(
+        matrix: np.ndarray,
+        observed: np.ndarray,
+        lead_times: List[np.ndarray],
+        fill_rate: float = 0.95,
+        trials: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        seed: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        蒙特卡洛模拟提前期内的需求，求达到目标满足率的再订货点
+        
+        每次试验先从产品的实际提前期中抽取提前期L，再从产品首次销售以来的每日需求中
+        有放回地抽取L天求和。满足率定义为提前期需求中能被再订货点覆盖的比例：
+        1 - E[(D - R)+] / E[D]，取满足目标的最小R。
+        
+        产品按批组成 (产品, 试验, 天) 数组一次计算，批数较多时分发到进程池并行执行。
+        
+        Args:
+            matrix: 产品 × 日期 的销量矩阵
+            observed: 每个产品有效日期的掩码（首次销售之后）
+            lead_times: 每个产品的提前期样本
+            fill_rate: 目标满足率
+            trials: 每个产品的试验次数，默认SIMULATION_TRIALS
+            max_workers: 最大进程数，默认使用配置的FORECAST_MAX_WORKERS
+            seed: 随机种子，便于复现
+            
+        Returns:
+            包含 reorder_point、mean_demand、safety_stock、fill_rate、cycle_service_level 数组的字典
+        """
+        trials = trials or SafetyStockService.SIMULATION_TRIALS
+        n_products, n_days = matrix.shape
+        first_sale = n_days - observed.sum(axis=1)
+        
+        results = {
+            key: np.zeros(n_products)
+            for key in ('reorder_point', 'mean_demand', 'safety_stock', 'fill_rate', 'cycle_service_level')
+        }
+        # 没有任何销售的产品不需要模拟
+        simulated = np.flatnonzero(first_sale < n_days)
+        if len(simulated) == 0:
+            return results
+        
+        max_lead_time = max(1, max(int(lead_times[index].max()) for index in simulated))
+        chunk_size = max(1, SafetyStockService.SIMULATION_MAX_ELEMENTS // (trials * max_lead_time))
+        chunks = [simulated[offset:offset + chunk_size] for offset in range(0, len(simulated), chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        
+        tasks = [
+            (
+                matrix[chunk].astype(np.float32),
+                first_sale[chunk],
+                [lead_times[index] for index in chunk],
+                fill_rate,
+                trials,
+                chunk_seed
+            )
+            for chunk, chunk_seed in zip(chunks, seeds)
+        ]
+        
+        workers = max(1, min(max_workers or settings.FORECAST_MAX_WORKERS, len(tasks)))
+        if workers == 1:
+            outputs = [_simulate_chunk(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                outputs = list(executor.map(_simulate_chunk, tasks))
+        
+        for chunk, output in zip(chunks, outputs):
+            for key, values in output.items():
+                results[key][chunk] = values
+        return results
+    
+    @staticmethod
+    def simulate_safety_stock(
+        db: Session,
+        product_ids: Optional[List[int]] = None,
+        category: Optional[str] = None,
+        fill_rate: float = 0.95,
+        history_months: int = 6,
+        lead_time_days: int = 7,
+        trials: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        以蒙特卡洛模拟计算产品的安全库存，不假设需求服从正态分布
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表，为空时计算所有活跃产品
+            category: 产品类别筛选
+            fill_rate: 目标满足率
+            history_months: 历史数据月数
+            lead_time_days: 没有到货记录的产品使用的提前期（天数）
+            trials: 每个产品的试验次数
+            max_workers: 最大进程数
+            seed: 随机种子
+            
+        Returns:
+            每个产品的再订货点、安全库存、模拟满足率及整体统计
+        """
+        started_at = time.perf_counter()
+        
+        query = db.query(Product.id, Product.sku, Product.name, Product.safety_stock)
+        if product_ids:
+            query = query.filter(Product.id.in_(product_ids))
+        else:
+            query = query.filter(Product.is_active == True)
+        if category:
+            query = query.filter(Product.category == category)
+        products = query.order_by(Product.id).all()
+        if not products:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="没有找到需要计算的产品"
+            )
+        
+        ids = [product.id for product in products]
+        matrix, observed = SafetyStockService._load_demand_matrix(db, ids, history_months)
+        lead_times = SafetyStockService._load_lead_times(db, ids, lead_time_days)
+        simulation = SafetyStockService.simulate_lead_time_demand(
+            matrix, observed, lead_times, fill_rate, trials, max_workers, seed
         )
         
+        items = []
+        for index, product in enumerate(products):
+            items.append({
+                "product_id": product.id,
+                "sku": product.sku,
+                "name": product.name,
+                "current_safety_stock": product.safety_stock,
+                "suggested_safety_stock": int(simulation['safety_stock'][index]),
+                "reorder_point": int(simulation['reorder_point'][index]),
+                "mean_lead_time_demand": round(float(simulation['mean_demand'][index]), 2),
+                "simulated_fill_rate": round(float(simulation['fill_rate'][index]), 4),
+                "cycle_service_level": round(float(simulation['cycle_service_level'][index]), 4),
+                "lead_time_samples": int(len(lead_times[index])),
+                "mean_lead_time_days": round(float(lead_times[index].mean()), 2)
+            })
+        
         return {
-            "product_id": product_id,
-            "current_safety_stock": current_safety_stock,
-            "suggested_safety_stock": suggested_safety_stock,
-            "change_percentage": change_percentage,
-            "confidence_level": confidence_level,
-            "reason": reason
+            "fill_rate": fill_rate,
+            "trials": trials or SafetyStockService.SIMULATION_TRIALS,
+            "total": len(items),
+            "items": items,
+            "elapsed_seconds": round(time.perf_counter() - started_at, 2)
         }
     
     @staticmethod
@@ -216,6 +491,7 @@ class SafetyStockService:
         history_months = int(params.get("historyPeriod", 6))
         lead_time_days = int(params.get("leadTime", 7))
         consider_seasonality = params.get("considerSeasonality", True)
+        method = params.get("method", "normal")
         
         # 查询活跃产品
         query = db.query(Product).filter(Product.is_active == True)
@@ -230,18 +506,19 @@ class SafetyStockService:
         # 获取分页产品
         products = query.offset(skip).limit(limit).all()
         
-        # 计算每个产品的安全库存
+        # 一次性计算本页所有产品的安全库存
+        calculations = SafetyStockService.calculate_safety_stock_batch(
+            db,
+            products,
+            service_level,
+            history_months,
+            lead_time_days,
+            consider_seasonality,
+            method
+        )
+        
         results = []
-        for product in products:
-            calculation = SafetyStockService.calculate_safety_stock(
-                db,
-                product.id,
-                service_level,
-                history_months,
-                lead_time_days,
-                consider_seasonality
-            )
-            
+        for product, calculation in zip(products, calculations):
             # 添加产品信息
             results.append({
                 "productId": product.id,
@@ -308,11 +585,14 @@ class SafetyStockService:
         history_months: int = 6,
         lead_time_days: int = 7,
         consider_seasonality: bool = True,
-        confidence_threshold: float = 0.7
+        confidence_threshold: float = 0.7,
+        dry_run: bool = False
     ) -> Dict[str, Any]:
         """
         自动更新所有产品的安全库存
         
+        产品按批计算，只读取计算需要的列；发生变化的行通过批量UPDATE写回，不加载ORM对象。
+        
         Args:
             db: 数据库会话
             service_level: 服务水平
@@ -320,46 +600,145 @@ class SafetyStockService:
             lead_time_days: 补货提前期（天数）
             consider_seasonality: 是否考虑季节性因素
             confidence_threshold: 置信度阈值，只更新高于此阈值的计算结果
+            dry_run: 为True时只返回将要变化的产品，不写入数据库
             
         Returns:
             更新结果统计
         """
-        # 查询所有活跃产品
-        products = db.query(Product).filter(Product.is_active == True).all()
+        # 查询所有活跃产品（仅计算需要的列）
+        products = db.query(
+            Product.id,
+            Product.sku,
+            Product.safety_stock,
+            Product.stock_quantity,
+            Product.needs_replenishment
+        ).filter(Product.is_active == True).order_by(Product.id).all()
         
         total_count = len(products)
         updated_count = 0
         skipped_count = 0
+        changes = []
         
-        for product in products:
-            # 计算安全库存
-            calculation = SafetyStockService.calculate_safety_stock(
+        for offset in range(0, total_count, SafetyStockService.AUTO_UPDATE_CHUNK_SIZE):
+            chunk = products[offset:offset + SafetyStockService.AUTO_UPDATE_CHUNK_SIZE]
+            calculations = SafetyStockService.calculate_safety_stock_batch(
                 db,
-                product.id,
+                chunk,
                 service_level,
                 history_months,
                 lead_time_days,
-                consider_seasonality
+                consider_seasonality,
+                persist=not dry_run
             )
             
-            # 只更新高置信度的结果
-            if calculation["confidence_level"] >= confidence_threshold:
-                product.safety_stock = calculation["suggested_safety_stock"]
+            for product, calculation in zip(chunk, calculations):
+                # 只更新高置信度的结果
+                if calculation["confidence_level"] < confidence_threshold:
+                    skipped_count += 1
+                    continue
+                updated_count += 1
                 
+                safety_stock = calculation["suggested_safety_stock"]
                 # 检查是否需要更新补货需求状态
-                if product.stock_quantity < product.safety_stock:
-                    product.needs_replenishment = True
-                
-                db.add(product)
-                updated_count += 1
-            else:
-                skipped_count += 1
-        
-        # 提交所有更改
-        db.commit()
-        
-        return {
+                current_needs_replenishment = bool(product.needs_replenishment)
+                needs_replenishment = current_needs_replenishment or (
+                    product.stock_quantity is not None and safety_stock is not None
+                    and product.stock_quantity < safety_stock
+                )
+                if safety_stock != product.safety_stock or needs_replenishment != current_needs_replenishment:
+                    changes.append({
+                        "product_id": product.id,
+                        "sku": product.sku,
+                        "old_safety_stock": product.safety_stock,
+                        "new_safety_stock": safety_stock,
+                        "old_needs_replenishment": current_needs_replenishment,
+                        "new_needs_replenishment": needs_replenishment
+                    })
+        
+        # 只写回发生变化的产品
+        if not dry_run:
+            ProductService.bulk_update_products(db, [
+                {
+                    "id": change["product_id"],
+                    "safety_stock": change["new_safety_stock"],
+                    "needs_replenishment": change["new_needs_replenishment"]
+                }
+                for change in changes
+            ])
+            db.commit()
+        
+        result = {
             "total_products": total_count,
             "updated_count": updated_count,
-            "skipped_count": skipped_count
-        }
\ No newline at end of file
+            "skipped_count": skipped_count,
+            "changed_count": len(changes),
+            "dry_run": dry_run
+        }
+        if dry_run:
+            result["changes"] = changes
+        return result
+
+
+
+def _simulate_chunk(task: Tuple) -> Dict[str, np.ndarray]:
+    """
+    模拟一批产品的提前期需求（定义在模块级别以便在子进程中执行）
+    
+    Args:
+        task: (销量矩阵, 首次销售位置, 提前期样本列表, 目标满足率, 试验次数, 随机种子)
+        
+    Returns:
+        本批产品的 reorder_point、mean_demand、safety_stock、fill_rate、cycle_service_level
+    """
+    matrix, first_sale, lead_times, fill_rate, trials, seed = task
+    rng = np.random.default_rng(seed)
+    n_products, n_days = matrix.shape
+    
+    # 为每个 (产品, 试验) 抽取提前期
+    lead_time_counts = np.array([len(samples) for samples in lead_times])
+    padded_lead_times = np.zeros((n_products, lead_time_counts.max()), dtype=np.int64)
+    for index, samples in enumerate(lead_times):
+        padded_lead_times[index, :len(samples)] = samples
+    picks = rng.integers(0, lead_time_counts[:, None], size=(n_products, trials))
+    sampled_lead_times = np.take_along_axis(padded_lead_times, picks, axis=1)
+    max_lead_time = max(int(sampled_lead_times.max()), 1)
+    
+    # 从首次销售以来的日期中有放回地抽取每日需求：(产品, 试验, 天)
+    observed_days = n_days - first_sale
+    # 用float32均匀数缩放后取整生成下标，比按行上限调用integers快且占用内存更少
+    uniform = rng.random((n_products, trials, max_lead_time), dtype=np.float32)
+    uniform *= observed_days.astype(np.float32)[:, None, None]
+    flat_index = uniform.astype(np.int32)
+    del uniform
+    np.minimum(flat_index, (observed_days - 1).astype(np.int32)[:, None, None], out=flat_index)
+    flat_index += (np.arange(n_products) * n_days + first_sale).astype(np.int32)[:, None, None]
+    daily_demand = matrix.ravel()[flat_index]
+    del flat_index
+    daily_demand *= np.arange(max_lead_time)[None, None, :] < sampled_lead_times[:, :, None]
+    lead_time_demand = np.sort(daily_demand.sum(axis=2, dtype=np.float64), axis=1)
+    
+    # 以每个试验值作为候选再订货点R，计算期望缺货量 E[(D - R)+]
+    mean_demand = lead_time_demand.mean(axis=1)
+    tail_sums = np.cumsum(lead_time_demand[:, ::-1], axis=1)[:, ::-1]
+    tail_sums = np.concatenate([tail_sums[:, 1:], np.zeros((n_products, 1))], axis=1)
+    tail_counts = trials - 1 - np.arange(trials)
+    expected_shortage = (tail_sums - tail_counts[None, :] * lead_time_demand) / trials
+    
+    # 期望缺货量随R单调不增，取第一个满足目标满足率的候选值
+    target_shortage = (1 - fill_rate) * mean_demand
+    position = np.argmax(expected_shortage <= target_shortage[:, None] + 1e-9, axis=1)
+    rows = np.arange(n_products)
+    reorder_point = lead_time_demand[rows, position]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        achieved_fill_rate = np.where(
+            mean_demand > 0, 1 - expected_shortage[rows, position] / mean_demand, 1.0
+        )
+    
+    return {
+        'reorder_point': np.ceil(reorder_point),
+        'mean_demand': mean_demand,
+        'safety_stock': np.ceil(np.maximum(reorder_point - mean_demand, 0)),
+        'fill_rate': achieved_fill_rate,
+        'cycle_service_level': (lead_time_demand <= reorder_point[:, None]).mean(axis=1)
+    }
@@ -1,19 +1,37 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Iterator
+from datetime import datetime, timedelta, date
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, tuple_
+
+from app.core.pagination import decode_cursor
 
 from app.models.sale import Sale
 from app.models.product import Product
+from app.models.sales_daily import SalesDaily
 from app.schemas.sale import SaleCreate, SaleUpdate
 from app.services.product_service import ProductService
+from app.services.seasonality_service import SeasonalityService
+from app.services.demand_statistics_service import DemandStatisticsService
+from app.services.sales_daily_service import SalesDailyService
+from app.services.event_bus import event_bus, STOCK_CHANGED
 
 class SaleService:
     """
     销售服务类：处理销售记录相关的业务逻辑
     """
     
+    EXPORT_BATCH_SIZE = 10000  # 导出时服务器端游标每次取回的行数
+    EXPORT_COLUMNS = ['sale_id', 'product_id', 'sku', 'sale_date', 'quantity', 'sale_amount']
+    EXPORT_COLUMN_TYPES = {
+        'sale_id': 'int64',
+        'product_id': 'int64',
+        'sku': 'string',
+        'sale_date': 'date32',
+        'quantity': 'int64',
+        'sale_amount': 'float64'
+    }
+    
     @staticmethod
     def get_sale_by_id(db: Session, sale_id: int) -> Optional[Sale]:
         """
@@ -35,18 +53,20 @@ class SaleService:
         limit: int = 100,
         product_id: Optional[int] = None,
         start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None
+        end_date: Optional[datetime] = None,
+        cursor: Optional[str] = None
     ) -> List[Sale]:
         """
-        获取销售记录列表
+        获取销售记录列表，按 (sale_date, id) 倒序
         
         Args:
             db: 数据库会话
-            skip: 跳过的记录数
+            skip: 跳过的记录数，提供cursor时忽略
             limit: 返回的最大记录数
             product_id: 产品ID筛选
             start_date: 开始日期筛选
             end_date: 结束日期筛选
+            cursor: 上一页的游标，从该位置之后继续读取
             
         Returns:
             销售记录对象列表
@@ -62,7 +82,68 @@ class SaleService:
         if end_date:
             query = query.filter(Sale.sale_date <= end_date)
         
-        return query.order_by(desc(Sale.sale_date)).offset(skip).limit(limit).all()
+        if cursor:
+            last_date, last_id = decode_cursor(cursor, 2, (date.fromisoformat, int))
+            query = query.filter(tuple_(Sale.sale_date, Sale.id) < tuple_(last_date, last_id))
+            skip = 0
+        
+        return query.order_by(desc(Sale.sale_date), desc(Sale.id)).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def iter_sales_export(
+        db: Session,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        product_id: Optional[int] = None,
+        category: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        按 (sale_date, id) 顺序逐行读取销售记录用于导出
+        
+        只查询导出需要的列，并通过服务器端游标（yield_per）分批取回，
+        内存占用与导出的日期范围无关。
+        
+        Args:
+            db: 数据库会话
+            start_date: 开始日期筛选
+            end_date: 结束日期筛选
+            product_id: 产品ID筛选
+            category: 产品类别筛选
+            
+        Returns:
+            包含EXPORT_COLUMNS各列的字典行迭代器
+        """
+        query = db.query(
+            Sale.id.label('sale_id'),
+            Sale.product_id,
+            Product.sku,
+            Sale.sale_date,
+            Sale.quantity,
+            Sale.sale_amount
+        ).join(
+            Product, Sale.product_id == Product.id
+        )
+        
+        if start_date:
+            query = query.filter(Sale.sale_date >= start_date)
+        
+        if end_date:
+            query = query.filter(Sale.sale_date <= end_date)
+        
+        if product_id:
+            query = query.filter(Sale.product_id == product_id)
+        
+        if category:
+            query = query.filter(Product.category == category)
+        
+        query = query.order_by(Sale.sale_date, Sale.id).yield_per(SaleService.EXPORT_BATCH_SIZE)
+        for row in query:
+            yield row._asdict()
+    
+    @staticmethod
+    def sale_cursor_key(sale: Sale) -> List[Any]:
+        """销售记录列表的分页排序键"""
+        return [_as_date(sale.sale_date).isoformat(), sale.id]
     
     @staticmethod
     def create_sale(db: Session, sale: SaleCreate) -> Sale:
@@ -114,6 +195,15 @@ class SaleService:
             'sale'
         )
         
+        # 补录历史日期的销售时，季节性档案需要重建
+        SeasonalityService.mark_for_rebuild(db, db_sale.product_id, db_sale.sale_date)
+        DemandStatisticsService.apply_sale_changes(
+            db, [(db_sale.product_id, db_sale.sale_date, db_sale.quantity)]
+        )
+        SalesDailyService.apply_sale_changes(
+            db, [(db_sale.product_id, db_sale.sale_date, db_sale.quantity, db_sale.sale_amount, 1)]
+        )
+        
         # 保存销售记录
         db.add(db_sale)
         db.commit()
@@ -121,6 +211,127 @@ class SaleService:
         
         return db_sale
     
+    @staticmethod
+    def create_sales_bulk(db: Session, lines: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量创建销售记录，整批在一个事务中完成
+        
+        SKU用一次IN查询解析并锁定产品行，销售记录以多行INSERT写入，
+        每个产品的库存、销售额、销量和利润率按汇总后的变化量用一条UPDATE语句配合executemany更新。
+        无效的明细（SKU不存在、产品已停用）会被拒绝；某个产品的汇总销量超过库存时，该产品的所有明细都被拒绝。
+        
+        Args:
+            db: 数据库会话
+            lines: 销售明细列表，每项包含 sku、quantity 和可选的 sale_date、sale_amount、customer_info
+            
+        Returns:
+            包含写入数量和被拒绝明细的字典
+        """
+        skus = {line['sku'] for line in lines}
+        products = {
+            product.sku: product
+            for product in db.query(
+                Product.id, Product.sku, Product.price, Product.cost, Product.is_active,
+                Product.stock_quantity, Product.safety_stock, Product.sales_amount, Product.sales_quantity
+            ).filter(Product.sku.in_(skus)).order_by(Product.id).with_for_update().all()
+        }
+        
+        today = datetime.now().date()
+        rejected = []
+        accepted: Dict[int, List[Dict[str, Any]]] = {}
+        for index, line in enumerate(lines):
+            product = products.get(line['sku'])
+            if product is None:
+                rejected.append({"index": index, "sku": line['sku'], "error": "产品不存在"})
+                continue
+            if not product.is_active:
+                rejected.append({"index": index, "sku": line['sku'], "error": "产品已停用"})
+                continue
+            sale_amount = line.get('sale_amount')
+            accepted.setdefault(product.id, []).append({
+                'index': index,
+                'product_id': product.id,
+                'quantity': line['quantity'],
+                'sale_date': line.get('sale_date') or today,
+                'sale_amount': sale_amount if sale_amount is not None else line['quantity'] * product.price,
+                'customer_info': line.get('customer_info')
+            })
+        
+        # 按产品汇总变化量，汇总销量超过库存的产品整体拒绝
+        product_by_id = {product.id: product for product in products.values()}
+        sale_rows = []
+        product_rows = []
+        stock_changes = []
+        now = datetime.now()
+        for product_id, product_lines in accepted.items():
+            product = product_by_id[product_id]
+            quantity = sum(row['quantity'] for row in product_lines)
+            if (product.stock_quantity or 0) < quantity:
+                rejected.extend(
+                    {"index": row['index'], "sku": product.sku, "error": "库存不足"}
+                    for row in product_lines
+                )
+                continue
+            
+            new_quantity = product.stock_quantity - quantity
+            sales_amount = (product.sales_amount or 0) + sum(row['sale_amount'] for row in product_lines)
+            sales_quantity = (product.sales_quantity or 0) + quantity
+            profit_margin = (sales_amount - sales_quantity * product.cost) / sales_amount if sales_amount > 0 else 0
+            needs_replenishment = new_quantity <= (product.safety_stock or 0)
+            product_rows.append({
+                'id': product_id,
+                'stock_quantity': new_quantity,
+                'sales_amount': sales_amount,
+                'sales_quantity': sales_quantity,
+                'profit_margin': profit_margin,
+                'needs_replenishment': needs_replenishment,
+                'last_sale_date': now
+            })
+            stock_changes.append({
+                'product_id': product_id,
+                'old_quantity': product.stock_quantity,
+                'new_quantity': new_quantity,
+                'safety_stock': product.safety_stock,
+                'needs_replenishment': needs_replenishment
+            })
+            sale_rows.extend(
+                {key: row[key] for key in ('product_id', 'quantity', 'sale_date', 'sale_amount', 'customer_info')}
+                for row in product_lines
+            )
+        
+        if sale_rows:
+            # 需求统计读取每日汇总中的原销量，必须在汇总和销售记录写入之前更新
+            earliest_dates: Dict[int, Any] = {}
+            for row in sale_rows:
+                product_id = row['product_id']
+                if product_id not in earliest_dates or row['sale_date'] < earliest_dates[product_id]:
+                    earliest_dates[product_id] = row['sale_date']
+            SeasonalityService.mark_many_for_rebuild(db, earliest_dates)
+            DemandStatisticsService.apply_sale_changes(
+                db, [(row['product_id'], row['sale_date'], row['quantity']) for row in sale_rows]
+            )
+            SalesDailyService.apply_sale_changes(
+                db, [
+                    (row['product_id'], row['sale_date'], row['quantity'], row['sale_amount'], 1)
+                    for row in sale_rows
+                ]
+            )
+            
+            db.execute(Sale.__table__.insert(), sale_rows)
+            ProductService.bulk_update_products(db, product_rows)
+            db.commit()
+            
+            for change in stock_changes:
+                event_bus.publish(STOCK_CHANGED, operation_type='sale', **change)
+        
+        rejected.sort(key=lambda item: item['index'])
+        return {
+            "total": len(lines),
+            "inserted_count": len(sale_rows),
+            "rejected_count": len(rejected),
+            "rejected": rejected
+        }
+    
     @staticmethod
     def update_sale(
         db: Session,
@@ -149,6 +360,9 @@ class SaleService:
                 detail="销售记录不存在"
             )
         
+        # 原记录所在的季节性档案需要重建
+        SeasonalityService.mark_for_rebuild(db, db_sale.product_id, db_sale.sale_date)
+        
         # 如果要更新产品或数量，需要处理库存变化
         if sale_update.product_id or sale_update.quantity:
             # 获取当前产品
@@ -221,11 +435,33 @@ class SaleService:
                 sale_amount = new_quantity * db_product.selling_price
                 sale_update.sale_amount = sale_amount
         
+        # 更新需求统计：原记录的销量移出，新的产品、日期和销量计入
+        DemandStatisticsService.apply_sale_changes(db, [
+            (db_sale.product_id, db_sale.sale_date, -db_sale.quantity),
+            (
+                sale_update.product_id or db_sale.product_id,
+                sale_update.sale_date or db_sale.sale_date,
+                sale_update.quantity or db_sale.quantity
+            )
+        ])
+        SalesDailyService.apply_sale_changes(db, [
+            (db_sale.product_id, db_sale.sale_date, -db_sale.quantity, -(db_sale.sale_amount or 0), -1),
+            (
+                sale_update.product_id or db_sale.product_id,
+                sale_update.sale_date or db_sale.sale_date,
+                sale_update.quantity or db_sale.quantity,
+                sale_update.sale_amount if sale_update.sale_amount is not None else db_sale.sale_amount,
+                1
+            )
+        ])
+        
         # 更新销售记录
         update_data = sale_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_sale, field, value)
         
+        SeasonalityService.mark_for_rebuild(db, db_sale.product_id, db_sale.sale_date)
+        
         db.commit()
         db.refresh(db_sale)
         
@@ -262,6 +498,14 @@ class SaleService:
             'sale_delete'
         )
         
+        SeasonalityService.mark_for_rebuild(db, db_sale.product_id, db_sale.sale_date)
+        DemandStatisticsService.apply_sale_changes(
+            db, [(db_sale.product_id, db_sale.sale_date, -db_sale.quantity)]
+        )
+        SalesDailyService.apply_sale_changes(
+            db, [(db_sale.product_id, db_sale.sale_date, -db_sale.quantity, -(db_sale.sale_amount or 0), -1)]
+        )
+        
         # 删除销售记录
         db.delete(db_sale)
         db.commit()
@@ -295,20 +539,20 @@ class SaleService:
         
         # 根据分组方式设置日期格式
         date_format = {
-            "day": func.date_trunc('day', Sale.sale_date),
-            "week": func.date_trunc('week', Sale.sale_date),
-            "month": func.date_trunc('month', Sale.sale_date)
-        }.get(group_by, func.date_trunc('day', Sale.sale_date))
+            "day": func.date_trunc('day', SalesDaily.sale_date),
+            "week": func.date_trunc('week', SalesDaily.sale_date),
+            "month": func.date_trunc('month', SalesDaily.sale_date)
+        }.get(group_by, func.date_trunc('day', SalesDaily.sale_date))
         
-        # 查询销售数据
+        # 从每日汇总查询销售数据
         sales_data = db.query(
             date_format.label("date"),
-            func.sum(Sale.sale_amount).label("total_amount"),
-            func.sum(Sale.quantity).label("total_quantity"),
-            func.count(Sale.id).label("transaction_count")
+            func.sum(SalesDaily.amount).label("total_amount"),
+            func.sum(SalesDaily.quantity).label("total_quantity"),
+            func.sum(SalesDaily.transaction_count).label("transaction_count")
         ).filter(
-            Sale.sale_date >= start_date,
-            Sale.sale_date <= end_date
+            SalesDaily.sale_date >= start_date,
+            SalesDaily.sale_date <= end_date
         ).group_by(
             "date"
         ).order_by(
@@ -352,22 +596,22 @@ class SaleService:
         if not end_date:
             end_date = datetime.now()
         
-        # 查询热销产品数据
+        # 从每日汇总查询热销产品数据
         top_products = db.query(
-            Sale.product_id,
+            SalesDaily.product_id,
             Product.name,
             Product.sku,
             Product.category,
-            func.sum(Sale.quantity).label("total_quantity"),
-            func.sum(Sale.sale_amount).label("total_amount"),
-            func.count(Sale.id).label("sale_count")
+            func.sum(SalesDaily.quantity).label("total_quantity"),
+            func.sum(SalesDaily.amount).label("total_amount"),
+            func.sum(SalesDaily.transaction_count).label("sale_count")
         ).join(
-            Product, Sale.product_id == Product.id
+            Product, SalesDaily.product_id == Product.id
         ).filter(
-            Sale.sale_date >= start_date,
-            Sale.sale_date <= end_date
+            SalesDaily.sale_date >= start_date,
+            SalesDaily.sale_date <= end_date
         ).group_by(
-            Sale.product_id,
+            SalesDaily.product_id,
             Product.name,
             Product.sku,
             Product.category
@@ -388,4 +632,8 @@ class SaleService:
                 "sale_count": int(product.sale_count)
             })
         
-        return result
\ No newline at end of file
+        return result
+
+
+def _as_date(value: Any) -> date:
+    return value.date() if isinstance(value, datetime) else value
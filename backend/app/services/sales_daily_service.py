@@ -0,0 +1,118 @@
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import date, datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.db.upsert import insert_on_conflict
+from app.models.sale import Sale
+from app.models.sales_daily import SalesDaily
+
+
+class SalesDailyService:
+    """
+    每日销售汇总服务：维护 (产品, 日期) 粒度的销量、销售额和记录数
+    
+    销售分析、热销排行、安全库存和预测模型都从汇总表读取，查询成本只与天数 × 产品数有关，
+    不再随销售记录条数增长。
+    """
+    
+    @staticmethod
+    def apply_sale_changes(db: Session, changes: List[Tuple[int, Any, float, float, int]]):
+        """
+        将销售记录的变动累加到每日汇总（不提交事务）
+        
+        同一产品同一天的变动先合并，以一条 INSERT ... ON CONFLICT DO UPDATE 语句配合executemany
+        写入：新的日期插入汇总行，已有的汇总行累加变化量，之后删除记录数归零的汇总行。
+        
+        Args:
+            db: 数据库会话
+            changes: (产品ID, 销售日期, 销量变化, 销售额变化, 记录数变化) 列表
+        """
+        deltas: Dict[Tuple[int, date], List[float]] = {}
+        for product_id, sale_date, quantity, amount, count in changes:
+            key = (product_id, _as_date(sale_date))
+            delta = deltas.setdefault(key, [0, 0.0, 0])
+            delta[0] += quantity
+            delta[1] += amount or 0.0
+            delta[2] += count
+        deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return
+        
+        rows = [
+            {
+                'product_id': product_id,
+                'sale_date': sale_date,
+                'quantity': delta[0],
+                'amount': delta[1],
+                'transaction_count': delta[2]
+            }
+            for (product_id, sale_date), delta in sorted(deltas.items())
+        ]
+        
+        # 已有的汇总行在冲突时原子累加，并发写入同一产品同一天的首条记录不会违反唯一约束
+        table = SalesDaily.__table__
+        statement = insert_on_conflict(db, table)
+        statement = statement.on_conflict_do_update(
+            index_elements=['product_id', 'sale_date'],
+            set_={
+                'quantity': table.c.quantity + statement.excluded.quantity,
+                'amount': table.c.amount + statement.excluded.amount,
+                'transaction_count': table.c.transaction_count + statement.excluded.transaction_count,
+                'updated_at': func.now()
+            }
+        )
+        db.execute(statement, rows)
+        db.execute(
+            table.delete().where(
+                table.c.product_id.in_({row['product_id'] for row in rows}),
+                table.c.sale_date.in_({row['sale_date'] for row in rows}),
+                table.c.transaction_count <= 0
+            )
+        )
+    
+    @staticmethod
+    def rebuild(db: Session, product_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        从销售记录完整重建每日汇总
+        
+        先删除范围内的汇总行，再以一条 INSERT ... SELECT 在数据库中分组写入。
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表，为空时重建所有产品
+        
+        Returns:
+            包含写入汇总行数的字典
+        """
+        table = SalesDaily.__table__
+        delete = table.delete()
+        daily = select([
+            Sale.product_id,
+            Sale.sale_date,
+            func.sum(Sale.quantity),
+            func.coalesce(func.sum(Sale.sale_amount), 0.0),
+            func.count(Sale.id)
+        ]).where(
+            Sale.product_id.isnot(None)
+        ).group_by(Sale.product_id, Sale.sale_date)
+        if product_ids is not None:
+            delete = delete.where(table.c.product_id.in_(product_ids))
+            daily = daily.where(Sale.product_id.in_(product_ids))
+        
+        db.execute(delete)
+        db.execute(table.insert().from_select(
+            ['product_id', 'sale_date', 'quantity', 'amount', 'transaction_count'],
+            daily
+        ))
+        db.commit()
+        
+        rows_query = db.query(func.count(SalesDaily.id))
+        if product_ids is not None:
+            rows_query = rows_query.filter(SalesDaily.product_id.in_(product_ids))
+        return {'rebuilt_rows': rows_query.scalar()}
+
+
+def _as_date(value: Any) -> date:
+    return value.date() if isinstance(value, datetime) else value
@@ -0,0 +1,345 @@
+from typing import Dict, List, Any, Optional
+from datetime import date
+import re
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from app.core.config import settings
+from app.models.sale import Sale
+
+
+class SalesPartitionService:
+    """
+    销售表分区服务：把sales表按sale_date按月做范围分区，并维护分区的创建和归档
+    
+    分区后按日期范围查询只扫描相关月份的分区，每个分区都带有父表上定义的复合索引。
+    超出所有月份分区的记录写入默认分区，创建对应月份的分区时再移入。
+    迁移、创建和归档分区都在事务级advisory锁下进行，多个进程（如多个worker启动时）同时维护不会冲突。
+    仅支持PostgreSQL。
+    """
+    
+    TABLE_NAME = "sales"
+    LEGACY_TABLE_NAME = "sales_unpartitioned"
+    DEFAULT_PARTITION = "sales_default"
+    PARTITION_PATTERN = re.compile(r"^sales_p(\d{4})_(\d{2})$")
+    LOCK_NAME = "sales_partitions"  # 分区维护的advisory锁名称
+    
+    @staticmethod
+    def is_partitioned(db: Session) -> bool:
+        """
+        sales表是否已经是分区表
+        
+        Args:
+            db: 数据库会话
+        
+        Returns:
+            非PostgreSQL数据库始终返回False
+        """
+        if db.bind.dialect.name != "postgresql":
+            return False
+        return bool(db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table_name))"
+        ), {"table_name": SalesPartitionService.TABLE_NAME}).scalar())
+    
+    @staticmethod
+    def migrate_to_partitioned(db: Session, months_ahead: Optional[int] = None) -> Dict[str, Any]:
+        """
+        把现有的sales表迁移为按月分区的表，整个迁移在一个事务中完成
+        
+        原表改名后以相同的列和默认值（沿用原ID序列）创建分区父表，主键改为 (id, sale_date)，
+        父表上建立模型中定义的索引，按历史数据的月份范围创建分区后整表复制，最后删除原表。
+        迁移期间sales表被排他锁定。
+        
+        Args:
+            db: 数据库会话
+            months_ahead: 预先创建的未来月份数，默认使用配置
+        
+        Returns:
+            包含是否迁移、复制的行数和创建的分区的字典
+        
+        Raises:
+            HTTPException: 数据库不是PostgreSQL
+        """
+        SalesPartitionService._check_dialect(db)
+        if SalesPartitionService.is_partitioned(db):
+            return {"migrated": False, "copied_rows": 0, "created_partitions": []}
+        
+        table = SalesPartitionService.TABLE_NAME
+        legacy = SalesPartitionService.LEGACY_TABLE_NAME
+        try:
+            # 取得锁后再次检查，其他进程可能已经完成迁移
+            SalesPartitionService._lock(db)
+            if SalesPartitionService.is_partitioned(db):
+                db.rollback()
+                return {"migrated": False, "copied_rows": 0, "created_partitions": []}
+            db.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+            db.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+            db.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey"))
+            # 原表的索引名与新父表的索引冲突，数据复制完后原表会被删除
+            index_names = db.execute(text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = :table_name AND indexname <> :pkey"
+            ), {"table_name": legacy, "pkey": f"{legacy}_pkey"}).scalars().all()
+            for index_name in index_names:
+                db.execute(text(f'DROP INDEX "{index_name}"'))
+            
+            db.execute(text(
+                f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                f"PARTITION BY RANGE (sale_date)"
+            ))
+            db.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, sale_date)"))
+            db.execute(text(
+                f"ALTER TABLE {table} ADD CONSTRAINT {table}_product_id_fkey "
+                f"FOREIGN KEY (product_id) REFERENCES products (id)"
+            ))
+            for index in Sale.__table__.indexes:
+                db.execute(CreateIndex(index))
+            
+            first_date = db.execute(text(f"SELECT MIN(sale_date) FROM {legacy}")).scalar()
+            created = SalesPartitionService._create_partitions(db, first_date or date.today(), months_ahead)
+            
+            copied_rows = db.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}")).rowcount
+            db.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id"))
+            db.execute(text(f"DROP TABLE {legacy}"))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        return {"migrated": True, "copied_rows": copied_rows, "created_partitions": created}
+    
+    @staticmethod
+    def ensure_partitions(db: Session, months_ahead: Optional[int] = None) -> Dict[str, Any]:
+        """
+        创建当前月份到未来若干月份中缺少的分区
+        
+        Args:
+            db: 数据库会话
+            months_ahead: 预先创建的未来月份数，默认使用配置
+        
+        Returns:
+            包含新建分区名称的字典
+        
+        Raises:
+            HTTPException: 数据库不是PostgreSQL或sales表尚未分区
+        """
+        SalesPartitionService._check_partitioned(db)
+        try:
+            created = SalesPartitionService._create_partitions(db, date.today(), months_ahead)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return {"created_partitions": created}
+    
+    @staticmethod
+    def archive_partitions(
+        db: Session,
+        retention_months: Optional[int] = None,
+        drop: bool = False
+    ) -> Dict[str, Any]:
+        """
+        分离早于保留期的月份分区，移入归档schema或直接删除
+        
+        分离后的数据不再出现在sales表的查询中；每日销售汇总中的历史不受影响，
+        但之后从销售记录重建汇总时不会再包含这些月份。
+        
+        Args:
+            db: 数据库会话
+            retention_months: 保留的月份数（含当前月），默认使用配置
+            drop: 为真时删除分离的分区，否则移入配置的归档schema
+        
+        Returns:
+            包含归档的分区和归档位置的字典
+        
+        Raises:
+            HTTPException: 数据库不是PostgreSQL或sales表尚未分区
+        """
+        SalesPartitionService._check_partitioned(db)
+        if retention_months is None:
+            retention_months = settings.SALES_PARTITION_RETENTION_MONTHS
+        cutoff = _add_months(_month_start(date.today()), -(retention_months - 1))
+        
+        archived = [
+            partition["name"]
+            for partition in SalesPartitionService.list_partitions(db)["partitions"]
+            if partition["month"] is not None and _add_months(partition["month"], 1) <= cutoff
+        ]
+        schema = settings.SALES_ARCHIVE_SCHEMA
+        if not archived:
+            return {"archived_partitions": [], "archive_schema": None if drop else schema, "dropped": drop}
+        try:
+            SalesPartitionService._lock(db)
+            # 取得锁后只处理仍然挂在sales表上的分区
+            attached = {partition["name"] for partition in SalesPartitionService.list_partitions(db)["partitions"]}
+            archived = [name for name in archived if name in attached]
+            if archived and not drop:
+                db.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema}"'))
+            for name in archived:
+                db.execute(text(f"ALTER TABLE {SalesPartitionService.TABLE_NAME} DETACH PARTITION {name}"))
+                if drop:
+                    db.execute(text(f"DROP TABLE {name}"))
+                else:
+                    db.execute(text(f'ALTER TABLE {name} SET SCHEMA "{schema}"'))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        return {
+            "archived_partitions": archived,
+            "archive_schema": None if drop else schema,
+            "dropped": drop
+        }
+    
+    @staticmethod
+    def list_partitions(db: Session) -> Dict[str, Any]:
+        """
+        列出sales表的分区及其范围和估计行数
+        
+        Args:
+            db: 数据库会话
+        
+        Returns:
+            包含是否已分区和分区列表的字典，月份分区按月份升序，默认分区在最后
+        """
+        if not SalesPartitionService.is_partitioned(db):
+            return {"partitioned": False, "partitions": []}
+        
+        rows = db.execute(text(
+            "SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound, "
+            "c.reltuples AS estimated_rows "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table_name) ORDER BY c.relname"
+        ), {"table_name": SalesPartitionService.TABLE_NAME}).all()
+        
+        partitions = []
+        for row in rows:
+            match = SalesPartitionService.PARTITION_PATTERN.match(row.name)
+            partitions.append({
+                "name": row.name,
+                "month": date(int(match.group(1)), int(match.group(2)), 1) if match else None,
+                "bound": row.bound,
+                # reltuples在从未ANALYZE的表上为-1（PostgreSQL 14+）或0
+                "estimated_rows": max(int(row.estimated_rows), 0)
+            })
+        partitions.sort(key=lambda partition: (partition["month"] is None, partition["month"] or date.min))
+        
+        return {"partitioned": True, "partitions": partitions}
+    
+    @staticmethod
+    def _create_partitions(db: Session, first_date: date, months_ahead: Optional[int]) -> List[str]:
+        """
+        创建从first_date所在月份到未来months_ahead个月中缺少的分区以及默认分区（不提交事务）
+        
+        没有缺少的分区时只读取系统表，不加任何锁；否则先取得advisory锁，
+        再重新检查已有分区，并发的维护进程不会重复创建。
+        """
+        if months_ahead is None:
+            months_ahead = settings.SALES_PARTITION_MONTHS_AHEAD
+        table = SalesPartitionService.TABLE_NAME
+        default = SalesPartitionService.DEFAULT_PARTITION
+        
+        months = []
+        month = _month_start(first_date)
+        last_month = _add_months(_month_start(date.today()), months_ahead)
+        while month <= last_month:
+            months.append(month)
+            month = _add_months(month, 1)
+        
+        existing = SalesPartitionService._existing_partitions(db)
+        if default in existing and all(_partition_name(month) in existing for month in months):
+            return []
+        
+        SalesPartitionService._lock(db)
+        existing = SalesPartitionService._existing_partitions(db)
+        
+        created = []
+        if default not in existing:
+            db.execute(text(f"CREATE TABLE IF NOT EXISTS {default} PARTITION OF {table} DEFAULT"))
+            created.append(default)
+        
+        for month in months:
+            name = _partition_name(month)
+            if name not in existing:
+                SalesPartitionService._create_partition(db, name, month, _add_months(month, 1))
+                created.append(name)
+        
+        return created
+    
+    @staticmethod
+    def _existing_partitions(db: Session) -> set:
+        """sales表当前挂载的分区名称"""
+        return set(db.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table_name)"
+        ), {"table_name": SalesPartitionService.TABLE_NAME}).scalars().all())
+    
+    @staticmethod
+    def _lock(db: Session):
+        """取得分区维护的事务级advisory锁，事务提交或回滚时释放"""
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext(:lock_name))"),
+            {"lock_name": SalesPartitionService.LOCK_NAME}
+        )
+    
+    @staticmethod
+    def _create_partition(db: Session, name: str, start: date, end: date):
+        """创建一个月份分区，默认分区中属于该月份的记录先移出，建好分区后再写回"""
+        table = SalesPartitionService.TABLE_NAME
+        default = SalesPartitionService.DEFAULT_PARTITION
+        bounds = {"start": start, "end": end}
+        
+        # 默认分区中有该范围的记录时，PostgreSQL不允许直接创建分区
+        has_rows = db.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {default} WHERE sale_date >= :start AND sale_date < :end)"
+        ), bounds).scalar()
+        if has_rows:
+            db.execute(text(f"CREATE TEMPORARY TABLE sales_partition_moving (LIKE {table}) ON COMMIT DROP"))
+            db.execute(text(
+                f"WITH moved AS (DELETE FROM {default} WHERE sale_date >= :start AND sale_date < :end RETURNING *) "
+                f"INSERT INTO sales_partition_moving SELECT * FROM moved"
+            ), bounds)
+        
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        
+        if has_rows:
+            db.execute(text(f"INSERT INTO {table} SELECT * FROM sales_partition_moving"))
+            db.execute(text("DROP TABLE sales_partition_moving"))
+    
+    @staticmethod
+    def _check_dialect(db: Session):
+        """分区管理只支持PostgreSQL"""
+        if db.bind.dialect.name != "postgresql":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="销售表分区仅支持PostgreSQL"
+            )
+    
+    @staticmethod
+    def _check_partitioned(db: Session):
+        """确认sales表已经迁移为分区表"""
+        SalesPartitionService._check_dialect(db)
+        if not SalesPartitionService.is_partitioned(db):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="销售表尚未分区，请先运行 python -m app.jobs.maintain_sales_partitions --migrate"
+            )
+
+
+def _month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f"sales_p{month.year:04d}_{month.month:02d}"
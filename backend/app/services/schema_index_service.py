@@ -0,0 +1,133 @@
+from typing import Dict, List, Any
+
+from fastapi import HTTPException, status
+from sqlalchemy import text, Index
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.db.session import Base
+
+
+class SchemaIndexService:
+    """
+    索引维护服务：在已有的表上补建模型中定义、数据库中还不存在的索引
+    
+    应用不自动建表，模型中后来新增的索引（如sales、replenishments上用于键集分页的复合索引）
+    不会出现在已部署的数据库中。索引以 CREATE INDEX CONCURRENTLY 在线创建，不阻塞读写；
+    分区表的父表不支持CONCURRENTLY，先在父表上创建 ON ONLY 索引，再在各分区上并发创建后挂载。
+    整个过程在会话级advisory锁下进行，多个进程同时运行不会重复创建。
+    仅支持PostgreSQL。
+    """
+    
+    LOCK_NAME = "schema_indexes"  # 索引维护的advisory锁名称
+    
+    @staticmethod
+    def ensure_indexes(db: Session) -> Dict[str, Any]:
+        """
+        为已存在的表创建缺少的模型索引
+        
+        CONCURRENTLY不能在事务中执行，使用单独的自动提交连接。上次中断留下的无效索引先删除再重建。
+        
+        Args:
+            db: 数据库会话
+        
+        Returns:
+            包含新建索引名称的字典
+        
+        Raises:
+            HTTPException: 数据库不是PostgreSQL
+        """
+        if db.bind.dialect.name != "postgresql":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="索引维护仅支持PostgreSQL"
+            )
+        
+        created = []
+        with db.bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(
+                text("SELECT pg_advisory_lock(hashtext(:lock_name))"),
+                {"lock_name": SchemaIndexService.LOCK_NAME}
+            )
+            try:
+                for table in Base.metadata.sorted_tables:
+                    if connection.execute(text("SELECT to_regclass(:name)"), {"name": table.name}).scalar() is None:
+                        continue
+                    partitions = SchemaIndexService._partitions(connection, table.name)
+                    for index in sorted(table.indexes, key=lambda index: index.name):
+                        if partitions is None:
+                            created.extend(SchemaIndexService._create_index(connection, index, table.name, index.name))
+                        else:
+                            created.extend(SchemaIndexService._create_partitioned_index(connection, index, partitions))
+            finally:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(hashtext(:lock_name))"),
+                    {"lock_name": SchemaIndexService.LOCK_NAME}
+                )
+        
+        return {"created_indexes": created}
+    
+    @staticmethod
+    def _partitions(connection: Connection, table_name: str):
+        """分区表返回当前挂载的分区名称列表，普通表返回None"""
+        partitioned = connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))"
+        ), {"name": table_name}).scalar()
+        if not partitioned:
+            return None
+        return connection.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:name) ORDER BY c.relname"
+        ), {"name": table_name}).scalars().all()
+    
+    @staticmethod
+    def _create_index(connection: Connection, index: Index, table_name: str, index_name: str) -> List[str]:
+        """在普通表（或单个分区）上并发创建索引，已存在且有效时跳过"""
+        valid = connection.execute(text(
+            "SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(:name)"
+        ), {"name": index_name}).scalar()
+        if valid:
+            return []
+        if valid is not None:
+            # 并发创建中途失败会留下无效索引，IF NOT EXISTS会跳过它
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+        connection.execute(text(
+            f'CREATE {"UNIQUE " if index.unique else ""}INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" '
+            f'ON "{table_name}" ({SchemaIndexService._columns(index)})'
+        ))
+        return [index_name]
+    
+    @staticmethod
+    def _create_partitioned_index(connection: Connection, index: Index, partitions: List[str]) -> List[str]:
+        """
+        在分区表上创建索引：父表上的 ON ONLY 索引只登记定义，各分区上并发创建后挂载，
+        所有分区都挂载后父表索引自动变为有效
+        """
+        exists = connection.execute(text("SELECT to_regclass(:name)"), {"name": index.name}).scalar()
+        if exists is not None:
+            # 已挂载索引的分区
+            attached = set(connection.execute(text(
+                "SELECT t.relname FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid "
+                "JOIN pg_class t ON t.oid = x.indrelid WHERE i.inhparent = to_regclass(:name)"
+            ), {"name": index.name}).scalars().all())
+            if attached.issuperset(partitions):
+                return []
+        else:
+            connection.execute(text(
+                f'CREATE {"UNIQUE " if index.unique else ""}INDEX IF NOT EXISTS "{index.name}" '
+                f'ON ONLY "{index.table.name}" ({SchemaIndexService._columns(index)})'
+            ))
+            attached = set()
+        
+        created = [index.name]
+        for partition in partitions:
+            if partition in attached:
+                continue
+            partition_index = f"{partition}_{index.name}"
+            created.extend(SchemaIndexService._create_index(connection, index, partition, partition_index))
+            connection.execute(text(f'ALTER INDEX "{index.name}" ATTACH PARTITION "{partition_index}"'))
+        return created
+    
+    @staticmethod
+    def _columns(index: Index) -> str:
+        return ", ".join(f'"{column.name}"' for column in index.columns)
@@ -0,0 +1,416 @@
+from typing import Dict, List, Any, Optional, Tuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, status
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Session
+
+from app.models.product import Product
+from app.models.seasonality_profile import SeasonalityProfile
+from app.services.forecast_service import ForecastService
+
+
+class SeasonalityService:
+    """
+    季节性服务：维护每个产品的季节性档案（周/月季节指数、周自相关和高峰月份）
+    
+    档案保存累计统计量，新的销售日期到来时只把新增天数累加进去，
+    安全库存计算和销售模式分析直接读取档案而不再逐个产品重新检测。
+    """
+    
+    HISTORY_DAYS = 730  # 完整重建档案时使用的历史天数
+    AUTOCORRELATION_THRESHOLD = 0.3  # 周自相关超过该值视为有周季节性
+    MIN_SEASONALITY_DAYS = 14  # 判断季节性所需的最少天数
+    PEAK_INDEX_THRESHOLD = 1.2  # 月季节指数达到该值视为高峰月份
+    PEAK_SEASON_FACTOR = 1.2  # 高峰月份安全库存的上调系数
+    PAIR_LAG = 7
+    
+    @staticmethod
+    def refresh_profiles(
+        db: Session,
+        product_ids: Optional[List[int]] = None,
+        rebuild: bool = False
+    ) -> Dict[str, Any]:
+        """
+        更新产品的季节性档案，档案覆盖到昨天为止的完整日期
+        
+        没有档案、被标记为需要重建或指定rebuild的产品从历史数据完整重建；
+        其他产品只累加上次更新之后的新日期。
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表，为空时处理所有活跃产品
+            rebuild: 是否强制完整重建
+        
+        Returns:
+            重建和增量更新的产品数
+        """
+        if product_ids is None:
+            product_ids = [row.id for row in db.query(Product.id).filter(Product.is_active == True).all()]
+        if not product_ids:
+            return {'rebuilt_count': 0, 'updated_count': 0, 'unchanged_count': 0}
+        
+        rows, existing_ids, rebuilt_count, updated_count = SeasonalityService._compute_profiles(
+            db, product_ids, rebuild
+        )
+        SeasonalityService._save_profiles(db, rows, existing_ids)
+        db.commit()
+        
+        return {
+            'rebuilt_count': rebuilt_count,
+            'updated_count': updated_count,
+            'unchanged_count': len(product_ids) - rebuilt_count - updated_count
+        }
+    
+    @staticmethod
+    def get_profiles(
+        db: Session,
+        product_ids: List[int],
+        refresh: bool = False
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        批量读取产品的季节性档案
+        
+        缺失或过期的档案默认只在内存中计算后返回，不写入数据库；
+        档案的持久化由定时任务和刷新接口负责。
+        
+        Args:
+            db: 数据库会话
+            product_ids: 产品ID列表
+            refresh: 是否先补齐缺失或过期的档案并写入数据库（会提交事务）
+        
+        Returns:
+            产品ID到档案字典的映射，is_peak_season按当前月份计算
+        """
+        if refresh:
+            SeasonalityService.refresh_profiles(db, product_ids)
+            computed = {}
+        else:
+            rows = SeasonalityService._compute_profiles(db, product_ids)[0]
+            computed = {
+                row['product_id']: SeasonalityService._format_profile(SeasonalityProfile(**row))
+                for row in rows
+            }
+        
+        stored_ids = [product_id for product_id in product_ids if product_id not in computed]
+        profiles = db.query(SeasonalityProfile).filter(
+            SeasonalityProfile.product_id.in_(stored_ids)
+        ).all() if stored_ids else []
+        computed.update(
+            (profile.product_id, SeasonalityService._format_profile(profile)) for profile in profiles
+        )
+        return computed
+    
+    @staticmethod
+    def get_profile(db: Session, product_id: int) -> Dict[str, Any]:
+        """
+        读取单个产品的季节性档案
+        
+        Args:
+            db: 数据库会话
+            product_id: 产品ID
+        
+        Returns:
+            档案字典
+        """
+        product = db.query(Product.id).filter(Product.id == product_id).first()
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"未找到ID为 {product_id} 的产品"
+            )
+        return SeasonalityService.get_profiles(db, [product_id])[product_id]
+    
+    @staticmethod
+    def _compute_profiles(
+        db: Session,
+        product_ids: List[int],
+        rebuild: bool = False
+    ) -> Tuple[List[Dict[str, Any]], set, int, int]:
+        """
+        计算缺失、需要重建或过期的档案（不写入数据库）
+        
+        Returns:
+            (需要保存的档案行, 已有档案的产品ID集合, 重建的产品数, 增量更新的产品数)
+        """
+        end_date = date.today() - timedelta(days=1)
+        
+        existing = {
+            row.product_id: row
+            for row in db.query(
+                SeasonalityProfile.product_id,
+                SeasonalityProfile.last_date,
+                SeasonalityProfile.stats,
+                SeasonalityProfile.needs_rebuild
+            ).filter(SeasonalityProfile.product_id.in_(product_ids)).all()
+        }
+        
+        rebuild_ids = []
+        incremental_ids = []
+        for product_id in product_ids:
+            profile = existing.get(product_id)
+            if rebuild or profile is None or profile.needs_rebuild or profile.last_date is None or not profile.stats:
+                rebuild_ids.append(product_id)
+            elif profile.last_date < end_date:
+                incremental_ids.append(product_id)
+        
+        rows = []
+        if rebuild_ids:
+            state = SeasonalityService._empty_state(len(rebuild_ids))
+            matrix, dates = SeasonalityService._load_matrix(
+                db, rebuild_ids, end_date - timedelta(days=SeasonalityService.HISTORY_DAYS - 1), end_date
+            )
+            SeasonalityService._fold(state, matrix, dates)
+            rows.extend(SeasonalityService._profile_rows(rebuild_ids, state, end_date))
+        
+        if incremental_ids:
+            # 一次查询取出所有待更新产品自最早last_date之后的销量
+            start_date = min(existing[product_id].last_date for product_id in incremental_ids) + timedelta(days=1)
+            matrix, dates = SeasonalityService._load_matrix(db, incremental_ids, start_date, end_date)
+            state = SeasonalityService._state_from_stats([existing[product_id].stats for product_id in incremental_ids])
+            
+            # 按last_date分组，每组只累加各自缺少的日期
+            last_dates = np.array([existing[product_id].last_date for product_id in incremental_ids])
+            for last_date in np.unique(last_dates):
+                group = np.flatnonzero(last_dates == last_date)
+                offset = (last_date - start_date).days + 1
+                group_state = {key: values[group] for key, values in state.items()}
+                SeasonalityService._fold(group_state, matrix[group, offset:], dates[offset:])
+                for key, values in group_state.items():
+                    state[key][group] = values
+            rows.extend(SeasonalityService._profile_rows(incremental_ids, state, end_date))
+        
+        return rows, set(existing), len(rebuild_ids), len(incremental_ids)
+    
+    @staticmethod
+    def mark_for_rebuild(db: Session, product_id: int, sale_date: date):
+        """
+        销售记录的变动早于档案的最后日期时，标记档案需要完整重建（不提交事务）
+        
+        Args:
+            db: 数据库会话
+            product_id: 产品ID
+            sale_date: 变动的销售日期
+        """
+        if isinstance(sale_date, datetime):
+            sale_date = sale_date.date()
+        db.query(SeasonalityProfile).filter(
+            SeasonalityProfile.product_id == product_id,
+            SeasonalityProfile.last_date >= sale_date,
+            SeasonalityProfile.needs_rebuild == False
+        ).update({'needs_rebuild': True}, synchronize_session=False)
+    
+    @staticmethod
+    def mark_many_for_rebuild(db: Session, earliest_dates: Dict[int, date]):
+        """
+        批量版本的 mark_for_rebuild，以一条UPDATE语句配合executemany执行（不提交事务）
+        
+        Args:
+            db: 数据库会话
+            earliest_dates: 产品ID到该产品最早变动销售日期的映射
+        """
+        if not earliest_dates:
+            return
+        table = SeasonalityProfile.__table__
+        db.execute(
+            table.update().where(
+                table.c.product_id == bindparam('b_product_id')
+            ).where(
+                table.c.last_date >= bindparam('b_sale_date')
+            ).where(
+                table.c.needs_rebuild == False
+            ).values(needs_rebuild=True),
+            [
+                {
+                    'b_product_id': product_id,
+                    'b_sale_date': sale_date.date() if isinstance(sale_date, datetime) else sale_date
+                }
+                for product_id, sale_date in earliest_dates.items()
+            ]
+        )
+    
+    @staticmethod
+    def _load_matrix(
+        db: Session,
+        product_ids: List[int],
+        start_date: date,
+        end_date: date
+    ):
+        """一次分组查询取出指定日期范围的 产品 × 日期 销量矩阵"""
+        days = (date.today() - start_date).days + 1
+        sales_frame = ForecastService._query_daily_sales(db, product_ids, days)
+        _, dates, matrix = ForecastService.build_sales_matrix(
+            sales_frame,
+            product_ids=product_ids,
+            start_date=start_date,
+            end_date=end_date
+        )
+        return matrix.astype(np.float64), dates
+    
+    @staticmethod
+    def _empty_state(n_products: int) -> Dict[str, np.ndarray]:
+        """创建空的累计统计量"""
+        lag = SeasonalityService.PAIR_LAG
+        return {
+            'count': np.zeros(n_products),
+            'total': np.zeros(n_products),
+            'weekday_total': np.zeros((n_products, 7)),
+            'weekday_count': np.zeros((n_products, 7)),
+            'month_total': np.zeros((n_products, 12)),
+            'month_count': np.zeros((n_products, 12)),
+            # 滞后7天配对的累计量，用于计算自相关
+            'pair_count': np.zeros(n_products),
+            'pair_current': np.zeros(n_products),
+            'pair_current_sq': np.zeros(n_products),
+            'pair_lagged': np.zeros(n_products),
+            'pair_lagged_sq': np.zeros(n_products),
+            'pair_product': np.zeros(n_products),
+            # 最近7个已纳入日期的销量（从旧到新）
+            'recent': np.zeros((n_products, lag))
+        }
+    
+    @staticmethod
+    def _state_from_stats(stats_list: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """从档案中保存的统计量恢复为数组"""
+        state = SeasonalityService._empty_state(len(stats_list))
+        for index, stats in enumerate(stats_list):
+            for key in state:
+                state[key][index] = stats[key]
+        return state
+    
+    @staticmethod
+    def _fold(state: Dict[str, np.ndarray], matrix: np.ndarray, dates: pd.DatetimeIndex):
+        """
+        将新的日期逐列累加到统计量中（就地修改），每一步对所有产品做数组运算
+        
+        产品首次销售之前的日期不计入统计。
+        """
+        lag = SeasonalityService.PAIR_LAG
+        weekdays = dates.dayofweek.to_numpy()
+        months = dates.month.to_numpy() - 1
+        
+        for column in range(matrix.shape[1]):
+            quantity = matrix[:, column]
+            active = (state['count'] > 0) | (quantity > 0)
+            paired = active & (state['count'] >= lag)
+            lagged = state['recent'][:, 0]
+            
+            state['pair_count'] += paired
+            state['pair_current'] += paired * quantity
+            state['pair_current_sq'] += paired * quantity ** 2
+            state['pair_lagged'] += paired * lagged
+            state['pair_lagged_sq'] += paired * lagged ** 2
+            state['pair_product'] += paired * quantity * lagged
+            
+            state['count'] += active
+            state['total'] += active * quantity
+            state['weekday_total'][:, weekdays[column]] += active * quantity
+            state['weekday_count'][:, weekdays[column]] += active
+            state['month_total'][:, months[column]] += active * quantity
+            state['month_count'][:, months[column]] += active
+            
+            shifted = np.concatenate([state['recent'][:, 1:], quantity[:, None]], axis=1)
+            state['recent'] = np.where(active[:, None], shifted, state['recent'])
+    
+    @staticmethod
+    def _profile_rows(
+        product_ids: List[int],
+        state: Dict[str, np.ndarray],
+        last_date: date
+    ) -> List[Dict[str, Any]]:
+        """根据累计统计量计算季节指数、自相关和高峰月份"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = state['total'] / state['count']
+            weekday_indices = state['weekday_total'] / state['weekday_count'] / mean[:, None]
+            monthly_indices = state['month_total'] / state['month_count'] / mean[:, None]
+            
+            pairs = state['pair_count']
+            current_mean = state['pair_current'] / pairs
+            lagged_mean = state['pair_lagged'] / pairs
+            covariance = state['pair_product'] / pairs - current_mean * lagged_mean
+            current_var = state['pair_current_sq'] / pairs - current_mean ** 2
+            lagged_var = state['pair_lagged_sq'] / pairs - lagged_mean ** 2
+            autocorrelation = covariance / np.sqrt(current_var * lagged_var)
+        
+        autocorrelation = np.where(np.isfinite(autocorrelation), np.clip(autocorrelation, -1, 1), np.nan)
+        has_seasonality = (
+            (state['count'] >= SeasonalityService.MIN_SEASONALITY_DAYS)
+            & (np.abs(np.nan_to_num(autocorrelation)) > SeasonalityService.AUTOCORRELATION_THRESHOLD)
+        )
+        
+        rows = []
+        for index, product_id in enumerate(product_ids):
+            rows.append({
+                'product_id': product_id,
+                'last_date': last_date,
+                'weekday_indices': _rounded_list(weekday_indices[index]),
+                'monthly_indices': _rounded_list(monthly_indices[index]),
+                'weekly_autocorrelation': _rounded(autocorrelation[index]),
+                'seasonality_strength': round(float(np.abs(np.nan_to_num(autocorrelation[index]))), 4),
+                'has_seasonality': bool(has_seasonality[index]),
+                'peak_months': [
+                    month + 1 for month, value in enumerate(monthly_indices[index])
+                    if np.isfinite(value) and value >= SeasonalityService.PEAK_INDEX_THRESHOLD
+                ],
+                'stats': {key: values[index].tolist() for key, values in state.items()},
+                'needs_rebuild': False
+            })
+        return rows
+    
+    @staticmethod
+    def _save_profiles(db: Session, rows: List[Dict[str, Any]], existing_ids: set):
+        """已有档案批量更新，新档案批量插入"""
+        table = SeasonalityProfile.__table__
+        updates = [row for row in rows if row['product_id'] in existing_ids]
+        inserts = [row for row in rows if row['product_id'] not in existing_ids]
+        
+        if updates:
+            columns = [column for column in updates[0] if column != 'product_id']
+            # 绑定参数名不能与SET中的列名相同
+            statement = table.update().where(
+                table.c.product_id == bindparam('b_product_id')
+            ).values({column: bindparam(f'b_{column}') for column in columns})
+            db.execute(statement, [{f'b_{key}': value for key, value in row.items()} for row in updates])
+        if inserts:
+            db.execute(table.insert(), inserts)
+    
+    @staticmethod
+    def _format_profile(profile: SeasonalityProfile) -> Dict[str, Any]:
+        """将档案对象转换为响应字典"""
+        current_month = date.today().month
+        return {
+            'product_id': profile.product_id,
+            'last_date': profile.last_date,
+            'weekday_indices': profile.weekday_indices,
+            'monthly_indices': profile.monthly_indices,
+            'weekly_autocorrelation': profile.weekly_autocorrelation,
+            'seasonality_strength': profile.seasonality_strength,
+            'has_seasonality': profile.has_seasonality,
+            'peak_months': profile.peak_months,
+            'is_peak_season': current_month in (profile.peak_months or []),
+            'weekday_averages': _averages(profile.stats, 'weekday'),
+            'monthly_averages': _averages(profile.stats, 'month')
+        }
+
+
+def _rounded(value: float) -> Optional[float]:
+    """四舍五入，NaN/inf转换为None以便JSON序列化"""
+    return round(float(value), 4) if np.isfinite(value) else None
+
+
+def _rounded_list(values: np.ndarray) -> List[Optional[float]]:
+    return [_rounded(value) for value in values]
+
+
+def _averages(stats: Optional[Dict[str, Any]], prefix: str) -> Dict[int, float]:
+    """从累计统计量计算各周几/各月份的日均销量，只包含有数据的项"""
+    if not stats:
+        return {}
+    totals = stats[f'{prefix}_total']
+    counts = stats[f'{prefix}_count']
+    return {
+        index: round(total / count, 2)
+        for index, (total, count) in enumerate(zip(totals, counts)) if count
+    }
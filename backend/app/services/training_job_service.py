@@ -0,0 +1,430 @@
+from typing import Dict, List, Any, Optional
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.training_job import TrainingJob
+from app.services.forecast_service import ForecastService
+
+# 所有训练任务共用的进程池，首次提交任务时创建
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """获取共享的训练进程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            ForecastService._ensure_model_dir()
+            _executor = ProcessPoolExecutor(max_workers=settings.FORECAST_MAX_WORKERS)
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """
+    丢弃已损坏的进程池
+    
+    有子进程异常退出（如被系统终止）后进程池不可再用，之后的提交都会抛出BrokenProcessPool，
+    丢弃后下次获取时重新创建
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def _cancel_marker_path(job_id: int) -> str:
+    """训练任务的取消标记文件，子进程保存模型前检查"""
+    return os.path.join(ForecastService.MODELS_DIR, f".cancel_job_{job_id}")
+
+
+def _worker_id() -> str:
+    """当前进程的标识，用于区分多个服务进程各自执行的任务"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_alive(pid: int) -> bool:
+    """本机上指定进程号的进程是否存在"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class TrainingJobService:
+    """
+    训练任务服务：在后台进程池中异步执行模型训练，并持久化进度和结果
+    """
+    
+    ACTIVE_STATUSES = ('pending', 'running', 'cancelling')
+    PROGRESS_INTERVAL_SECONDS = 1.0  # 进度写回数据库及检查取消请求的间隔
+    
+    @staticmethod
+    def submit_job(
+        db: Session,
+        model_type: str,
+        product_ids: Optional[List[int]] = None,
+        category: Optional[str] = None,
+        days: int = 90,
+        incremental: bool = False,
+        created_by: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        创建训练任务并在后台线程中调度执行，立即返回任务信息
+        
+        Args:
+            db: 数据库会话
+            model_type: 模型类型 ('SARIMA' 或 'RandomForest')
+            product_ids: 产品ID列表，为空时训练所有活跃产品
+            category: 产品类别筛选
+            days: 使用最近多少天的数据训练
+            incremental: SARIMA是否使用增量更新模式
+            created_by: 提交任务的用户ID
+        
+        Returns:
+            任务信息字典
+        """
+        job = TrainingJob(
+            status='pending',
+            model_type=model_type,
+            params={
+                'product_ids': product_ids,
+                'category': category,
+                'days': days,
+                'incremental': incremental
+            },
+            created_by=created_by,
+            worker_id=_worker_id(),
+            heartbeat_at=datetime.now()
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        
+        threading.Thread(
+            target=TrainingJobService._run_job,
+            args=(job.id,),
+            name=f"training-job-{job.id}",
+            daemon=True
+        ).start()
+        
+        return TrainingJobService._format_job(job)
+    
+    @staticmethod
+    def get_job(db: Session, job_id: int, include_results: bool = True) -> Dict[str, Any]:
+        """
+        获取训练任务的状态、进度和结果
+        
+        Args:
+            db: 数据库会话
+            job_id: 任务ID
+            include_results: 是否包含每个产品的训练结果
+        
+        Returns:
+            任务信息字典
+        """
+        job = db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+        if not job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"未找到ID为 {job_id} 的训练任务"
+            )
+        return TrainingJobService._format_job(job, include_results)
+    
+    @staticmethod
+    def list_jobs(
+        db: Session,
+        status_filter: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        列出最近的训练任务（不含结果明细）
+        
+        Args:
+            db: 数据库会话
+            status_filter: 按状态筛选
+            skip: 跳过的记录数
+            limit: 返回的最大记录数
+        
+        Returns:
+            任务信息列表
+        """
+        query = db.query(TrainingJob)
+        if status_filter:
+            query = query.filter(TrainingJob.status == status_filter)
+        jobs = query.order_by(TrainingJob.id.desc()).offset(skip).limit(limit).all()
+        return [TrainingJobService._format_job(job, include_results=False) for job in jobs]
+    
+    @staticmethod
+    def cancel_job(db: Session, job_id: int) -> Dict[str, Any]:
+        """
+        取消训练任务
+        
+        尚未开始的任务直接标记为已取消；运行中的任务标记为cancelling，
+        调度线程会撤销尚未开始拟合的产品，并通知已在子进程中运行的拟合不再保存模型，
+        等这些拟合结束后才标记为已取消，之后不会再有模型文件被写入。
+        
+        Args:
+            db: 数据库会话
+            job_id: 任务ID
+        
+        Returns:
+            任务信息字典
+        """
+        # 使用条件更新，避免与调度线程的状态切换相互覆盖
+        cancelled = db.query(TrainingJob).filter(
+            TrainingJob.id == job_id,
+            TrainingJob.status == 'pending'
+        ).update({'status': 'cancelled', 'finished_at': datetime.now()}, synchronize_session=False)
+        if not cancelled:
+            db.query(TrainingJob).filter(
+                TrainingJob.id == job_id,
+                TrainingJob.status == 'running'
+            ).update({'status': 'cancelling'}, synchronize_session=False)
+        db.commit()
+        
+        job = db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+        if not job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"未找到ID为 {job_id} 的训练任务"
+            )
+        if job.status not in ('cancelling', 'cancelled'):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"任务已结束，当前状态为 {job.status}"
+            )
+        return TrainingJobService._format_job(job, include_results=False)
+    
+    @staticmethod
+    def recover_interrupted_jobs(db: Session) -> int:
+        """
+        服务启动时将上次运行中断的任务标记为失败
+        
+        多个服务进程共用任务表，只回收确定已中断的任务：执行进程在本机上已不存在
+        （或进程号与当前进程相同，即为本进程重启前的任务），或心跳超过
+        TRAINING_JOB_STALE_SECONDS未更新（执行进程在其他主机上时只能依据心跳）。
+        
+        Returns:
+            被标记的任务数
+        """
+        hostname = socket.gethostname()
+        current_pid = os.getpid()
+        stale_before = datetime.now() - timedelta(seconds=settings.TRAINING_JOB_STALE_SECONDS)
+        
+        jobs = db.query(TrainingJob.id, TrainingJob.worker_id, TrainingJob.heartbeat_at).filter(
+            TrainingJob.status.in_(TrainingJobService.ACTIVE_STATUSES)
+        ).all()
+        interrupted_ids = []
+        for job in jobs:
+            worker_host, _, worker_pid = (job.worker_id or '').rpartition(':')
+            if worker_host == hostname and worker_pid.isdigit():
+                pid = int(worker_pid)
+                if pid == current_pid or not _process_alive(pid):
+                    interrupted_ids.append(job.id)
+                    continue
+            if job.heartbeat_at is None or job.heartbeat_at < stale_before:
+                interrupted_ids.append(job.id)
+        if not interrupted_ids:
+            return 0
+        
+        # 条件更新，避免覆盖在此期间已正常结束的任务
+        count = db.query(TrainingJob).filter(
+            TrainingJob.id.in_(interrupted_ids),
+            TrainingJob.status.in_(TrainingJobService.ACTIVE_STATUSES)
+        ).update({
+            'status': 'failed',
+            'error': "服务重启，任务中断",
+            'finished_at': datetime.now()
+        }, synchronize_session=False)
+        db.commit()
+        return count
+    
+    @staticmethod
+    def shutdown():
+        """关闭共享进程池"""
+        global _executor
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+                _executor = None
+    
+    @staticmethod
+    def _run_job(job_id: int):
+        """
+        在后台线程中执行训练任务：准备数据、分发到进程池、定期写回进度并响应取消
+        
+        Args:
+            job_id: 任务ID
+        """
+        db = SessionLocal()
+        cancel_marker = _cancel_marker_path(job_id)
+        try:
+            started = db.query(TrainingJob).filter(
+                TrainingJob.id == job_id,
+                TrainingJob.status == 'pending'
+            ).update({
+                'status': 'running',
+                'started_at': datetime.now(),
+                'worker_id': _worker_id(),
+                'heartbeat_at': datetime.now()
+            }, synchronize_session=False)
+            db.commit()
+            if not started:
+                return
+            
+            job = db.query(TrainingJob).filter(TrainingJob.id == job_id).first()
+            params = job.params
+            tasks, failures = ForecastService._prepare_training_tasks(
+                db, params['product_ids'], job.model_type, params['category'], params['days']
+            )
+            fit_model = ForecastService._training_function(job.model_type, params['incremental'])
+            
+            job.total_count = len(tasks) + len(failures)
+            job.failed_count = len(failures)
+            job.heartbeat_at = datetime.now()
+            db.commit()
+            
+            executor = _get_executor()
+            try:
+                futures = {
+                    executor.submit(fit_model, product_id, sales_data, cancel_marker): product_id
+                    for product_id, sales_data in tasks.items()
+                }
+            except BrokenProcessPool:
+                # 之前的任务中有子进程异常退出，重新创建进程池后提交
+                _discard_executor(executor)
+                executor = _get_executor()
+                futures = {
+                    executor.submit(fit_model, product_id, sales_data, cancel_marker): product_id
+                    for product_id, sales_data in tasks.items()
+                }
+            # 数据已提交到进程池，释放本线程持有的引用
+            tasks = None
+            
+            results = []
+            pending = set(futures)
+            last_checked_at = time.perf_counter()
+            cancelled = False
+            while pending:
+                done, pending = wait(
+                    pending,
+                    timeout=TrainingJobService.PROGRESS_INTERVAL_SECONDS,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.cancelled():
+                        continue
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        # 子进程异常退出等情况；进程池已损坏时丢弃，不影响之后的任务
+                        if isinstance(e, BrokenProcessPool):
+                            _discard_executor(executor)
+                        results.append({
+                            'product_id': futures[future],
+                            'model_type': job.model_type,
+                            'training_success': False,
+                            'error': str(e)
+                        })
+                
+                if time.perf_counter() - last_checked_at < TrainingJobService.PROGRESS_INTERVAL_SECONDS and pending:
+                    continue
+                last_checked_at = time.perf_counter()
+                
+                # 写回进度和心跳，同时读取最新状态以响应取消请求
+                db.refresh(job)
+                job.completed_count = sum(1 for result in results if result['training_success'])
+                job.failed_count = len(failures) + len(results) - job.completed_count
+                job.heartbeat_at = datetime.now()
+                if job.status == 'cancelling' and not cancelled:
+                    # 撤销尚未开始的拟合；运行中的拟合无法中断，通过标记文件通知其不再保存模型，
+                    # 继续等待它们结束，避免任务标记为已取消后仍有模型文件被写入
+                    open(cancel_marker, 'w').close()
+                    for future in pending:
+                        future.cancel()
+                    cancelled = True
+                db.commit()
+            
+            trained = sorted(
+                (result for result in results if result['training_success']),
+                key=lambda result: result['product_id']
+            )
+            failures.extend(result for result in results if not result['training_success'])
+            failures.sort(key=lambda result: result['product_id'])
+            
+            # 条件更新最终状态：最后一次检查之后收到的取消请求不会被succeeded覆盖，
+            # 已被判定为中断（failed）的任务也不会被改回
+            values = {
+                'completed_count': len(trained),
+                'failed_count': len(failures),
+                'results': {'results': trained, 'failures': failures},
+                'finished_at': datetime.now(),
+                'heartbeat_at': datetime.now()
+            }
+            finished = 0
+            if not cancelled:
+                finished = db.query(TrainingJob).filter(
+                    TrainingJob.id == job_id,
+                    TrainingJob.status == 'running'
+                ).update(dict(values, status='succeeded'), synchronize_session=False)
+            if not finished:
+                db.query(TrainingJob).filter(
+                    TrainingJob.id == job_id,
+                    TrainingJob.status.in_(('running', 'cancelling'))
+                ).update(dict(values, status='cancelled'), synchronize_session=False)
+            db.commit()
+        
+        except Exception as e:
+            db.rollback()
+            db.query(TrainingJob).filter(TrainingJob.id == job_id).update({
+                'status': 'failed',
+                'error': str(e),
+                'finished_at': datetime.now()
+            }, synchronize_session=False)
+            db.commit()
+        
+        finally:
+            if os.path.exists(cancel_marker):
+                os.remove(cancel_marker)
+            db.close()
+    
+    @staticmethod
+    def _format_job(job: TrainingJob, include_results: bool = True) -> Dict[str, Any]:
+        """将任务对象转换为响应字典"""
+        processed = (job.completed_count or 0) + (job.failed_count or 0)
+        result = {
+            'id': job.id,
+            'status': job.status,
+            'model_type': job.model_type,
+            'params': job.params,
+            'total_count': job.total_count or 0,
+            'completed_count': job.completed_count or 0,
+            'failed_count': job.failed_count or 0,
+            'progress': round(processed / job.total_count, 4) if job.total_count else 0.0,
+            'error': job.error,
+            'created_by': job.created_by,
+            'worker_id': job.worker_id,
+            'heartbeat_at': job.heartbeat_at,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at
+        }
+        if include_results:
+            result['results'] = job.results
+        return result
@@ -0,0 +1,132 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.main  # noqa: F401  注册所有模型
+from app.db.session import Base
+from app.models.demand_statistics import DemandStatistics
+from app.models.product import Product
+from app.models.sale import Sale
+from app.services.demand_statistics_service import DemandStatisticsService
+from app.services.sales_daily_service import SalesDailyService
+
+PRODUCT_IDS = [1, 2, 3]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    for index in range(len(PRODUCT_IDS)):
+        session.add(Product(
+            sku=f"SKU{index}", name=f"产品{index}", category="A", price=10, cost=6,
+            stock_quantity=1000, safety_stock=10
+        ))
+    session.commit()
+    # 先建立空的统计行，之后的销售变动都走增量更新
+    DemandStatisticsService.rebuild_statistics(session)
+    yield session
+    session.close()
+
+
+def _apply(db, changes):
+    """与销售服务相同的顺序：需求统计读取汇总中的原销量，必须先于每日汇总更新"""
+    DemandStatisticsService.apply_sale_changes(db, changes)
+    SalesDailyService.apply_sale_changes(db, [
+        (product_id, sale_date, quantity, quantity * 10.0, 1 if quantity > 0 else -1)
+        for product_id, sale_date, quantity in changes
+    ])
+
+
+def _random_date(rnd, today):
+    # 一半落在最近窗口内，一半早于窗口，覆盖从汇总表读取原销量的分支
+    if rnd.random() < 0.5:
+        return today - timedelta(days=rnd.randint(0, 20))
+    return today - timedelta(days=rnd.randint(300, 500))
+
+
+def _records(db):
+    return sorted(
+        (row.product_id, row.first_sale_date, row.sales_days, round(row.sales_mean, 6), round(row.sales_m2, 6))
+        for row in db.query(DemandStatistics).all()
+    )
+
+
+def _statistics(db):
+    return [DemandStatisticsService.get_statistics(db, PRODUCT_IDS, days) for days in (None, 30, 366)]
+
+
+def _populate(db, seed):
+    rnd = random.Random(seed)
+    today = date.today()
+    sales = []
+    for _ in range(300):
+        sale = Sale(
+            product_id=rnd.choice(PRODUCT_IDS), sale_date=_random_date(rnd, today),
+            quantity=rnd.randint(1, 5), sale_amount=0.0
+        )
+        _apply(db, [(sale.product_id, sale.sale_date, sale.quantity)])
+        db.add(sale)
+        db.commit()
+        sales.append(sale)
+    
+    # 修改：改变数量、日期和产品
+    for sale in rnd.sample(sales, 80):
+        old = (sale.product_id, sale.sale_date, sale.quantity)
+        sale.product_id = rnd.choice(PRODUCT_IDS)
+        sale.sale_date = _random_date(rnd, today)
+        sale.quantity = rnd.randint(1, 5)
+        _apply(db, [(old[0], old[1], -old[2]), (sale.product_id, sale.sale_date, sale.quantity)])
+        db.commit()
+    
+    # 一次删除一批，包括产品最早的销售
+    deleted = rnd.sample(sales, 100) + [min(sales, key=lambda sale: sale.sale_date)]
+    deleted = list({sale.id: sale for sale in deleted}.values())
+    _apply(db, [(sale.product_id, sale.sale_date, -sale.quantity) for sale in deleted])
+    for sale in deleted:
+        db.delete(sale)
+    db.commit()
+
+
+def test_applied_changes_match_rebuild(db):
+    _populate(db, seed=0)
+    applied_records = _records(db)
+    applied_statistics = _statistics(db)
+    
+    DemandStatisticsService.rebuild_statistics(db)
+    db.expire_all()
+    assert applied_records == _records(db)
+    for applied, rebuilt in zip(applied_statistics, _statistics(db)):
+        for key in applied:
+            np.testing.assert_allclose(applied[key], rebuilt[key])
+
+
+def test_statistics_match_daily_sales(db):
+    _populate(db, seed=1)
+    today = date.today()
+    totals = {}
+    for sale in db.query(Sale).all():
+        key = (sale.product_id, sale.sale_date)
+        totals[key] = totals.get(key, 0) + sale.quantity
+    
+    for days in (None, 30):
+        statistics = DemandStatisticsService.get_statistics(db, PRODUCT_IDS, days)
+        for index, product_id in enumerate(PRODUCT_IDS):
+            dates = [sale_date for (pid, sale_date), quantity in totals.items() if pid == product_id and quantity > 0]
+            if days is not None:
+                dates = [sale_date for sale_date in dates if sale_date > today - timedelta(days=days)]
+            # 从首次销售到今天，没有销售的日期按0计入
+            first = min(dates)
+            values = np.array([
+                totals.get((product_id, first + timedelta(days=offset)), 0)
+                for offset in range((today - first).days + 1)
+            ], dtype=float)
+            assert statistics['observed_days'][index] == len(values)
+            assert statistics['sales_days'][index] == (values > 0).sum()
+            assert statistics['mean'][index] == pytest.approx(values.mean())
+            assert statistics['std'][index] == pytest.approx(values.std())
@@ -0,0 +1,96 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.main  # noqa: F401  注册所有模型
+from app.db.session import Base
+from app.models.product import Product
+from app.models.sale import Sale
+from app.models.sales_daily import SalesDaily
+from app.services.sales_daily_service import SalesDailyService
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    for index in range(3):
+        session.add(Product(
+            sku=f"SKU{index}", name=f"产品{index}", category="A", price=10, cost=6,
+            stock_quantity=1000, safety_stock=10
+        ))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _snapshot(db):
+    return sorted(
+        (row.product_id, row.sale_date, row.quantity, round(row.amount, 6), row.transaction_count)
+        for row in db.query(SalesDaily).all()
+    )
+
+
+def _add_sale(db, product_id, sale_date, quantity):
+    sale = Sale(product_id=product_id, sale_date=sale_date, quantity=quantity, sale_amount=quantity * 10.0)
+    SalesDailyService.apply_sale_changes(db, [(product_id, sale_date, quantity, sale.sale_amount, 1)])
+    db.add(sale)
+    db.commit()
+    return sale
+
+
+def test_applied_changes_match_rebuild(db):
+    rnd = random.Random(0)
+    today = date.today()
+    sales = []
+    for _ in range(200):
+        sales.append(_add_sale(db, rnd.randint(1, 3), today - timedelta(days=rnd.randint(0, 9)), rnd.randint(1, 5)))
+    
+    # 修改：改变数量、日期和产品
+    for sale in rnd.sample(sales, 40):
+        old = (sale.product_id, sale.sale_date, sale.quantity, sale.sale_amount)
+        sale.product_id = rnd.randint(1, 3)
+        sale.sale_date = today - timedelta(days=rnd.randint(0, 12))
+        sale.quantity = rnd.randint(1, 5)
+        sale.sale_amount = sale.quantity * 10.0
+        SalesDailyService.apply_sale_changes(db, [
+            (old[0], old[1], -old[2], -old[3], -1),
+            (sale.product_id, sale.sale_date, sale.quantity, sale.sale_amount, 1)
+        ])
+        db.commit()
+    
+    # 删除
+    for sale in rnd.sample(sales, 60):
+        SalesDailyService.apply_sale_changes(
+            db, [(sale.product_id, sale.sale_date, -sale.quantity, -sale.sale_amount, -1)]
+        )
+        db.delete(sale)
+        db.commit()
+    
+    applied = _snapshot(db)
+    SalesDailyService.rebuild(db)
+    assert applied == _snapshot(db)
+
+
+def test_rows_removed_when_last_sale_deleted(db):
+    sale_date = date.today()
+    first = _add_sale(db, 1, sale_date, 3)
+    second = _add_sale(db, 1, sale_date, 2)
+    assert _snapshot(db) == [(1, sale_date, 5, 50.0, 2)]
+    
+    # 同一批中的多个变动先合并，记录数归零的汇总行被删除
+    SalesDailyService.apply_sale_changes(db, [
+        (1, sale_date, -3, -30.0, -1),
+        (1, sale_date, -2, -20.0, -1)
+    ])
+    db.delete(first)
+    db.delete(second)
+    db.commit()
+    assert _snapshot(db) == []
+    
+    SalesDailyService.rebuild(db)
+    assert _snapshot(db) == []